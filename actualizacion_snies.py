@@ -0,0 +1,281 @@
+# Actualización incremental de SNIES por periodo
+
+# SNIES publica periodos nuevos (PERIODO / PROXY_PER) unas pocas veces al año. Antes cada
+# actualización volvía a procesar todo el histórico de MAESTRO. Aquí:
+#   - MAESTRO y OFERTA se guardan además en un almacén particionado por periodo
+#     (particiones/<TABLA>/PERIODO=<p>/datos.parquet) con un manifiesto de huellas por
+#     periodo (hash de sus filas). Al llegar una versión nueva solo se escriben los
+#     periodos nuevos o cambiados y se borran los que desaparecieron.
+#   - PROGRAMAS guarda una huella por CODIGO_SNIES para saber qué programas cambiaron.
+#   - Los agregados se actualizan recalculando solo esos periodos y programas (sus filas se
+#     leen de las particiones, no del parquet completo), y el índice de programas solo
+#     agrega los nombres nuevos.
+# Las fuentes publican un único parquet por tabla, así que si la tabla cambió se sigue
+# descargando completa (con ETag/TTL como siempre); lo incremental es todo lo demás.
+
+
+# Librerias necesarias
+
+import json
+import os
+import re
+import shutil
+import tempfile
+from functools import partial
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from datos_snies import (CACHE_DIR, DatosSNIES, a_pandas, sincronizar_tablas, version_tabla,
+                         COLUMNAS_CATEGORICAS)
+from agregados_snies import AlmacenAgregados
+from indice_programas import actualizar_indice
+
+
+TABLAS_POR_PERIODO = ('MAESTRO', 'OFERTA')
+
+
+def _dir_particiones(cache_dir: str, nombre: str = None) -> str:
+
+    base = os.path.join(cache_dir or CACHE_DIR, 'particiones')
+
+    return os.path.join(base, nombre) if nombre else base
+
+
+def _leer_json(ruta: str) -> dict:
+
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _escribir_json(ruta: str, datos: dict):
+
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    tmp = f'{ruta}.tmp-{os.getpid()}'
+
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(datos, f, ensure_ascii=False, indent=2)
+
+    os.replace(tmp, ruta)
+
+
+# Huellas
+
+def huellas(df: pd.DataFrame, columna: str) -> dict:
+    """
+    Huella de las filas de cada valor de `columna`: suma de los hash de sus filas (no
+    depende del orden) más el número de filas. Retorna {valor (texto): huella}.
+    """
+    hashes = pd.util.hash_pandas_object(df, index=False)
+    grupos = hashes.groupby(df[columna].astype(str), sort=False)
+    sumas = grupos.sum()
+    conteos = grupos.size()
+
+    return {clave: f'{int(sumas[clave]):016x}-{int(conteos[clave])}' for clave in sumas.index}
+
+
+def comparar_huellas(anteriores: dict, actuales: dict) -> dict:
+    """Claves nuevas, cambiadas y borradas entre dos juegos de huellas."""
+    return {
+        'nuevos': sorted(k for k in actuales if k not in anteriores),
+        'cambiados': sorted(k for k in actuales if k in anteriores and anteriores[k] != actuales[k]),
+        'borrados': sorted(k for k in anteriores if k not in actuales),
+    }
+
+
+# Almacén particionado por periodo
+
+def _nombre_particion(periodo: str) -> str:
+
+    return 'PERIODO=' + re.sub(r'[^0-9A-Za-z_.-]', '_', periodo)
+
+
+def actualizar_particiones(nombre: str, cache_dir: str = None) -> dict:
+    """
+    Lleva el almacén particionado de `nombre` (MAESTRO u OFERTA) a la versión en caché de
+    la tabla: escribe solo los periodos nuevos o cambiados y borra los que ya no están.
+    Retorna {'nuevos', 'cambiados', 'borrados'} con los periodos afectados.
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    directorio = _dir_particiones(cache_dir, nombre)
+    ruta_manifiesto = os.path.join(directorio, 'manifiesto.json')
+    manifiesto = _leer_json(ruta_manifiesto)
+    version = version_tabla(nombre, cache_dir)
+
+    if manifiesto.get('version') == version:
+
+        return {'nuevos': [], 'cambiados': [], 'borrados': []}
+
+    tabla = pq.read_table(os.path.join(cache_dir, f'{nombre}.parquet'))
+    df = tabla.to_pandas()
+    actuales = huellas(df, 'PERIODO')
+    anteriores = {p: d['huella'] for p, d in manifiesto.get('periodos', {}).items()}
+    cambios = comparar_huellas(anteriores, actuales)
+    periodos = dict(manifiesto.get('periodos', {}))
+    claves = df['PERIODO'].astype(str)
+    os.makedirs(directorio, exist_ok=True)
+
+    for periodo in cambios['nuevos'] + cambios['cambiados']:
+
+        archivo = os.path.join(_nombre_particion(periodo), 'datos.parquet')
+        destino = os.path.join(directorio, archivo)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(destino), suffix='.tmp')
+        os.close(fd)
+
+        try:
+            pq.write_table(tabla.filter(pa.array((claves == periodo).to_numpy())), tmp)
+            os.replace(tmp, destino)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+        periodos[periodo] = {'huella': actuales[periodo], 'archivo': archivo}
+
+    for periodo in cambios['borrados']:
+
+        shutil.rmtree(os.path.join(directorio, _nombre_particion(periodo)), ignore_errors=True)
+        periodos.pop(periodo, None)
+
+    _escribir_json(ruta_manifiesto, {'version': version, 'periodos': periodos})
+
+    return cambios
+
+
+def leer_periodos(nombre: str, periodos=None, columnas=None, cache_dir: str = None) -> pd.DataFrame:
+    """
+    Lee del almacén particionado solo los archivos de `periodos` (None = todos), sin
+    escanear el resto del histórico. Mismos tipos que `datos_snies.leer_tabla`.
+    """
+    directorio = _dir_particiones(cache_dir, nombre)
+    manifiesto = _leer_json(os.path.join(directorio, 'manifiesto.json'))
+    elegidos = manifiesto.get('periodos', {})
+
+    if periodos is not None:
+
+        buscados = {str(p) for p in periodos}
+        elegidos = {p: d for p, d in elegidos.items() if p in buscados}
+
+    archivos = [os.path.join(directorio, d['archivo']) for _, d in sorted(elegidos.items())]
+
+    if not archivos:
+
+        return None
+
+    formato = ds.ParquetFileFormat(
+        read_options=ds.ParquetReadOptions(dictionary_columns=COLUMNAS_CATEGORICAS))
+    dataset = ds.dataset(archivos, format=formato)
+
+    if columnas is not None:
+
+        columnas = [c for c in columnas if c in dataset.schema.names]
+
+    return a_pandas(dataset.to_table(columns=columnas))
+
+
+def programas_cambiados(cache_dir: str = None) -> dict:
+    """Códigos SNIES nuevos, cambiados o borrados en PROGRAMAS desde la última actualización."""
+    cache_dir = cache_dir or CACHE_DIR
+    ruta_manifiesto = os.path.join(_dir_particiones(cache_dir, 'PROGRAMAS'), 'manifiesto.json')
+    manifiesto = _leer_json(ruta_manifiesto)
+    version = version_tabla('PROGRAMAS', cache_dir)
+
+    if manifiesto.get('version') == version:
+
+        return {'nuevos': [], 'cambiados': [], 'borrados': []}
+
+    df = pq.read_table(os.path.join(cache_dir, 'PROGRAMAS.parquet')).to_pandas()
+    actuales = huellas(df, 'CODIGO_SNIES')
+    cambios = comparar_huellas(manifiesto.get('codigos', {}), actuales)
+    _escribir_json(ruta_manifiesto, {'version': version, 'codigos': actuales})
+
+    return cambios
+
+
+# Flujo completo
+
+def actualizar_snies(fuente: str = None, cache_dir: str = None, ttl: float = None,
+                     forzar: bool = False, columnas=None) -> dict:
+    """
+    Sincroniza las tablas y actualiza de forma incremental el almacén por periodo, los
+    agregados y el índice de programas. Retorna un resumen de lo que cambió.
+
+    Los agregados se actualizan a partir de los de la última versión procesada; si ya no
+    existen (o es la primera vez) se construyen completos.
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    ruta_estado = os.path.join(_dir_particiones(cache_dir), 'estado.json')
+    version_base = _leer_json(ruta_estado).get('version')
+    primera_vez = version_base is None
+
+    sincronizar_tablas(fuente, cache_dir, ttl, forzar)
+    datos = DatosSNIES(fuente=fuente, cache_dir=cache_dir, ttl=ttl)
+
+    resumen = {'version_anterior': version_base, 'version': datos.version}
+
+    if datos.version == version_base:
+
+        print("SNIES sin cambios desde la última actualización:", datos.version)
+        resumen['sin_cambios'] = True
+
+        return resumen
+
+    # Periodos y programas afectados
+
+    periodos = set()
+
+    for nombre in TABLAS_POR_PERIODO:
+
+        cambios = actualizar_particiones(nombre, cache_dir)
+        resumen[nombre] = cambios
+        periodos.update(cambios['nuevos'] + cambios['cambiados'] + cambios['borrados'])
+        print(f"{nombre}: {len(cambios['nuevos'])} periodos nuevos, {len(cambios['cambiados'])} "
+              f"cambiados, {len(cambios['borrados'])} borrados")
+
+    cambios = programas_cambiados(cache_dir)
+    resumen['PROGRAMAS'] = cambios
+    codigos = cambios['nuevos'] + cambios['cambiados'] + cambios['borrados']
+    print(f"PROGRAMAS: {len(cambios['nuevos'])} nuevos, {len(cambios['cambiados'])} cambiados, "
+          f"{len(cambios['borrados'])} borrados")
+
+    programas = datos.leer_tabla('PROGRAMAS', columnas)
+
+    # Agregados: incremental desde la versión base si existe
+
+    anterior = None if primera_vez else AlmacenAgregados.cargar(version_base, cache_dir)
+    actual = AlmacenAgregados.cargar(datos.version, cache_dir)
+
+    if actual is not None:
+
+        resumen['agregados'] = 'existentes'
+
+    elif anterior is not None:
+
+        print(f"Actualizando agregados: {len(periodos)} periodos y {len(codigos)} programas ...")
+        actual = anterior.actualizar(datos, sorted(periodos), codigos, columnas,
+                                     partial(leer_periodos, cache_dir=cache_dir))
+        actual.guardar(cache_dir)
+        resumen['agregados'] = 'incremental'
+
+    else:
+
+        print("Construyendo agregados completos ...")
+        actual = AlmacenAgregados.construir(datos, columnas)
+        actual.guardar(cache_dir)
+        resumen['agregados'] = 'completo'
+
+    # Índice de programas: solo se agregan los nombres nuevos
+
+    _, agregados = actualizar_indice(programas['PROGRAMA_ACADEMICO'], cache_dir=cache_dir,
+                                     version=datos.version)
+    resumen['indice_programas_nuevos'] = agregados
+
+    _escribir_json(ruta_estado, {'version': datos.version})
+
+    return resumen
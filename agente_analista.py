@@ -9,34 +9,161 @@
 
 
 import asyncio
-from agents import Agent, Runner, WebSearchTool, function_tool, AgentOutputSchema
-from pydantic import BaseModel, Field
-from typing import List, Optional
-import requests
-from bs4 import BeautifulSoup
-from dotenv import load_dotenv
+from contextlib import asynccontextmanager, nullcontext
+from contextvars import ContextVar
+from functools import lru_cache
+import re
+import time
+from typing import List, Optional, TYPE_CHECKING
+import weakref
+import hashlib
 import json
 import os # Asegúrate de que 'os' esté importado si no lo estaba
+from cache_agente import (cache_activo, cache_paginas, cache_respuestas, leer_configuracion,
+                          normalizar_url, normalizar_subtarea)
+from trazas import span
 
-# Cargar variables de entorno (API Keys)
+if TYPE_CHECKING:
+    import aiohttp
 
-load_dotenv()
+# Importar este módulo es liviano: el SDK de agentes, pydantic, aiohttp y BeautifulSoup se
+# importan la primera vez que se usan, y el .env (API Keys) se carga justo antes de
+# construir los agentes. `executor`, `planner`, `FinalReport`, `ProgramItem` y `Runner`
+# siguen disponibles como atributos del módulo (ver __getattr__ al final).
+
+# Configuración (variables de entorno o .env)
+
+def _leer_configuracion():
+    global HTTP_TIMEOUT_TOTAL, HTTP_TIMEOUT_CONEXION, HTTP_CONEXIONES, HTTP_CONEXIONES_POR_HOST
+    global EXECUTOR_CONCURRENCIA, EXECUTOR_TIMEOUT, AGENTE_DEADLINE
+
+    HTTP_TIMEOUT_TOTAL = float(os.getenv("HTTP_TIMEOUT_TOTAL", 20))
+    HTTP_TIMEOUT_CONEXION = float(os.getenv("HTTP_TIMEOUT_CONEXION", 5))
+    HTTP_CONEXIONES = int(os.getenv("HTTP_CONEXIONES", 20))
+    HTTP_CONEXIONES_POR_HOST = int(os.getenv("HTTP_CONEXIONES_POR_HOST", 4))
+    EXECUTOR_CONCURRENCIA = int(os.getenv("EXECUTOR_CONCURRENCIA", 4))
+    EXECUTOR_TIMEOUT = float(os.getenv("EXECUTOR_TIMEOUT", 180))
+    AGENTE_DEADLINE = float(os.getenv("AGENTE_DEADLINE", 600))   # 0 = sin límite
+
+_leer_configuracion()
+
+MARGEN_DEADLINE = 5   # segundos que se reservan para cerrar la corrida antes del límite
+
+@lru_cache(maxsize=None)
+def cargar_entorno():
+    """Carga el .env (API Keys y límites) una sola vez, antes del primer uso del agente."""
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    _leer_configuracion()
+    leer_configuracion()
 
 # Tools
 
-@function_tool
-def fetch_url(url: str, max_chars: int = 4000) -> str:
+# HTTP asíncrono: una sesión aiohttp por event loop con pool de conexiones (keep-alive),
+# límite de conexiones por host y timeouts de conexión y total. Así varias llamadas a
+# fetch_url de Executors en paralelo no bloquean el loop ni abren una conexión cada vez.
+# Varias corridas del agente pueden compartir el loop (modo servicio): la sesión se cierra
+# cuando termina la última corrida que la usa, no al final de cada una. Una descarga fuera
+# de una corrida (fetch_url suelto) usa una sesión propia que se cierra al terminar.
+
+_sesiones_http = weakref.WeakKeyDictionary()
+_corridas_http = weakref.WeakKeyDictionary()
+
+def _nueva_sesion_http() -> "aiohttp.ClientSession":
+    import aiohttp
+
+    conector = aiohttp.TCPConnector(limit=HTTP_CONEXIONES, limit_per_host=HTTP_CONEXIONES_POR_HOST,
+                                    keepalive_timeout=30, ttl_dns_cache=300)
+    timeout = aiohttp.ClientTimeout(total=HTTP_TIMEOUT_TOTAL, connect=HTTP_TIMEOUT_CONEXION)
+
+    return aiohttp.ClientSession(connector=conector, timeout=timeout)
+
+def _sesion_http() -> "aiohttp.ClientSession":
+    loop = asyncio.get_running_loop()
+    sesion = _sesiones_http.get(loop)
+
+    if sesion is None or sesion.closed:
+        sesion = _nueva_sesion_http()
+        _sesiones_http[loop] = sesion
+
+    return sesion
+
+@asynccontextmanager
+async def _sesion_descarga():
+    """La sesión compartida si hay una corrida en el loop; si no, una que se cierra al salir."""
+    if _corridas_http.get(asyncio.get_running_loop()):
+        yield _sesion_http()
+        return
+
+    async with _nueva_sesion_http() as sesion:
+        yield sesion
+
+async def cerrar_sesion_http():
+    """Cierra la sesión HTTP del event loop actual (se vuelve a crear si hace falta)."""
+    sesion = _sesiones_http.pop(asyncio.get_running_loop(), None)
+
+    if sesion is not None:
+        await sesion.close()
+
+def _tomar_sesion_http():
+    """Registra una corrida que usa la sesión HTTP del loop actual."""
+    loop = asyncio.get_running_loop()
+    _corridas_http[loop] = _corridas_http.get(loop, 0) + 1
+
+async def _soltar_sesion_http():
+    """Termina una corrida; si era la última del loop, cierra la sesión HTTP."""
+    loop = asyncio.get_running_loop()
+    _corridas_http[loop] = _corridas_http.get(loop, 1) - 1
+
+    if _corridas_http[loop] <= 0:
+        del _corridas_http[loop]
+        await cerrar_sesion_http()
+
+def _texto_visible(html: str, max_chars: int) -> str:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    text = soup.get_text(separator="\n", strip=True)
+    return text[:max_chars]
+
+async def descargar_texto(url: str, max_chars: int = 4000) -> str:
+    """
+    Descarga una página y retorna su texto visible recortado a `max_chars`. El HTML se
+    procesa en un hilo para no frenar el event loop. Los textos se guardan en el caché
+    en disco por URL normalizada (los errores no se guardan).
+    """
+    cargar_entorno()
+
+    with span("agente.fetch_url", url=url) as s:
+        try:
+            llave = f"{normalizar_url(url)}|{max_chars}"
+
+            if cache_activo():
+                texto = cache_paginas().obtener(llave)
+                if texto is not None:
+                    s.anotar(cache=True, caracteres=len(texto))
+                    return texto
+
+            async with _sesion_descarga() as sesion, sesion.get(url) as resp:
+                resp.raise_for_status()
+                html = await resp.text(errors="replace")
+            texto = await asyncio.to_thread(_texto_visible, html, max_chars)
+
+            if cache_activo():
+                cache_paginas().guardar(llave, texto)
+
+            s.anotar(cache=False, estado_http=resp.status, bytes_html=len(html), caracteres=len(texto))
+            return texto
+        except Exception as e:
+            s.anotar(fallo=str(e) or type(e).__name__)
+            return f"Error al acceder a la URL: {str(e) or type(e).__name__}"
+
+async def fetch_url(url: str, max_chars: int = 4000) -> str:
     """
     Descarga una página y retorna texto visible (recortado).
     """
-    try:
-        resp = requests.get(url, timeout=20)
-        resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, "html.parser")
-        text = soup.get_text(separator="\n", strip=True)
-        return text[:max_chars]
-    except Exception as e:
-        return f"Error al acceder a la URL: {str(e)}"
+    return await descargar_texto(url, max_chars)
 
 EXECUTOR_INSTRUCTIONS = """
 Eres un EXECUTOR. Tu trabajo es resolver subtareas CONCRETAS que te delega un Planner.
@@ -50,39 +177,153 @@ Formato de salida recomendado (texto):
 - Fuentes: lista de URLs.
 """
 
-executor = Agent(
-    name="Executor",
-    instructions=EXECUTOR_INSTRUCTIONS,
-    tools=[WebSearchTool(), fetch_url],
-)
+@lru_cache(maxsize=None)
+def obtener_executor():
+    """El agente EXECUTOR, construido la primera vez que se necesita."""
+    cargar_entorno()
+    from agents import Agent, WebSearchTool, function_tool
 
-@function_tool
-async def delegate_to_executor(subtask: str) -> str:
+    return Agent(
+        name="Executor",
+        instructions=EXECUTOR_INSTRUCTIONS,
+        tools=[WebSearchTool(), function_tool(fetch_url)],
+    )
+
+def _runner():
+    """El Runner del SDK, o el que se haya asignado a `agente_analista.Runner`."""
+    return globals().get("Runner") or __getattr__("Runner")
+
+# Ejecución de subtareas: una sola o varias en paralelo (fan-out) con un límite de
+# concurrencia y un tiempo máximo por subtarea. `runner` permite inyectar un Runner falso.
+
+# Corrida del Planner: hora límite y subtareas terminadas. Las subtareas se guardan a
+# medida que terminan para poder armar un informe parcial si se acaba el tiempo.
+
+class CorridaAgente:
+
+    def __init__(self, deadline: float = None, concurrencia: int = None):
+        self.fin = time.monotonic() + deadline if deadline else None
+        self.subtareas = []
+        # Un solo límite de Executors simultáneos para toda la corrida, aunque el Planner
+        # haga varias llamadas a delegate_to_executor/delegate_many_to_executor en paralelo
+        self.executors = asyncio.Semaphore(concurrencia or EXECUTOR_CONCURRENCIA)
+
+    def restante(self) -> Optional[float]:
+        return None if self.fin is None else self.fin - time.monotonic()
+
+_corrida = ContextVar("corrida_agente", default=None)
+
+def _presupuesto_subtarea(timeout: float) -> float:
+    """Tiempo para una subtarea: `timeout`, recortado a lo que le queda a la corrida."""
+    corrida = _corrida.get()
+    restante = corrida.restante() if corrida is not None else None
+
+    if restante is None:
+        return timeout
+
+    return min(timeout, restante - MARGEN_DEADLINE)
+
+def _guardar_subtarea(subtask: str, salida):
+    corrida = _corrida.get()
+
+    if corrida is not None and isinstance(salida, str) and salida.strip():
+        corrida.subtareas.append({"subtarea": subtask, "salida": salida})
+
+def _anotar_uso(s, result):
+    """Anota en el span los tokens que consumió una corrida del Runner (si los reporta)."""
+    uso = getattr(getattr(result, "context_wrapper", None), "usage", None)
+
+    if uso is not None:
+        s.anotar(solicitudes=getattr(uso, "requests", 0), tokens_entrada=getattr(uso, "input_tokens", 0),
+                 tokens_salida=getattr(uso, "output_tokens", 0), tokens_total=getattr(uso, "total_tokens", 0))
+
+async def ejecutar_subtarea(subtask: str, timeout: float = None, runner=None) -> str:
     """
-    Ejecuta la subtarea con el EXECUTOR y devuelve su salida final.
+    Corre una subtarea con el EXECUTOR. Si supera `timeout` segundos (o lo que le quede a
+    la corrida del Planner) retorna un mensaje de error en vez de bloquear al Planner. Las
+    respuestas se reutilizan desde el caché en disco para subtareas iguales (tras
+    normalizar el texto).
     """
+    cargar_entorno()
+    runner = runner or _runner()
+    llave = normalizar_subtarea(subtask)
+    corrida = _corrida.get()
+
+    # El tiempo se calcula ya con el cupo de la corrida: lo que se esperó no cuenta
+    async with (corrida.executors if corrida is not None else nullcontext()):
+        timeout = _presupuesto_subtarea(EXECUTOR_TIMEOUT if timeout is None else timeout)
+
+        with span("agente.subtarea", subtarea=subtask) as s:
+            return await _ejecutar_subtarea(s, subtask, llave, timeout, runner)
+
+async def _ejecutar_subtarea(s, subtask: str, llave: str, timeout: float, runner) -> str:
+
+    if cache_activo():
+        guardada = cache_respuestas().obtener(llave)
+        if guardada is not None:
+            print(f"--- EXECUTOR Respuesta desde caché: {subtask} ---")
+            s.anotar(cache=True)
+            _guardar_subtarea(subtask, guardada)
+            return guardada
+
+    if timeout <= 0:
+        print(f"--- EXECUTOR Sin tiempo para: {subtask} ---")
+        s.anotar(cache=False, tiempo_agotado=True)
+        return "Error: no queda tiempo para esta subtarea; integra lo que ya tienes."
+
     print(f"--- EXECUTOR Inicia Tarea: {subtask} ---")
-    res = await Runner.run(starting_agent=executor, input=subtask)
-    print(f"--- EXECUTOR Finaliza Tarea ---")
+
+    try:
+        res = await asyncio.wait_for(runner.run(starting_agent=obtener_executor(), input=subtask), timeout)
+    except asyncio.TimeoutError:
+        print(f"--- EXECUTOR Tiempo agotado: {subtask} ---")
+        s.anotar(cache=False, tiempo_agotado=True)
+        return f"Error: la subtarea superó el tiempo límite de {timeout:.0f} s."
+
+    print("--- EXECUTOR Finaliza Tarea ---")
+    s.anotar(cache=False)
+    _anotar_uso(s, res)
+
+    if cache_activo() and isinstance(res.final_output, str) and res.final_output.strip():
+        cache_respuestas().guardar(llave, res.final_output)
+
+    _guardar_subtarea(subtask, res.final_output)
+
     return res.final_output
 
+async def ejecutar_subtareas(subtasks: List[str], concurrencia: int = None, timeout: float = None,
+                             runner=None) -> List[str]:
+    """
+    Corre varias subtareas a la vez (máximo `concurrencia` simultáneas) y retorna sus
+    salidas en el mismo orden. Un error en una subtarea no afecta a las demás. Dentro de
+    una corrida del Planner además rige el límite de la corrida (EXECUTOR_CONCURRENCIA).
+    """
+    cargar_entorno()
+    limitar = concurrencia or _corrida.get() is None
+    semaforo = asyncio.Semaphore(concurrencia or EXECUTOR_CONCURRENCIA) if limitar else nullcontext()
 
-class ProgramItem(BaseModel):
-    program_name: Optional[str] = Field(None, description="Nombre del programa")
-    university: Optional[str] = Field(None, description="Universidad")
-    country: Optional[str] = Field(None, description="País")
-    url: Optional[str] = Field(None, description="URL oficial o principal")
-    courses_examples: List[str] = Field(default_factory=list, description="Curso(s) representativos si están disponibles")
-    tuition: Optional[str] = Field(None, description="Costo (monto+moneda+periodicidad) si está disponible")
-    intake_per_year: Optional[str] = Field(None, description="Ingreso/aforo anual si está disponible")
-    sources: List[str] = Field(default_factory=list)
+    async def correr(subtask: str) -> str:
+        async with semaforo:
+            try:
+                return await ejecutar_subtarea(subtask, timeout, runner)
+            except Exception as e:
+                return f"Error al ejecutar la subtarea: {str(e)}"
+
+    return list(await asyncio.gather(*(correr(s) for s in subtasks)))
+
+async def delegate_to_executor(subtask: str) -> str:
+    """
+    Ejecuta la subtarea con el EXECUTOR y devuelve su salida final.
+    """
+    return await ejecutar_subtarea(subtask)
+
+async def delegate_many_to_executor(subtasks: List[str]) -> List[str]:
+    """
+    Ejecuta varias subtareas INDEPENDIENTES con el EXECUTOR en paralelo y devuelve sus
+    salidas finales en el mismo orden de la lista.
+    """
+    return await ejecutar_subtareas(subtasks)
 
-class FinalReport(BaseModel):
-    input_program: str
-    input_description: str
-    coverage: dict
-    items: List[ProgramItem]
-    insights: List[str]
 
 # --- PLANNER AGENT ---
 
@@ -98,7 +339,8 @@ Reglas:
     2. Búsqueda de 2-3 programas similares en EE.UU. o Europa.
     3. Para CADA programa encontrado (LATAM y USA/Europa), encontrar: URL, 2-3 cursos clave del plan de estudios, y costo de matrícula (si está disponible públicamente).
     4. Análisis de tendencias generales del nombre del programa (keywords, popularidad).
-- Delega cada subtarea con 'delegate_to_executor'.
+- Las subtareas que no dependen entre sí (p. ej. la búsqueda en LATAM y la de EE.UU./Europa, o el detalle de cada programa ya encontrado) envíalas JUNTAS en una sola llamada a 'delegate_many_to_executor', que las ejecuta en paralelo.
+- Usa 'delegate_to_executor' solo para una subtarea suelta que dependa de resultados anteriores.
 - Sintetiza TODOS los hallazgos en el JSON final.
 
 Salida final:
@@ -116,20 +358,23 @@ Notas:
 - 'insights' debe resumir las tendencias de palabras clave.
 """
 
-planner = Agent(
-    name="Planner",
-    instructions=PLANNER_INSTRUCTIONS,
-    tools=[delegate_to_executor],
-    output_type=AgentOutputSchema(FinalReport, strict_json_schema=False)
-)
+@lru_cache(maxsize=None)
+def obtener_planner():
+    """El agente PLANNER, construido la primera vez que se necesita."""
+    cargar_entorno()
+    from agents import Agent, AgentOutputSchema, function_tool
+    from modelos_agente import FinalReport
 
-async def analizar_tendencias(nombre_programa: str, descripcion: str, programas_snies: str) -> dict:
-    """
-    Ejecuta el agente Planner-Executor para buscar tendencias internacionales.
-    """
-    print(f"Iniciando análisis de agentes para: {nombre_programa}...")
-    
-    prompt = f"""
+    return Agent(
+        name="Planner",
+        instructions=PLANNER_INSTRUCTIONS,
+        tools=[function_tool(delegate_many_to_executor), function_tool(delegate_to_executor)],
+        output_type=AgentOutputSchema(FinalReport, strict_json_schema=False)
+    )
+
+# Plantilla de la solicitud al Planner
+
+PROMPT_ANALISIS = """
     Quiero mapear programas similares a: "{nombre_programa}".
     Descripción corta: "{descripcion}".
     
@@ -144,12 +389,87 @@ async def analizar_tendencias(nombre_programa: str, descripcion: str, programas_
     - Analizar tendencias generales del nombre del programa (ej. "Data Science PhD trends", "Doctorado Ciencias Sociales demanda").
 
     Devuélveme el JSON final con el esquema 'FinalReport'.
+"""
+
+# Versión de las instrucciones/prompts: cambia si se edita cualquiera de ellos (se usa como
+# parte de la llave del caché de análisis completos).
+
+VERSION_PROMPTS = hashlib.sha256(
+    (EXECUTOR_INSTRUCTIONS + PLANNER_INSTRUCTIONS + PROMPT_ANALISIS).encode("utf-8")).hexdigest()[:12]
+
+def _resumir(texto: str, max_chars: int = 400) -> str:
+    texto = re.sub(r"\s+", " ", texto).strip()
+    return texto if len(texto) <= max_chars else texto[:max_chars].rstrip() + "..."
+
+def reporte_parcial(nombre_programa: str, descripcion: str, subtareas: list, motivo: str) -> dict:
+    """
+    FinalReport armado con las subtareas que alcanzaron a terminar (cuando el Planner no
+    entrega su informe). Lleva 'parcial': True para que no se guarde en el caché de análisis.
     """
+    from modelos_agente import FinalReport
 
-    result = await Runner.run(starting_agent=planner, input=prompt)
+    insights = [f"Informe parcial ({motivo}): se integraron {len(subtareas)} subtareas terminadas."]
+    insights += [f"{r['subtarea']}: {_resumir(r['salida'])}" for r in subtareas]
+    reporte = FinalReport(input_program=nombre_programa, input_description=descripcion,
+                          coverage={"local": 0, "national": 0, "international": 0},
+                          items=[], insights=insights)
 
-    print("Análisis de agentes completado.")
+    return dict(reporte.model_dump(), parcial=True, motivo=motivo, subtareas=subtareas)
+
+async def analizar_tendencias(nombre_programa: str, descripcion: str, programas_snies: str,
+                              runner=None, deadline: float = None) -> dict:
+    """
+    Ejecuta el agente Planner-Executor para buscar tendencias internacionales.
+    `runner` permite inyectar un Runner falso (p. ej. en benchmark.py).
+
+    La corrida tiene un tiempo límite (`deadline` segundos, por defecto AGENTE_DEADLINE; 0 =
+    sin límite) y cada subtarea recibe a lo sumo lo que le queda. Si se acaba el tiempo o
+    la salida del Planner no es un JSON válido, se retorna un informe parcial con las
+    subtareas que sí terminaron, así la presentación siempre se genera.
+    """
+    cargar_entorno()
+    runner = runner or _runner()
+    deadline = AGENTE_DEADLINE if deadline is None else deadline
+    print(f"Iniciando análisis de agentes para: {nombre_programa}...")
     
+    prompt = PROMPT_ANALISIS.format(nombre_programa=nombre_programa, descripcion=descripcion,
+                                    programas_snies=programas_snies)
+    planner = obtener_planner()
+    corrida = CorridaAgente(deadline)
+    token = _corrida.set(corrida)
+    result = None
+    _tomar_sesion_http()
+
+    with span("agente.planner", caracteres_prompt=len(prompt), deadline=deadline) as s:
+        try:
+            result = await asyncio.wait_for(runner.run(starting_agent=planner, input=prompt),
+                                            deadline or None)
+        except asyncio.TimeoutError:
+            print(f"--- PLANNER Tiempo agotado ({deadline:g} s): informe parcial con "
+                  f"{len(corrida.subtareas)} subtareas ---")
+            s.anotar(tiempo_agotado=True)
+        finally:
+            _corrida.reset(token)
+            await _soltar_sesion_http()
+
+        s.anotar(subtareas_terminadas=len(corrida.subtareas))
+
+        # Los tokens de los Executors quedan en los spans de cada subtarea
+        if result is not None:
+            _anotar_uso(s, result)
+
+    print("Análisis de agentes completado.")
+
+    if cache_activo():
+        print("Caché de páginas:", cache_paginas().estadisticas())
+        print("Caché de respuestas:", cache_respuestas().estadisticas())
+
+    if result is None:
+        return reporte_parcial(nombre_programa, descripcion, corrida.subtareas,
+                               f"se agotó el tiempo límite de {deadline:g} s")
+
+    from modelos_agente import FinalReport
+
     if isinstance(result.final_output, FinalReport):
         
         return result.final_output.model_dump() 
@@ -159,4 +479,21 @@ async def analizar_tendencias(nombre_programa: str, descripcion: str, programas_
             return json.loads(result.final_output)
         except json.JSONDecodeError:
             print("Error: La salida del agente no fue un JSON válido.")
-            return {"error": "La salida del agente no fue un JSON válido", "raw_output": str(result.final_output)}
\ No newline at end of file
+            return dict(reporte_parcial(nombre_programa, descripcion, corrida.subtareas,
+                                        "la salida del agente no fue un JSON válido"),
+                        raw_output=str(result.final_output))
+
+# Atributos diferidos del módulo
+
+def __getattr__(nombre: str):
+    if nombre == "executor":
+        return obtener_executor()
+    if nombre == "planner":
+        return obtener_planner()
+    if nombre in ("FinalReport", "ProgramItem"):
+        import modelos_agente
+        return getattr(modelos_agente, nombre)
+    if nombre == "Runner":
+        from agents import Runner
+        return Runner
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
@@ -0,0 +1,387 @@
+# Almacén materializado de agregados SNIES por programa
+
+# Cruzar MAESTRO con PROGRAMAS y OFERTA y recalcular los mismos groupby/pivots en cada
+# análisis es lo más costoso de la etapa local. Aquí se precalculan, una vez por versión
+# del dataset, tablas compactas indexadas por CODIGO_SNIES:
+#   - periodos:    CODIGO_SNIES x PERIODO con la institución (conteo de programas e IES)
+#   - procesos:    CODIGO_SNIES x PERIODO x PROCESO con la suma de CANTIDAD
+#   - matricula:   matriculados y valor de matrícula por periodo y ubicación (2021-1 a 2024-2)
+#   - ubicaciones: institución, programa, municipio y departamento (texto del prompt)
+# Un análisis solo toma la rebanada de sus programas equivalentes y la agrega.
+# En modo lote con varios procesos las tablas también van al snapshot Arrow de SNIES: cada
+# proceso las mapea sin copiarlas y solo la rebanada de cada consulta pasa a pandas.
+
+
+# Librerias necesarias
+
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from datos_snies import CACHE_DIR
+
+
+RANGO_PROXY_PER = (20211, 20242)
+TABLAS_AGREGADAS = ('periodos', 'procesos', 'matricula', 'ubicaciones')
+FORMATO_AGREGADOS = 3   # subir si cambian las columnas de las tablas agregadas
+
+
+def unir_tablas(maestro: pd.DataFrame, programas: pd.DataFrame, oferta: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cruce MAESTRO x PROGRAMAS x OFERTA (por programa y periodo) con solo las columnas que
+    traen las tablas. CODIGO_INSTITUCION se toma de la primera tabla que lo tenga (la que
+    antes quedaba como CODIGO_INSTITUCION_x), así el cruce no duplica columnas con sufijos.
+    """
+    tablas = [maestro, programas, oferta]
+    visto = False
+
+    for i, tabla in enumerate(tablas):
+
+        if 'CODIGO_INSTITUCION' in tabla.columns:
+
+            if visto:
+
+                tablas[i] = tabla.drop(columns = 'CODIGO_INSTITUCION')
+
+            visto = True
+
+    maestro, programas, oferta = tablas
+    maestro3 = maestro.merge(programas, on = 'CODIGO_SNIES', how = 'left')
+
+    return maestro3.merge(oferta, on = ['CODIGO_SNIES', 'PERIODO'], how = 'left')
+
+
+def _sin_categoricas(df: pd.DataFrame, columnas: list) -> pd.DataFrame:
+    """Pasa a object las columnas categóricas indicadas (sin convertir NaN en 'nan')."""
+    cambios = {col: df[col].astype(object) for col in columnas
+               if col in df.columns and isinstance(df[col].dtype, pd.CategoricalDtype)}
+
+    return df.assign(**cambios) if cambios else df
+
+
+def calcular_agregados(maestro4: pd.DataFrame) -> dict:
+    """
+    Tablas compactas a partir del cruce. Sirve tanto para precalcular sobre todo SNIES como
+    para el cálculo directo sobre los programas de una sola consulta.
+
+    CANTIDAD y PROXY_PER vienen como texto en los parquet (con 'null'); se convierten a
+    número para poder sumarlos (antes la suma concatenaba los textos). Las tablas de
+    entrada pueden traer categóricas; las de salida son pequeñas y quedan como texto
+    normal para que los groupby/pivots ordenen y agrupen igual que siempre.
+    """
+    cantidad = pd.to_numeric(maestro4['CANTIDAD'], errors = 'coerce')
+    proxy_per = pd.to_numeric(maestro4['PROXY_PER'], errors = 'coerce')
+
+    periodos = maestro4[['CODIGO_SNIES', 'PERIODO', 'CODIGO_INSTITUCION']].drop_duplicates()
+
+    procesos = (maestro4[['CODIGO_SNIES', 'PERIODO', 'PROCESO']]
+                .assign(CANTIDAD = cantidad)
+                .groupby(['CODIGO_SNIES', 'PERIODO', 'PROCESO'], as_index = False, sort = False,
+                         observed = True)['CANTIDAD']
+                .sum())
+    procesos = _sin_categoricas(procesos, ['PROCESO'])
+
+    # Matriculados entre 2021-1 y 2024-2 con valor de matrícula conocido
+
+    df = maestro4[(proxy_per >= RANGO_PROXY_PER[0]) & (proxy_per <= RANGO_PROXY_PER[1])].copy()
+    df['CANTIDAD'] = cantidad
+    df.loc[:,'Nombre_ies'] = df['INSTITUCION'].astype(object) + ' - ' + df['PROGRAMA_ACADEMICO'].astype(object)
+    df = df[df['PROCESO'] == 'MATRICULADOS']
+    df = df[['CODIGO_SNIES', 'MATRICULA', 'CANTIDAD', 'Nombre_ies', 'PERIODO',
+             'DEPARTAMENTO_PROGRAMA', 'MUNICIPIO_PROGRAMA']]
+    df = _sin_categoricas(df, ['DEPARTAMENTO_PROGRAMA', 'MUNICIPIO_PROGRAMA'])
+
+    df = df.dropna()
+    df = df[df['MATRICULA'] != 'null'].copy()
+
+    df['CANTIDAD'] = df['CANTIDAD'].astype(int)
+    df['MATRICULA'] = df['MATRICULA'].astype(float)
+
+    ubicaciones = _sin_categoricas(maestro4[['CODIGO_SNIES', 'INSTITUCION', 'PROGRAMA_ACADEMICO',
+                                             'MUNICIPIO_PROGRAMA', 'DEPARTAMENTO_PROGRAMA']].drop_duplicates(),
+                                   ['INSTITUCION', 'PROGRAMA_ACADEMICO', 'MUNICIPIO_PROGRAMA',
+                                    'DEPARTAMENTO_PROGRAMA'])
+
+    return {
+        'periodos': periodos.reset_index(drop = True),
+        'procesos': procesos,
+        'matricula': df.reset_index(drop = True),
+        'ubicaciones': ubicaciones.reset_index(drop = True),
+    }
+
+
+def _en_orden_de(tabla: pd.DataFrame, llaves: pd.DataFrame, columnas: list) -> pd.DataFrame:
+    """
+    Ordena `tabla` por la posición de la primera fila de `llaves` con la misma combinación
+    de `columnas` (orden estable entre filas empatadas, que ya vienen en su orden).
+    """
+    posiciones = (llaves[columnas].assign(__pos = np.arange(len(llaves)))
+                  .groupby(columnas, observed = True, sort = False, dropna = False)['__pos'].min().reset_index())
+    posiciones = _sin_categoricas(posiciones, columnas)
+    pos = tabla[columnas].merge(posiciones, on = columnas, how = 'left')['__pos'].to_numpy()
+
+    return tabla.iloc[np.argsort(pos, kind = 'stable')].reset_index(drop = True)
+
+
+def _filas_juntas(llaves: pd.DataFrame, columnas: list) -> bool:
+    """True si las filas de cada combinación de `columnas` están seguidas en `llaves`."""
+    if not len(llaves):
+
+        return True
+
+    tramos = (llaves[columnas] != llaves[columnas].shift()).any(axis = 1).sum()
+
+    return tramos == len(llaves[columnas].drop_duplicates())
+
+
+class AlmacenAgregados:
+    """Agregados precalculados de una versión del dataset, guardados en parquet."""
+
+    def __init__(self, tablas: dict, version: str = None):
+
+        self.tablas = tablas
+        self.version = version
+
+    @classmethod
+    def construir(cls, datos, columnas = None, motor: str = 'pandas'):
+        """
+        Calcula los agregados de todos los programas a partir de `datos` (DatosSNIES).
+        Con `motor='arrow'` el cruce y los groupby corren sobre Arrow (ver motor_arrow.py).
+        """
+        if motor == 'arrow':
+
+            from motor_arrow import unir_tablas_arrow, calcular_agregados_arrow
+
+            cruce = unir_tablas_arrow(*(datos.leer_arrow(nombre, columnas)
+                                        for nombre in ('MAESTRO', 'PROGRAMAS', 'OFERTA')))
+
+            return cls(calcular_agregados_arrow(cruce), datos.version)
+
+        maestro = datos.leer_tabla('MAESTRO', columnas)
+        programas = datos.leer_tabla('PROGRAMAS', columnas)
+        oferta = datos.leer_tabla('OFERTA', columnas)
+
+        return cls(calcular_agregados(unir_tablas(maestro, programas, oferta)), datos.version)
+
+    @staticmethod
+    def _directorio(version: str, cache_dir: str = None) -> str:
+
+        return os.path.join(cache_dir or CACHE_DIR, 'agregados', f'{version}-v{FORMATO_AGREGADOS}')
+
+    def guardar(self, cache_dir: str = None):
+        """Escribe un parquet por tabla; el directorio de la versión aparece completo o no aparece."""
+        destino = self._directorio(self.version, cache_dir)
+        actual = os.path.basename(destino)
+        base = os.path.dirname(destino)
+        tmp = destino + f'.tmp-{os.getpid()}'
+
+        os.makedirs(tmp, exist_ok = True)
+
+        for nombre, tabla in self.tablas.items():
+
+            tabla.to_parquet(os.path.join(tmp, f'{nombre}.parquet'), index = False)
+
+        if os.path.exists(destino):
+
+            shutil.rmtree(tmp, ignore_errors = True)
+
+        else:
+
+            os.replace(tmp, destino)
+
+        # Las versiones anteriores ya no sirven
+
+        for otra in os.listdir(base):
+
+            if otra != actual and '.tmp-' not in otra:
+
+                shutil.rmtree(os.path.join(base, otra), ignore_errors = True)
+
+    @classmethod
+    def cargar(cls, version: str, cache_dir: str = None):
+        """Carga los agregados de `version` si ya fueron precalculados; si no, retorna None."""
+        directorio = cls._directorio(version, cache_dir)
+
+        if not os.path.isdir(directorio):
+
+            return None
+
+        return cls({nombre: pd.read_parquet(os.path.join(directorio, f'{nombre}.parquet'))
+                    for nombre in TABLAS_AGREGADAS}, version)
+
+    # Snapshot Arrow compartido entre procesos
+
+    @staticmethod
+    def _rutas_snapshot(directorio: str) -> dict:
+
+        return {nombre: os.path.join(directorio, f'agregados-v{FORMATO_AGREGADOS}_{nombre}.arrow')
+                for nombre in TABLAS_AGREGADAS}
+
+    def exportar_snapshot(self, directorio: str, cache_dir: str = None):
+        """
+        Agrega estas tablas al snapshot Arrow de SNIES en `directorio`. Se toman de sus
+        parquet guardados (con los metadatos de pandas, así la rebanada tiene los mismos
+        tipos que al cargarlas con `cargar`).
+        """
+        origen = self._directorio(self.version, cache_dir)
+
+        for nombre, destino in self._rutas_snapshot(directorio).items():
+
+            if os.path.exists(destino):
+
+                continue
+
+            tabla = pq.read_table(os.path.join(origen, f'{nombre}.parquet')).unify_dictionaries()
+            tmp = f'{destino}.tmp-{os.getpid()}'
+
+            with pa.OSFile(tmp, 'wb') as f:
+                with pa.ipc.new_file(f, tabla.schema) as escritor:
+                    escritor.write_table(tabla)
+
+            os.replace(tmp, destino)
+
+    @classmethod
+    def desde_snapshot(cls, directorio: str, version: str = None):
+        """Agregados mapeados desde el snapshot (sin copiarlos); None si el snapshot no los tiene."""
+        rutas = cls._rutas_snapshot(directorio)
+
+        if not all(os.path.exists(ruta) for ruta in rutas.values()):
+
+            return None
+
+        return cls({nombre: pa.ipc.open_file(pa.memory_map(ruta, 'r')).read_all()
+                    for nombre, ruta in rutas.items()}, version)
+
+    @classmethod
+    def obtener(cls, datos, columnas = None, motor: str = 'pandas'):
+        """Agregados de la versión de `datos`: de disco si existen, si no se construyen y guardan."""
+        almacen = cls.cargar(datos.version, datos.cache_dir)
+
+        if almacen is None:
+
+            print("Precalculando agregados SNIES para la versión", datos.version, "...")
+            almacen = cls.construir(datos, columnas, motor)
+            almacen.guardar(datos.cache_dir)
+
+        return almacen
+
+    def actualizar(self, datos, periodos = (), codigos_snies = (), columnas = None, leer_periodos = None):
+        """
+        Agregados de la versión de `datos` recalculando solo lo que cambió: las filas de los
+        `periodos` nuevos o modificados y las de los programas `codigos_snies` que cambiaron
+        en PROGRAMAS. El resto de filas se conserva tal cual.
+
+        `leer_periodos(nombre, periodos, columnas)` lee las filas de esos periodos (p. ej.
+        del almacén particionado, sin escanear el histórico); por defecto se leen del
+        parquet en caché. Las tablas quedan en el mismo orden que en un cálculo completo,
+        que es el orden de MAESTRO (de él dependen 'last' y el orden de las ubicaciones).
+
+        'matricula' tiene una fila por fila de MAESTRO, no una por combinación: si en MAESTRO
+        las filas de MATRICULADOS de un programa y periodo no están seguidas (p. ej. una por
+        SEXO, intercaladas con las de otros programas) su orden no se puede reconstruir sin
+        recalcular, y se construyen los agregados completos.
+        """
+        # Solo se leen las columnas llave de MAESTRO, no el histórico completo
+
+        llaves = datos.leer_tabla('MAESTRO', ['CODIGO_SNIES', 'PERIODO', 'PROCESO', 'CODIGO_INSTITUCION'])
+        matriculados = llaves[llaves['PROCESO'] == 'MATRICULADOS']
+
+        if not _filas_juntas(matriculados, ['CODIGO_SNIES', 'PERIODO']):
+
+            print("MATRICULADOS intercalados en MAESTRO: se construyen los agregados completos ...")
+
+            return AlmacenAgregados.construir(datos, columnas)
+
+        periodos = list(periodos)
+        codigos = list(codigos_snies)
+        programas = datos.leer_tabla('PROGRAMAS', columnas)
+        tablas = {}
+
+        # Se compara como texto: los periodos/códigos pueden venir de un manifiesto JSON
+
+        periodos_txt = {str(p) for p in periodos}
+        codigos_txt = {str(c) for c in codigos}
+
+        for nombre in ('periodos', 'procesos', 'matricula'):
+
+            tabla = self.tablas[nombre]
+            quitar = tabla['PERIODO'].astype(str).isin(periodos_txt) | tabla['CODIGO_SNIES'].astype(str).isin(codigos_txt)
+            tablas[nombre] = tabla[~quitar]
+
+        # Filas a recalcular: (PERIODO en periodos) o (CODIGO_SNIES en codigos), sin repetir
+
+        def leer(nombre):
+
+            partes = []
+
+            if periodos:
+
+                parte = (leer_periodos(nombre, periodos, columnas) if leer_periodos is not None
+                         else datos.leer_tabla(nombre, columnas, periodos = periodos))
+
+                if parte is not None:
+
+                    partes.append(parte)
+
+            if codigos:
+
+                parte = datos.leer_tabla(nombre, columnas, codigos_snies = codigos)
+                partes.append(parte[~parte['PERIODO'].astype(str).isin(periodos_txt)])
+
+            return pd.concat(partes, ignore_index = True) if partes else None
+
+        maestro = leer('MAESTRO')
+
+        if maestro is not None and len(maestro):
+
+            nuevos = calcular_agregados(unir_tablas(maestro, programas, leer('OFERTA')))
+
+            for nombre in ('periodos', 'procesos', 'matricula'):
+
+                tablas[nombre] = pd.concat([tablas[nombre], nuevos[nombre]], ignore_index = True)
+
+        # Orden de un cálculo completo: el de la primera fila de MAESTRO de cada combinación
+        # (periodos y procesos tienen una fila por combinación; en matricula las filas de
+        # una combinación están seguidas y vienen de una sola parte, ya en su orden)
+
+        por_periodo = [c for c in ('CODIGO_SNIES', 'PERIODO', 'CODIGO_INSTITUCION') if c in llaves.columns]
+        tablas['periodos'] = _en_orden_de(tablas['periodos'], llaves, por_periodo)
+        tablas['procesos'] = _en_orden_de(tablas['procesos'], llaves, ['CODIGO_SNIES', 'PERIODO', 'PROCESO'])
+        tablas['matricula'] = _en_orden_de(tablas['matricula'], matriculados, ['CODIGO_SNIES', 'PERIODO'])
+
+        # Las ubicaciones salen de PROGRAMAS para los programas que siguen en MAESTRO
+
+        columnas_ubicacion = ['CODIGO_SNIES', 'INSTITUCION', 'PROGRAMA_ACADEMICO',
+                              'MUNICIPIO_PROGRAMA', 'DEPARTAMENTO_PROGRAMA']
+        ubicaciones = (tablas['periodos'][['CODIGO_SNIES']].drop_duplicates()
+                       .merge(programas[columnas_ubicacion], on = 'CODIGO_SNIES', how = 'left')
+                       .drop_duplicates())
+        tablas['ubicaciones'] = _sin_categoricas(ubicaciones, columnas_ubicacion[1:]).reset_index(drop = True)
+
+        return AlmacenAgregados(tablas, datos.version)
+
+    def rebanar(self, codigos_snies) -> dict:
+        """
+        Filas de los programas `codigos_snies`, en el mismo orden en que se precalcularon.
+        Si las tablas son Arrow (snapshot) se filtran ahí y solo la rebanada pasa a pandas;
+        en los dos casos la rebanada queda con un índice 0..n-1.
+        """
+        rebanadas = {}
+
+        for nombre, tabla in self.tablas.items():
+
+            if isinstance(tabla, pa.Table):
+
+                codigos = pa.array(list(codigos_snies)).cast(tabla.schema.field('CODIGO_SNIES').type)
+                rebanadas[nombre] = tabla.filter(pc.is_in(tabla['CODIGO_SNIES'], value_set = codigos)).to_pandas()
+
+            else:
+
+                rebanadas[nombre] = tabla[tabla['CODIGO_SNIES'].isin(codigos_snies)].reset_index(drop = True)
+
+        return rebanadas
@@ -0,0 +1,830 @@
+# Benchmark con datos sintéticos de las etapas SNIES y del reporte
+
+# Medir el rendimiento necesitaba los parquet remotos del profe y un LLM en vivo. Aquí:
+#   - se generan tablas MAESTRO/OFERTA/PROGRAMAS/IES con la misma forma que las de SNIES
+#     a una escala configurable (1x, 10x, 100x filas)
+#   - el Runner del agente se reemplaza por uno falso que devuelve un FinalReport fijo
+#   - se mide tiempo (mediana de varias repeticiones) y memoria (pico de tracemalloc) de
+#     cada etapa: sincronización, índice, equivalentes + cruce + agregados, texto del
+#     prompt, tablas + gráficas (en memoria), agente (falso) y presentación (en memoria)
+#   - los tiempos y un hash de los resultados se comparan contra una línea base guardada
+#   - el cruce y los agregados se calculan con los dos motores (pandas y Arrow) y se
+#     verifica que den exactamente las mismas tablas (--solo-motores hace solo esa revisión,
+#     en datos pequeños y con MAESTRO intercalado)
+#   - en una consulta amplia se compara el pico de memoria del cruce compacto (categóricas,
+#     números y solo los programas equivalentes) con el del cruce sin compactar
+#   - las tablas se exportan a un snapshot Arrow y se verifica que adjuntarse a él no
+#     copie memoria y dé las mismas tablas que la lectura desde el caché
+#   - se mide la memoria anónima (/proc/self/smaps_rollup) que agrega un proceso del lote
+#     al cargar tablas + agregados y responder las consultas, adjunto al snapshot frente a
+#     una copia privada: con el snapshot no debe crecer con el tamaño de las tablas
+#   - la actualización incremental de los agregados (un periodo cambiado y uno nuevo) debe
+#     dar las mismas tablas, en el mismo orden, que un cálculo completo; también con MAESTRO
+#     intercalado (una fila por SEXO, ordenado por PERIODO, SEXO y PROCESO)
+#   - la gráfica de evolución de matrícula se mide con 50, 500 y 5000 programas: desde
+#     GRAFICAS_MAX_SERIES pasa a bandas de percentiles y su tiempo no debe crecer
+#   - se mide el tiempo de importación de main.py y agente_analista.py (python -X importtime)
+#     contra un presupuesto, y que no carguen pandas, matplotlib, el SDK de agentes, ...
+#
+# Uso:
+#   python benchmark.py --escala 1 10 --guardar-base benchmark_base.json
+#   python benchmark.py --escala 1 10 --comparar benchmark_base.json
+#   python benchmark.py --solo-motores
+
+
+# Librerias necesarias
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+# Sin caché del agente: cada repetición debe medir el mismo trabajo
+
+os.environ.setdefault('CACHE_AGENTE', '0')
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from datos_snies import DatosSNIES, limpiar_cache, COLUMNAS_NUMERICAS
+from indice_programas import IndiceProgramas
+from agregados_snies import AlmacenAgregados, unir_tablas
+from actualizacion_snies import actualizar_snies
+from procesador_snies import (preparar_snies, completar_snies, construir_texto_programas,
+                              COLUMNAS_USADAS)
+from agente_analista import (analizar_tendencias, ejecutar_subtareas, obtener_planner, obtener_executor,
+                             FinalReport, ProgramItem)
+from generador_reporte import crear_presentacion, cargar_plantilla
+import graficas_snies
+
+
+PROGRAMAS_BASE = 500        # programas a escala 1x (MAESTRO ~ 100 filas por programa)
+CONSULTAS = ['Doctorado Matematicas', 'Medicina', 'Ingenieria de Sistemas',
+             'Maestria en Ciencia de Datos']
+TOLERANCIA = 0.25           # regresión si una etapa es más de 25 % más lenta que la base
+PISO_RUIDO_S = 0.02         # diferencias menores a esto no cuentan como regresión
+
+# Importar estos módulos no debe pasar de su presupuesto ni cargar dependencias pesadas
+# (se importan dentro de las funciones que las usan)
+
+PRESUPUESTO_IMPORTACION_S = {'main': 0.3, 'agente_analista': 0.2, 'cache_analisis': 0.05, 'trazas': 0.05}
+MODULOS_PESADOS = ('pandas', 'pyarrow', 'numpy', 'matplotlib', 'agents', 'openai', 'pydantic', 'pptx',
+                   'bs4', 'aiohttp', 'dotenv')
+
+
+# Generador de datos sintéticos
+
+NIVELES = ['DOCTORADO EN', 'MAESTRIA EN', 'ESPECIALIZACION EN', 'TECNOLOGIA EN', 'LICENCIATURA EN', '']
+AREAS = ['MATEMATICAS', 'MEDICINA', 'INGENIERIA DE SISTEMAS', 'CIENCIA DE DATOS', 'DERECHO',
+         'ADMINISTRACION DE EMPRESAS', 'CONTADURIA PUBLICA', 'PSICOLOGIA', 'ENFERMERIA',
+         'INGENIERIA CIVIL', 'INGENIERIA INDUSTRIAL', 'ECONOMIA', 'FISICA', 'QUIMICA', 'BIOLOGIA',
+         'EDUCACION', 'ARQUITECTURA', 'COMUNICACION SOCIAL', 'CIENCIAS SOCIALES', 'MATEMATICAS APLICADAS']
+DEPARTAMENTOS = {
+    'ANTIOQUIA': ['MEDELLIN', 'ENVIGADO', 'RIONEGRO'],
+    'BOGOTA D.C.': ['BOGOTA D.C.'],
+    'VALLE DEL CAUCA': ['CALI', 'PALMIRA'],
+    'ATLANTICO': ['BARRANQUILLA'],
+    'SANTANDER': ['BUCARAMANGA', 'FLORIDABLANCA'],
+    'BOLIVAR': ['CARTAGENA'],
+    'CALDAS': ['MANIZALES'],
+    'RISARALDA': ['PEREIRA'],
+    'NARIÑO': ['PASTO'],
+    'BOYACA': ['TUNJA', 'DUITAMA'],
+}
+PROCESOS = ['INSCRITOS', 'ADMITIDOS', 'MATRICULADOS', 'PRIMER CURSO', 'GRADUADOS']
+PERIODOS = [(anio, sem) for anio in range(2015, 2025) for sem in (1, 2)]
+SERIES_EVOLUCION = (50, 500, 5000)
+CONSULTA_AMPLIA = 'Administracion de Empresas'   # todos los niveles: muchos programas equivalentes
+
+
+def _texto_con_nulos(valores: np.ndarray, rng, fraccion_nulos: float) -> pa.Array:
+    """Números como texto con una fracción de 'null' (así vienen CANTIDAD y MATRICULA)."""
+    textos = valores.astype(np.int64).astype(str).astype(object)
+    textos[rng.random(len(textos)) < fraccion_nulos] = 'null'
+
+    return pa.array(textos, type = pa.string())
+
+
+def generar_datos(directorio: str, escala: float = 1, semilla: int = 0) -> dict:
+    """
+    Escribe MAESTRO/OFERTA/PROGRAMAS/IES sintéticos en `directorio` y retorna el número
+    de filas de cada tabla. Las filas crecen linealmente con `escala`.
+    """
+    rng = np.random.default_rng(semilla)
+    os.makedirs(directorio, exist_ok = True)
+
+    n_prog = max(20, int(PROGRAMAS_BASE * escala))
+    n_ies = max(10, n_prog // 10)
+
+    # IES
+
+    cod_ies = np.arange(1000, 1000 + n_ies)
+    nombres_ies = np.array([f'UNIVERSIDAD SINTETICA {i}' for i in range(n_ies)], dtype = object)
+
+    ies = pa.table({
+        'CODIGO_INSTITUCION': pa.array(cod_ies),
+        'INSTITUCION': pa.array(nombres_ies, type = pa.string()),
+        'IES_PADRE': pa.array(cod_ies),
+    })
+
+    # PROGRAMAS
+
+    nombres = np.array([f'{n} {a}'.strip() for n in NIVELES for a in AREAS], dtype = object)
+    deptos = list(DEPARTAMENTOS)
+    cod_snies = np.arange(100000, 100000 + n_prog)
+    ies_prog = rng.integers(0, n_ies, n_prog)
+    depto_prog = rng.integers(0, len(deptos), n_prog)
+    mpio_prog = np.array([DEPARTAMENTOS[deptos[d]][rng.integers(len(DEPARTAMENTOS[deptos[d]]))]
+                          for d in depto_prog], dtype = object)
+
+    programas = pa.table({
+        'CODIGO_SNIES': pa.array(cod_snies),
+        'CODIGO_INSTITUCION': pa.array(cod_ies[ies_prog]),
+        'IES_PADRE': pa.array(cod_ies[ies_prog]),
+        'INSTITUCION': pa.array(nombres_ies[ies_prog], type = pa.string()),
+        'PROGRAMA_ACADEMICO': pa.array(nombres[rng.integers(0, len(nombres), n_prog)], type = pa.string()),
+        'DEPARTAMENTO_PROGRAMA': pa.array(np.array(deptos, dtype = object)[depto_prog], type = pa.string()),
+        'MUNICIPIO_PROGRAMA': pa.array(mpio_prog, type = pa.string()),
+    })
+
+    # Cada programa existe desde un periodo de inicio al azar hasta 2024-2
+
+    inicio = rng.integers(0, len(PERIODOS) - 2, n_prog)
+    activos = np.concatenate([np.arange(i, len(PERIODOS)) for i in inicio])
+    prog_activo = np.repeat(np.arange(n_prog), len(PERIODOS) - inicio)
+    periodo_txt = np.array([f'{a}-{s}' for a, s in PERIODOS], dtype = object)
+    proxy_txt = np.array([f'{a}{s}' for a, s in PERIODOS], dtype = object)
+
+    # OFERTA: un valor de matrícula por programa y periodo (crece ~5 % por año)
+
+    base = rng.uniform(2e6, 3e7, n_prog)
+    matricula = base[prog_activo] * 1.025 ** activos
+
+    oferta = pa.table({
+        'CODIGO_SNIES': pa.array(cod_snies[prog_activo]),
+        'PERIODO': pa.array(periodo_txt[activos], type = pa.string()),
+        'MATRICULA': _texto_con_nulos(matricula, rng, 0.1),
+    })
+
+    # MAESTRO: programa x periodo x proceso con la cantidad de estudiantes
+
+    n_proc = len(PROCESOS)
+    fila_prog = np.repeat(prog_activo, n_proc)
+    fila_per = np.repeat(activos, n_proc)
+    fila_proc = np.tile(np.arange(n_proc), len(activos))
+    escala_proc = np.array([3.0, 2.0, 1.5, 1.0, 0.4])
+    cantidad = rng.poisson(40 * escala_proc[fila_proc])
+
+    maestro = pa.table({
+        'CODIGO_SNIES': pa.array(cod_snies[fila_prog]),
+        'CODIGO_INSTITUCION': pa.array(cod_ies[ies_prog][fila_prog]),
+        'PERIODO': pa.array(periodo_txt[fila_per], type = pa.string()),
+        'PROXY_PER': pa.array(proxy_txt[fila_per], type = pa.string()),
+        'PROCESO': pa.array(np.array(PROCESOS, dtype = object)[fila_proc], type = pa.string()),
+        'CANTIDAD': _texto_con_nulos(cantidad, rng, 0.03),
+    })
+
+    tablas = {'MAESTRO': maestro, 'OFERTA': oferta, 'PROGRAMAS': programas, 'IES': ies}
+
+    for nombre, tabla in tablas.items():
+
+        pq.write_table(tabla, os.path.join(directorio, f'{nombre}.parquet'), row_group_size = 100_000)
+
+    return {nombre: tabla.num_rows for nombre, tabla in tablas.items()}
+
+
+# Runner falso del agente
+
+class RunnerFalso:
+    """Imita `agents.Runner.run`: espera `latencia` segundos y devuelve un FinalReport fijo."""
+
+    def __init__(self, latencia: float = 0.0):
+
+        self.latencia = latencia
+
+    async def run(self, starting_agent, input, **kwargs):
+
+        if self.latencia:
+
+            await asyncio.sleep(self.latencia)
+
+        if getattr(starting_agent, 'name', '') == 'Executor':
+
+            salida = f'- Hallazgo sintético para: {input[:60]}\nFuentes: https://example.org'
+
+        else:
+
+            salida = reporte_falso()
+
+        uso = SimpleNamespace(requests = 1, input_tokens = len(input) // 4, output_tokens = 200,
+                              total_tokens = len(input) // 4 + 200)
+
+        return SimpleNamespace(final_output = salida, context_wrapper = SimpleNamespace(usage = uso))
+
+
+def reporte_falso() -> FinalReport:
+
+    items = [ProgramItem(program_name = f'Programa {i}', university = f'Universidad {i}',
+                         country = pais, url = f'https://example.org/{i}',
+                         courses_examples = ['Curso A', 'Curso B'], tuition = 'USD 10.000 / año',
+                         sources = [f'https://example.org/{i}'])
+             for i, pais in enumerate(['México', 'Chile', 'Argentina', 'USA', 'España', 'Alemania'])]
+
+    return FinalReport(input_program = 'Programa', input_description = 'Descripción',
+                       coverage = {'local': 0, 'national': 0, 'international': len(items)},
+                       items = items, insights = ['Tendencia sintética 1', 'Tendencia sintética 2'])
+
+
+# Medición
+
+def evolucion_sintetica(series: int, semilla: int = 0) -> pd.DataFrame:
+    """Tabla larga (Nombre_ies, PERIODO, MATRICULA) con ~70 % de los periodos por programa."""
+    rng = np.random.default_rng(semilla)
+    periodos = np.array([f'{anio}-{sem}' for anio, sem in PERIODOS])
+    presente = rng.random((series, len(periodos))) < 0.7
+    serie, periodo = np.nonzero(presente)
+    base = rng.uniform(1e6, 2e7, series)
+
+    return pd.DataFrame({
+        'Nombre_ies': np.array([f'IES {i} - PROGRAMA {i}' for i in range(series)], dtype = object)[serie],
+        'PERIODO': periodos[periodo],
+        'MATRICULA': base[serie] * (1 + 0.04 * periodo) * rng.uniform(0.9, 1.1, len(serie)),
+    })
+
+
+def cruces_consulta(datos: DatosSNIES, indice: IndiceProgramas, consulta: str) -> dict:
+    """
+    Funciones que arman el cruce de `consulta` de dos formas: la compacta (categóricas,
+    números y solo las filas de PROGRAMAS de los equivalentes) y la sin compactar (texto
+    como objetos Python, números como texto, todo PROGRAMAS y CODIGO_INSTITUCION con
+    sufijos _x/_y), para comparar su memoria.
+    """
+    programas = datos.leer_tabla('PROGRAMAS', COLUMNAS_USADAS)
+    snies = list(programas.loc[programas['PROGRAMA_ACADEMICO'].isin(indice.buscar(consulta)), 'CODIGO_SNIES'].unique())
+    maestro = datos.leer_tabla('MAESTRO', COLUMNAS_USADAS, codigos_snies = snies)
+    oferta = datos.leer_tabla('OFERTA', COLUMNAS_USADAS, codigos_snies = snies)
+
+    def sin_compactar(df):
+
+        return df.assign(**{col: (df[col].astype(str) if col in COLUMNAS_NUMERICAS else df[col]).astype(object)
+                            for col in df.columns if col in COLUMNAS_NUMERICAS or not pd.api.types.is_numeric_dtype(df[col])})
+
+    maestro_o, programas_o, oferta_o = sin_compactar(maestro), sin_compactar(programas), sin_compactar(oferta)
+
+    return {
+        'compacto': lambda: unir_tablas(maestro, programas[programas['CODIGO_SNIES'].isin(snies)], oferta),
+        'sin_compactar': lambda: (maestro_o.merge(programas_o, on = 'CODIGO_SNIES', how = 'left')
+                                  .merge(oferta_o, on = ['CODIGO_SNIES', 'PERIODO'], how = 'left')),
+    }
+
+
+def medir_etapa(funcion, repeticiones: int = 3) -> dict:
+    """
+    Corre `funcion` `repeticiones` veces para el tiempo (mediana y mínimo) y una vez más
+    con tracemalloc para el pico de memoria de Python/numpy (la memoria interna de Arrow y
+    la de los procesos de gráficas no se ven aquí).
+    """
+    tiempos = []
+    resultado = None
+
+    for _ in range(repeticiones):
+
+        t0 = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - t0)
+
+    tracemalloc.start()
+
+    try:
+        funcion()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {'mediana_s': round(statistics.median(tiempos), 4), 'min_s': round(min(tiempos), 4),
+            'pico_mb': round(pico / 2**20, 2)}, resultado
+
+
+def huella(resultados: dict) -> str:
+    """Hash de las tablas y del texto de un análisis SNIES (para detectar cambios de resultado)."""
+    contenido = json.dumps({'tablas': resultados['tablas'], 'texto': resultados['texto_programas']},
+                           sort_keys = True, default = str)
+
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()[:16]
+
+
+def diferencias_motores(tablas_pandas: dict, tablas_arrow: dict) -> list:
+    """Tablas que no son idénticas (valores, orden y tipos) entre los dos motores."""
+    diferencias = []
+
+    for nombre, tabla in tablas_pandas.items():
+
+        try:
+            pd.testing.assert_frame_equal(tabla, tablas_arrow.get(nombre), check_exact = True)
+        except AssertionError as e:
+            diferencias.append(f"{nombre}: {str(e).splitlines()[0]}")
+
+    return diferencias
+
+
+def correr_escala(escala: float, directorio: str, consultas: list, repeticiones: int,
+                  paralelo: bool) -> dict:
+    """Genera los datos de una escala y mide cada etapa. Retorna {'filas', 'etapas', 'resultados'}."""
+    dir_datos = os.path.join(directorio, f'escala_{escala}', 'fuente')
+    dir_cache = os.path.join(directorio, f'escala_{escala}', 'cache')
+
+    filas = generar_datos(dir_datos, escala)
+    print(f"--- Escala {escala}x: " + ", ".join(f"{k} {v:,}" for k, v in filas.items()) + " filas ---")
+
+    etapas = {}
+    resultados = {}
+
+    def registrar(nombre, funcion, reps = repeticiones):
+
+        medida, salida = medir_etapa(funcion, reps)
+        etapas[nombre] = medida
+        print(f"  {nombre:45} {medida['mediana_s']:9.4f} s  pico {medida['pico_mb']:9.2f} MB")
+
+        return salida
+
+    # Sincronización en frío (copia al caché y versión del dataset)
+
+    def sincronizar():
+
+        limpiar_cache(dir_cache)
+
+        return DatosSNIES(fuente = dir_datos, cache_dir = dir_cache)
+
+    datos = registrar('sincronizar', sincronizar)
+    programas = datos.leer_tabla('PROGRAMAS', COLUMNAS_USADAS)
+    indice = registrar('indice', lambda: IndiceProgramas.desde_serie(programas['PROGRAMA_ACADEMICO']))
+
+    # Equivalentes + lectura con filtro + cruce + agregados (sin precalcular)
+
+    preparados = {}
+
+    for consulta in consultas:
+
+        preparados[consulta] = registrar(f'preparar_cruce[{consulta}]',
+                                         lambda: preparar_snies(consulta, datos, indice, motor = 'pandas'))
+
+    # Lo mismo con el motor Arrow: debe dar exactamente las mismas tablas
+
+    motores = []
+
+    for consulta in consultas:
+
+        preparado = registrar(f'preparar_cruce_arrow[{consulta}]',
+                              lambda: preparar_snies(consulta, datos, indice, motor = 'arrow'))
+        motores += [f'{consulta} {d}' for d in diferencias_motores(preparados[consulta]['tablas'],
+                                                                  preparado['tablas'])]
+
+    # Agregados precalculados y rebanada por consulta
+
+    agregados = registrar('precalcular_agregados',
+                          lambda: AlmacenAgregados.construir(datos, COLUMNAS_USADAS, 'pandas'), 1)
+    agregados_arrow = registrar('precalcular_agregados_arrow',
+                                lambda: AlmacenAgregados.construir(datos, COLUMNAS_USADAS, 'arrow'), 1)
+    motores += [f'precalculados {d}' for d in diferencias_motores(agregados.tablas, agregados_arrow.tablas)]
+    print(f"  Motores pandas / Arrow: {'mismos resultados' if not motores else f'{len(motores)} diferencias'}")
+
+    # Snapshot Arrow para varios procesos: adjuntarse no debe copiar las tablas
+
+    def exportar_snapshot():
+
+        shutil.rmtree(os.path.join(dir_cache, 'snapshots'), ignore_errors = True)
+
+        return DatosSNIES.cargar_compartida(COLUMNAS_USADAS, dir_datos, dir_cache).snapshot
+
+    snapshot = registrar('snapshot_exportar', exportar_snapshot, 1)
+    antes = pa.total_allocated_bytes()
+    compartida = registrar('snapshot_adjuntar', lambda: DatosSNIES.desde_snapshot(snapshot, dir_datos, dir_cache))
+    copiado = pa.total_allocated_bytes() - antes
+    diferencias = [f'{consulta} {d}' for consulta in consultas
+                   for d in diferencias_motores(preparados[consulta]['tablas'],
+                                                preparar_snies(consulta, compartida, indice, motor = 'pandas')['tablas'])]
+    diferencias += [f'adjuntar copió {copiado:,} bytes'] if copiado > 0 else []
+    print(f"  Snapshot Arrow: {'zero-copy, mismos resultados' if not diferencias else f'{len(diferencias)} problemas'}")
+    motores += [f'snapshot {d}' for d in diferencias]
+
+    # Agregados en el snapshot: la misma rebanada que al cargarlos del caché y memoria de cada proceso
+
+    agregados.guardar(dir_cache)
+    agregados.exportar_snapshot(snapshot, dir_cache)
+    guardados = AlmacenAgregados.cargar(agregados.version, dir_cache)
+    mapeados = AlmacenAgregados.desde_snapshot(snapshot, agregados.version)
+    motores += [f'snapshot agregados {consulta} {d}' for consulta in consultas
+                for d in diferencias_motores(preparar_snies(consulta, datos, indice, agregados = guardados)['tablas'],
+                                             preparar_snies(consulta, compartida, indice, agregados = mapeados)['tablas'])]
+    motores += [f'snapshot {p}' for p in revisar_memoria_trabajador(snapshot, dir_datos, dir_cache, consultas)]
+
+    # Consulta amplia: memoria del cruce compacto frente al cruce sin compactar
+
+    for forma, cruce in cruces_consulta(datos, indice, CONSULTA_AMPLIA).items():
+
+        registrar(f'cruce_amplio_{forma}', cruce, 1)
+
+    compacto, sin_compactar = (etapas[f'cruce_amplio_{forma}']['pico_mb'] for forma in ('compacto', 'sin_compactar'))
+    print(f"  Cruce '{CONSULTA_AMPLIA}': pico {compacto:.2f} MB compacto vs. {sin_compactar:.2f} MB sin compactar "
+          f"({100 * (1 - compacto / sin_compactar):.0f} % menos)" if sin_compactar else '')
+
+    for consulta in consultas:
+
+        registrar(f'preparar_agregados[{consulta}]', lambda: preparar_snies(consulta, datos, indice, agregados = agregados))
+
+    # Texto del prompt, tablas + gráficas, agente falso y presentación
+
+    for consulta in consultas:
+
+        tablas = preparados[consulta]['tablas']
+        registrar(f'texto_programas[{consulta}]',
+                  lambda: construir_texto_programas(tablas['ubicaciones'], tablas['procesos']))
+
+        datos_snies = registrar(f'completar[{consulta}]', lambda: completar_snies(preparados[consulta], None, paralelo))
+        resultados[consulta] = huella(datos_snies)
+
+    # Evolución de matrícula con muchos programas: el tiempo no debe crecer con las series
+
+    for series in SERIES_EVOLUCION:
+
+        evolucion = evolucion_sintetica(series)
+        registrar(f'grafica_evolucion[{series} series]', lambda: graficas_snies.graficar_evolucion_matricula(evolucion))
+
+    consulta = consultas[0]
+    texto = preparados[consulta]['texto_programas']
+
+    # Los agentes (y el SDK) se construyen la primera vez que se usan; eso no se mide aquí
+
+    obtener_planner()
+    obtener_executor()
+    datos_agente = registrar('agente_falso', lambda: asyncio.run(
+        analizar_tendencias(consulta, 'Descripción', texto, runner = RunnerFalso())))
+
+    subtareas = [f'Subtarea sintética {i}' for i in range(8)]
+    registrar('subtareas_falsas[8 x 50 ms]', lambda: asyncio.run(
+        ejecutar_subtareas(subtareas, runner = RunnerFalso(latencia = 0.05))))
+
+    plantilla = cargar_plantilla()
+    registrar('presentacion', lambda: crear_presentacion(consulta, datos_snies, datos_agente, None, plantilla))
+
+    return {'filas': filas, 'etapas': etapas, 'resultados': resultados, 'motores': motores}
+
+
+# Memoria de un proceso del lote (--procesos)
+
+def medir_trabajador(snapshot: str, dir_datos: str, dir_cache: str, consultas: list) -> tuple:
+    """
+    En un proceso nuevo carga tablas + agregados como un trabajador del lote (adjunto a
+    `snapshot`, o una copia privada si es None) y responde `consultas`. Retorna los MB de
+    memoria anónima que agregaron la carga y la carga + las consultas; las páginas del
+    archivo mapeado no cuentan, se comparten entre procesos.
+    """
+    codigo = f"""
+import sys
+from datos_snies import DatosSNIES
+from agregados_snies import AlmacenAgregados
+from procesador_snies import preparar_snies, COLUMNAS_USADAS
+from indice_programas import IndiceProgramas
+
+def anonima():
+    with open('/proc/self/smaps_rollup') as f:
+        return next(int(l.split()[1]) for l in f if l.startswith('Anonymous:'))
+
+antes = anonima()
+snapshot, fuente, cache = {snapshot!r}, {dir_datos!r}, {dir_cache!r}
+
+if snapshot:
+    datos = DatosSNIES.desde_snapshot(snapshot, fuente, cache)
+    agregados = AlmacenAgregados.desde_snapshot(snapshot, datos.version)
+else:
+    datos = DatosSNIES.cargar(COLUMNAS_USADAS, fuente, cache)
+    agregados = AlmacenAgregados.cargar(datos.version, cache)
+
+indice = IndiceProgramas.desde_serie(datos.leer_tabla('PROGRAMAS', ['PROGRAMA_ACADEMICO'])['PROGRAMA_ACADEMICO'])
+carga = anonima() - antes
+
+for consulta in {consultas!r}:
+    preparar_snies(consulta, datos, indice, agregados = agregados)
+
+print(carga, anonima() - antes)
+"""
+    # Las librerías se importan antes de medir: solo cuenta lo que agregan los datos
+
+    proceso = subprocess.run([sys.executable, '-c', 'import pandas, pyarrow, pyarrow.compute, pyarrow.parquet, '
+                              'pyarrow.dataset, numpy\n' + codigo], capture_output = True, text = True,
+                             cwd = os.path.dirname(os.path.abspath(__file__)))
+
+    if proceso.returncode != 0:
+
+        raise RuntimeError(f'Falló el proceso de prueba: {proceso.stderr.strip().splitlines()[-1]}')
+
+    return tuple(int(kb) / 1024 for kb in proceso.stdout.split()[-2:])
+
+
+def revisar_memoria_trabajador(snapshot: str, dir_datos: str, dir_cache: str, consultas: list) -> list:
+    """Compara la memoria privada de un trabajador adjunto al snapshot con la de uno con copia propia."""
+    if not os.path.exists('/proc/self/smaps_rollup'):
+
+        print("  Memoria por proceso: no se mide (sin /proc/self/smaps_rollup)")
+
+        return []
+
+    compartido = medir_trabajador(snapshot, dir_datos, dir_cache, consultas)
+    privado = medir_trabajador(None, dir_datos, dir_cache, consultas)
+    print(f"  Memoria por proceso del lote: carga {compartido[0]:.2f} MB con el snapshot vs. {privado[0]:.2f} MB "
+          f"con copia propia; con las consultas {compartido[1]:.2f} vs. {privado[1]:.2f} MB")
+
+    # Adjuntarse solo debe costar el índice y las columnas de PROGRAMAS que se pasan a pandas
+
+    return [f'cargar en un proceso adjunto usa {compartido[0]:.2f} MB privados '
+            f'(copia propia {privado[0]:.2f} MB)'] if compartido[0] > privado[0] / 4 else []
+
+
+# Motores pandas y Arrow sobre datos pequeños (--solo-motores)
+
+def revisar_motores(directorio: str, consultas: list) -> list:
+    """
+    Compara (valores, orden y tipos) las tablas de los motores pandas y Arrow en datos
+    pequeños, con MAESTRO en el orden de SNIES y también intercalado. Retorna los problemas.
+    """
+    problemas = []
+    print("--- Motores pandas / Arrow ---")
+
+    for forma in ('ordenado', 'intercalado'):
+
+        fuente = os.path.join(directorio, f'motores_{forma}', 'fuente')
+        cache = os.path.join(directorio, f'motores_{forma}', 'cache')
+        generar_datos(fuente, 0.2)
+
+        if forma == 'intercalado':
+
+            ruta = os.path.join(fuente, 'MAESTRO.parquet')
+            pq.write_table(_intercalar_maestro(pq.read_table(ruta)), ruta)
+
+        datos = DatosSNIES(fuente = fuente, cache_dir = cache)
+        indice = IndiceProgramas.desde_serie(datos.leer_tabla('PROGRAMAS', COLUMNAS_USADAS)['PROGRAMA_ACADEMICO'])
+        diferencias = [f'{consulta} {d}' for consulta in consultas
+                       for d in diferencias_motores(preparar_snies(consulta, datos, indice, motor = 'pandas')['tablas'],
+                                                    preparar_snies(consulta, datos, indice, motor = 'arrow')['tablas'])]
+        diferencias += [f'precalculados {d}' for d in
+                        diferencias_motores(AlmacenAgregados.construir(datos, COLUMNAS_USADAS, 'pandas').tablas,
+                                            AlmacenAgregados.construir(datos, COLUMNAS_USADAS, 'arrow').tablas)]
+        problemas += [f'motores {forma}: {d}' for d in diferencias]
+        print(f"  {forma:12} {'mismos resultados' if not diferencias else f'{len(diferencias)} diferencias'}")
+
+    return problemas
+
+
+# Actualización incremental frente a un cálculo completo
+
+def _intercalar_maestro(maestro: pa.Table) -> pa.Table:
+    """Una fila por SEXO y el orden PERIODO, SEXO, PROCESO (como vienen algunos cortes de SNIES)."""
+    partes = [maestro.append_column('SEXO', pa.array([sexo] * maestro.num_rows)) for sexo in ('F', 'M')]
+
+    return pa.concat_tables(partes).sort_by([('PERIODO', 'ascending'), ('SEXO', 'ascending'),
+                                             ('PROCESO', 'ascending')])
+
+
+def _publicar_periodos(fuente: str, intercalado: bool):
+    """Nueva versión de MAESTRO: cambia CANTIDAD en un periodo intermedio y agrega 2025-1."""
+    maestro = pq.read_table(os.path.join(fuente, 'MAESTRO.parquet')).to_pandas()
+    maestro.loc[maestro['PERIODO'] == '2022-1', 'CANTIDAD'] = '7'
+    nuevo = maestro[maestro['PERIODO'] == '2024-2'].assign(PERIODO = '2025-1', PROXY_PER = '20251')
+    maestro = pd.concat([maestro, nuevo], ignore_index = True)
+
+    if intercalado:
+
+        maestro = maestro.sort_values(['PERIODO', 'SEXO', 'PROCESO'], kind = 'stable')
+
+    pq.write_table(pa.Table.from_pandas(maestro, preserve_index = False), os.path.join(fuente, 'MAESTRO.parquet'))
+
+
+def revisar_actualizacion(directorio: str) -> list:
+    """
+    Actualiza los agregados de forma incremental y los compara (valores, orden y tipos) con
+    los de un cálculo completo de la misma versión. Retorna los problemas.
+    """
+    problemas = []
+    print("--- Actualización incremental ---")
+
+    for forma in ('ordenado', 'intercalado'):
+
+        fuente = os.path.join(directorio, f'actualizacion_{forma}', 'fuente')
+        cache = os.path.join(directorio, f'actualizacion_{forma}', 'cache')
+        generar_datos(fuente, 0.2)
+
+        if forma == 'intercalado':
+
+            ruta = os.path.join(fuente, 'MAESTRO.parquet')
+            pq.write_table(_intercalar_maestro(pq.read_table(ruta)), ruta)
+
+        actualizar_snies(fuente, cache, ttl = 0, columnas = COLUMNAS_USADAS)
+        _publicar_periodos(fuente, forma == 'intercalado')
+        resumen = actualizar_snies(fuente, cache, ttl = 0, columnas = COLUMNAS_USADAS)
+
+        # El cálculo completo pasa por parquet igual que el incremental (mismos tipos)
+
+        datos = DatosSNIES(fuente = fuente, cache_dir = cache)
+        completo_dir = os.path.join(directorio, f'actualizacion_{forma}', 'completo')
+        AlmacenAgregados.construir(datos, COLUMNAS_USADAS).guardar(completo_dir)
+        diferencias = diferencias_motores(AlmacenAgregados.cargar(datos.version, completo_dir).tablas,
+                                          AlmacenAgregados.cargar(datos.version, cache).tablas)
+        problemas += [f'actualización {forma}: {d}' for d in diferencias]
+        print(f"  {forma:12} agregados {resumen.get('agregados')}: "
+              f"{'igual al cálculo completo' if not diferencias else f'{len(diferencias)} tablas distintas'}")
+
+    return problemas
+
+
+# Tiempo de importación
+
+def medir_importacion(modulo: str) -> dict:
+    """
+    Importa `modulo` en un proceso nuevo con `-X importtime`. Retorna el tiempo acumulado
+    de su importación y las dependencias pesadas que quedaron cargadas.
+    """
+    codigo = (f'import sys, {modulo}; '
+              f'print(" ".join(m for m in {MODULOS_PESADOS!r} if m in sys.modules))')
+    proceso = subprocess.run([sys.executable, '-X', 'importtime', '-c', codigo], capture_output = True,
+                             text = True, cwd = os.path.dirname(os.path.abspath(__file__)))
+
+    if proceso.returncode != 0:
+
+        raise RuntimeError(f'No se pudo importar {modulo}: {proceso.stderr.strip().splitlines()[-1]}')
+
+    microsegundos = 0
+
+    for linea in proceso.stderr.splitlines():
+
+        partes = linea.split('|')
+
+        if linea.startswith('import time:') and len(partes) == 3 and partes[2].strip() == modulo:
+
+            microsegundos = int(partes[1])
+
+    return {'segundos': round(microsegundos / 1e6, 4), 'pesados': proceso.stdout.split()}
+
+
+def revisar_importacion(presupuesto: dict = PRESUPUESTO_IMPORTACION_S) -> list:
+    """Mide cada módulo del presupuesto y retorna los problemas (tiempo o dependencias pesadas)."""
+    problemas = []
+    print("--- Importación ---")
+
+    for modulo, limite in presupuesto.items():
+
+        medida = min((medir_importacion(modulo) for _ in range(3)), key = lambda m: m['segundos'])
+        marca = ''
+
+        if medida['segundos'] > limite:
+
+            marca = '  SOBRE EL PRESUPUESTO'
+            problemas.append(f'importar {modulo}: {medida["segundos"]:.3f} s (presupuesto {limite} s)')
+
+        if medida['pesados']:
+
+            marca += f'  carga {", ".join(medida["pesados"])}'
+            problemas.append(f'importar {modulo} carga {", ".join(medida["pesados"])}')
+
+        print(f"  {modulo:45} {medida['segundos']:9.4f} s  (presupuesto {limite} s){marca}")
+
+    return problemas
+
+
+# Comparación con la línea base
+
+def comparar(actual: dict, base: dict, tolerancia: float = TOLERANCIA) -> list:
+    """Retorna la lista de problemas (regresiones de tiempo y resultados distintos)."""
+    problemas = []
+
+    for escala, medidas in actual.items():
+
+        referencia = base.get(escala)
+
+        if referencia is None:
+
+            print(f"Escala {escala}x: no está en la línea base")
+            continue
+
+        print(f"--- Comparación escala {escala}x (actual / base) ---")
+
+        for nombre, medida in medidas['etapas'].items():
+
+            ref = referencia['etapas'].get(nombre)
+
+            if ref is None:
+
+                continue
+
+            razon = medida['mediana_s'] / ref['mediana_s'] if ref['mediana_s'] else float('inf')
+            marca = ''
+
+            if razon > 1 + tolerancia and medida['mediana_s'] - ref['mediana_s'] > PISO_RUIDO_S:
+
+                marca = '  REGRESIÓN'
+                problemas.append(f'{escala}x {nombre}: {razon:.2f}x más lento')
+
+            print(f"  {nombre:45} {razon:6.2f}x  memoria {medida['pico_mb']:.1f} / {ref['pico_mb']:.1f} MB{marca}")
+
+        for consulta, valor in medidas['resultados'].items():
+
+            esperado = referencia['resultados'].get(consulta)
+
+            if esperado is not None and esperado != valor:
+
+                problemas.append(f'{escala}x {consulta}: el resultado cambió ({esperado} -> {valor})')
+
+    return problemas
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = "Benchmark con datos SNIES sintéticos")
+    parser.add_argument('--escala', type = float, nargs = '+', default = [1],
+                        help = "Escalas de filas a medir (p. ej. 1 10 100)")
+    parser.add_argument('--repeticiones', type = int, default = 3)
+    parser.add_argument('--consultas', nargs = '+', default = CONSULTAS)
+    parser.add_argument('--dir', help = "Directorio de trabajo (por defecto uno temporal que se borra)")
+    parser.add_argument('--paralelo', action = 'store_true', help = "Gráficas en el pool de procesos")
+    parser.add_argument('--guardar-base', metavar = 'ARCHIVO', help = "Guarda los resultados como línea base")
+    parser.add_argument('--comparar', metavar = 'ARCHIVO', help = "Compara contra una línea base guardada")
+    parser.add_argument('--tolerancia', type = float, default = TOLERANCIA)
+    parser.add_argument('--solo-importacion', action = 'store_true',
+                        help = "Solo revisa el tiempo de importación (sin generar datos)")
+    parser.add_argument('--solo-motores', action = 'store_true',
+                        help = "Solo compara los motores pandas y Arrow en datos pequeños")
+    args = parser.parse_args()
+
+    if args.solo_motores:
+
+        with tempfile.TemporaryDirectory(prefix = 'motores_snies_') as directorio:
+            problemas = revisar_motores(directorio, args.consultas)
+
+        for p in problemas:
+
+            print("PROBLEMA:", p)
+
+        sys.exit(1 if problemas else 0)
+
+    problemas = revisar_importacion()
+
+    if args.solo_importacion:
+
+        for p in problemas:
+
+            print("PROBLEMA:", p)
+
+        sys.exit(1 if problemas else 0)
+
+    directorio = args.dir or tempfile.mkdtemp(prefix = 'benchmark_snies_')
+    actual = {}
+
+    try:
+
+        problemas += revisar_actualizacion(directorio)
+
+        for escala in args.escala:
+
+            actual[f'{escala:g}'] = correr_escala(escala, directorio, args.consultas, args.repeticiones,
+                                                  args.paralelo)
+
+    finally:
+
+        graficas_snies.cerrar_pool()
+
+        if not args.dir:
+
+            shutil.rmtree(directorio, ignore_errors = True)
+
+    if args.guardar_base:
+
+        with open(args.guardar_base, 'w', encoding = 'utf-8') as f:
+            json.dump(actual, f, ensure_ascii = False, indent = 2)
+
+        print(f"Línea base guardada en {args.guardar_base}")
+
+    problemas += [f'{escala}x motores distintos: {d}' for escala, medidas in actual.items()
+                  for d in medidas['motores']]
+
+    if args.comparar:
+
+        with open(args.comparar, 'r', encoding = 'utf-8') as f:
+            base = json.load(f)
+
+        problemas += comparar(actual, base, args.tolerancia)
+
+    for p in problemas:
+
+        print("PROBLEMA:", p)
+
+    sys.exit(1 if problemas else 0)
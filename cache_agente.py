@@ -0,0 +1,188 @@
+# Caché en disco para el agente analista
+
+# Entre corridas (y dentro de una misma) el Executor vuelve a descargar las mismas páginas
+# de universidades y a resolver subtareas casi idénticas ("buscar el costo de X"). Este
+# caché guarda, direccionado por contenido (sha256 de la llave normalizada):
+#   - los textos de fetch_url, con la URL normalizada como llave
+#   - las respuestas del Executor, con el texto de la subtarea normalizado como llave
+# Cada entrada vence después de un TTL y, si el caché pasa de su tamaño máximo, se
+# eliminan primero las entradas usadas hace más tiempo (LRU).
+
+
+# Librerias necesarias
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+
+# Configuración (variables de entorno o .env). El agente la vuelve a leer después de
+# cargar el .env (ver `cargar_entorno` en agente_analista.py); por eso se consulta con
+# `cache_activo()` y los cachés se abren con los valores vigentes, no al importar.
+
+def leer_configuracion():
+    global CACHE_AGENTE_DIR, CACHE_AGENTE_ACTIVO, TTL_PAGINAS, TTL_RESPUESTAS, TAMANO_MAXIMO
+
+    CACHE_AGENTE_DIR = os.getenv('CACHE_AGENTE_DIR', '.cache_agente')
+    CACHE_AGENTE_ACTIVO = os.getenv('CACHE_AGENTE', '1') != '0'
+    TTL_PAGINAS = float(os.getenv('CACHE_TTL_PAGINAS', 7 * 24 * 3600))
+    TTL_RESPUESTAS = float(os.getenv('CACHE_TTL_RESPUESTAS', 24 * 3600))
+    TAMANO_MAXIMO = int(float(os.getenv('CACHE_AGENTE_MB', 200)) * 2**20)
+
+leer_configuracion()
+
+
+def cache_activo() -> bool:
+    """Si el caché del agente está activo (CACHE_AGENTE != '0')."""
+    return CACHE_AGENTE_ACTIVO
+
+
+# Normalización de llaves
+
+def normalizar_url(url: str) -> str:
+    """
+    Misma página -> misma llave: esquema y host en minúsculas, sin fragmento, sin puerto
+    por defecto, sin parámetros de seguimiento (utm_*) y con la query ordenada.
+    """
+    partes = urlsplit(url.strip())
+    esquema = partes.scheme.lower()
+    host = (partes.hostname or '').lower()
+
+    if partes.port and (esquema, partes.port) not in (('http', 80), ('https', 443)):
+
+        host = f'{host}:{partes.port}'
+
+    query = sorted((k, v) for k, v in parse_qsl(partes.query, keep_blank_values = True)
+                   if not k.lower().startswith('utm_'))
+    ruta = partes.path.rstrip('/') or '/'
+
+    return urlunsplit((esquema, host, ruta, urlencode(query), ''))
+
+
+def normalizar_subtarea(texto: str) -> str:
+    """Subtareas que solo difieren en mayúsculas, espacios o puntuación final comparten llave."""
+    texto = re.sub(r'\s+', ' ', texto.casefold()).strip()
+
+    return texto.strip(' .,;:!?¡¿"\'')
+
+
+class CacheDisco:
+    """Caché llave -> texto en SQLite con TTL, tamaño máximo (LRU) y contadores de aciertos."""
+
+    def __init__(self, ruta: str, ttl: float, tamano_maximo: int = None):
+
+        self.ruta = ruta
+        self.ttl = ttl
+        self.tamano_maximo = TAMANO_MAXIMO if tamano_maximo is None else tamano_maximo
+        self.aciertos = 0
+        self.fallos = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(ruta) or '.', exist_ok = True)
+        self._conn = sqlite3.connect(ruta, check_same_thread = False)
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS entradas (
+                                clave TEXT PRIMARY KEY, valor TEXT NOT NULL,
+                                tamano INTEGER NOT NULL, creado REAL NOT NULL, usado REAL NOT NULL)""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_usado ON entradas (usado)")
+        self._conn.commit()
+
+    @staticmethod
+    def _hash(llave: str) -> str:
+
+        return hashlib.sha256(llave.encode('utf-8')).hexdigest()
+
+    def obtener(self, llave: str):
+        """Retorna el valor guardado para `llave` o None si no existe o ya venció."""
+        clave = self._hash(llave)
+        ahora = time.time()
+
+        with self._lock:
+
+            fila = self._conn.execute("SELECT valor, creado FROM entradas WHERE clave = ?", (clave,)).fetchone()
+
+            if fila is None or ahora - fila[1] > self.ttl:
+
+                if fila is not None:
+
+                    self._conn.execute("DELETE FROM entradas WHERE clave = ?", (clave,))
+                    self._conn.commit()
+
+                self.fallos += 1
+                return None
+
+            self._conn.execute("UPDATE entradas SET usado = ? WHERE clave = ?", (ahora, clave))
+            self._conn.commit()
+            self.aciertos += 1
+
+            return fila[0]
+
+    def guardar(self, llave: str, valor: str):
+
+        ahora = time.time()
+        tamano = len(valor.encode('utf-8'))
+
+        with self._lock:
+
+            self._conn.execute("INSERT OR REPLACE INTO entradas VALUES (?, ?, ?, ?, ?)",
+                               (self._hash(llave), valor, tamano, ahora, ahora))
+            self._evictar()
+            self._conn.commit()
+
+    def _evictar(self):
+        """Borra vencidas y, si aún se pasa del tamaño máximo, las menos usadas recientemente."""
+        self._conn.execute("DELETE FROM entradas WHERE creado < ?", (time.time() - self.ttl,))
+        total = self._conn.execute("SELECT COALESCE(SUM(tamano), 0) FROM entradas").fetchone()[0]
+
+        if total <= self.tamano_maximo:
+
+            return
+
+        borrar = []
+
+        for clave, tamano in self._conn.execute("SELECT clave, tamano FROM entradas ORDER BY usado"):
+
+            if total <= self.tamano_maximo:
+
+                break
+
+            borrar.append((clave,))
+            total -= tamano
+
+        self._conn.executemany("DELETE FROM entradas WHERE clave = ?", borrar)
+
+    def estadisticas(self) -> dict:
+
+        with self._lock:
+
+            entradas, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(tamano), 0) FROM entradas").fetchone()
+
+        return {'aciertos': self.aciertos, 'fallos': self.fallos, 'entradas': entradas, 'bytes': total}
+
+    def limpiar(self):
+
+        with self._lock:
+
+            self._conn.execute("DELETE FROM entradas")
+            self._conn.commit()
+
+
+@lru_cache(maxsize = None)
+def _abrir_cache(ruta: str, ttl: float, tamano_maximo: int) -> CacheDisco:
+
+    return CacheDisco(ruta, ttl, tamano_maximo)
+
+
+def cache_paginas() -> CacheDisco:
+    """Caché de textos descargados por fetch_url."""
+    return _abrir_cache(os.path.join(CACHE_AGENTE_DIR, 'paginas.sqlite'), TTL_PAGINAS, TAMANO_MAXIMO)
+
+
+def cache_respuestas() -> CacheDisco:
+    """Caché de respuestas del Executor por subtarea."""
+    return _abrir_cache(os.path.join(CACHE_AGENTE_DIR, 'respuestas.sqlite'), TTL_RESPUESTAS, TAMANO_MAXIMO)
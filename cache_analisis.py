@@ -0,0 +1,227 @@
+# Caché de análisis completos (SNIES + agente)
+
+# Volver a correr main.py para el mismo programa (p. ej. para ajustar las diapositivas)
+# repetía todo el Planner/Executor. Aquí se guardan el FinalReport y el diccionario de
+# analizar_snies (con sus gráficas) bajo una llave que combina:
+#   - el nombre del programa normalizado y la descripción
+#   - la versión de las instrucciones/prompts del agente
+#   - la versión del dataset SNIES
+# Si cualquiera de esas piezas cambia, la llave cambia y el análisis se recalcula.
+
+
+# Librerias necesarias
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+
+
+CACHE_ANALISIS_DIR = os.getenv('CACHE_ANALISIS_DIR', '.cache_analisis')
+FORMATO_ANALISIS = 1   # subir si cambia lo que se guarda
+
+
+def _normalizar(texto: str) -> str:
+
+    return re.sub(r'\s+', ' ', (texto or '').casefold()).strip()
+
+
+def clave_analisis(nombre_programa: str, descripcion: str, version_prompts: str,
+                   version_snies: str) -> str:
+
+    partes = json.dumps([FORMATO_ANALISIS, _normalizar(nombre_programa), _normalizar(descripcion),
+                         version_prompts, version_snies], ensure_ascii = False)
+
+    return hashlib.sha256(partes.encode('utf-8')).hexdigest()[:20]
+
+
+def _json_por_defecto(valor):
+    """Convierte escalares de numpy/pandas (y cualquier otra cosa) a algo serializable."""
+    if hasattr(valor, 'item'):
+
+        return valor.item()
+
+    return str(valor)
+
+
+def _escribir_json(ruta: str, datos):
+
+    with open(ruta, 'w', encoding = 'utf-8') as f:
+        json.dump(datos, f, ensure_ascii = False, indent = 2, default = _json_por_defecto)
+
+
+def _leer_json(ruta: str):
+
+    with open(ruta, 'r', encoding = 'utf-8') as f:
+        return json.load(f)
+
+
+def guardar_analisis(clave: str, nombre_programa: str, descripcion: str, datos_snies: dict,
+                     datos_agente: dict, versiones: dict = None, cache_dir: str = None):
+    """
+    Guarda un análisis completo. Las gráficas (de 'imagenes' en memoria o, si no están, de
+    los archivos de 'graficas') se escriben dentro de la entrada para que no dependan de la
+    carpeta del reporte. La entrada aparece completa o no aparece.
+    """
+    base = cache_dir or CACHE_ANALISIS_DIR
+    destino = os.path.join(base, clave)
+    os.makedirs(base, exist_ok = True)
+    tmp = tempfile.mkdtemp(dir = base, prefix = f'{clave}.tmp-')
+
+    try:
+
+        imagenes = dict(datos_snies.get('imagenes') or {})
+        rutas = datos_snies.get('graficas') or {}
+        graficas = {}
+
+        for nombre in set(imagenes) | set(rutas):
+
+            ruta = rutas.get(nombre)
+            archivo = os.path.basename(ruta) if ruta else f'grafica_{nombre}.png'
+
+            if nombre in imagenes:
+
+                with open(os.path.join(tmp, archivo), 'wb') as f:
+                    f.write(imagenes[nombre])
+
+            elif ruta and os.path.exists(ruta):
+
+                shutil.copy2(ruta, os.path.join(tmp, archivo))
+
+            else:
+
+                continue
+
+            graficas[nombre] = archivo
+
+        datos = {k: v for k, v in datos_snies.items() if k != 'imagenes'}
+        _escribir_json(os.path.join(tmp, 'snies.json'), dict(datos, graficas = graficas))
+        _escribir_json(os.path.join(tmp, 'agente.json'), datos_agente)
+        _escribir_json(os.path.join(tmp, 'meta.json'), {
+            'programa': nombre_programa,
+            'descripcion': descripcion,
+            'versiones': versiones or {},
+            'creado': time.time(),
+        })
+
+        if os.path.exists(destino):
+
+            shutil.rmtree(destino)
+
+        os.replace(tmp, destino)
+
+    except BaseException:
+
+        shutil.rmtree(tmp, ignore_errors = True)
+        raise
+
+
+def cargar_analisis(clave: str, output_dir: str = None, cache_dir: str = None):
+    """
+    Retorna (datos_snies, datos_agente) si el análisis está guardado, o None. Las gráficas
+    vuelven como bytes en 'imagenes'; si se da `output_dir` también se escriben ahí y las
+    rutas quedan en 'graficas'.
+    """
+    origen = os.path.join(cache_dir or CACHE_ANALISIS_DIR, clave)
+
+    try:
+
+        datos_snies = _leer_json(os.path.join(origen, 'snies.json'))
+        datos_agente = _leer_json(os.path.join(origen, 'agente.json'))
+        imagenes = {}
+
+        for nombre, archivo in datos_snies.get('graficas', {}).items():
+
+            with open(os.path.join(origen, archivo), 'rb') as f:
+                imagenes[nombre] = f.read()
+
+    except (OSError, ValueError):
+
+        return None
+
+    graficas = {}
+
+    if output_dir:
+
+        os.makedirs(output_dir, exist_ok = True)
+
+        for nombre, archivo in datos_snies.get('graficas', {}).items():
+
+            graficas[nombre] = os.path.join(output_dir, archivo)
+
+            with open(graficas[nombre], 'wb') as f:
+                f.write(imagenes[nombre])
+
+    datos_snies['imagenes'] = imagenes
+    datos_snies['graficas'] = graficas
+
+    return datos_snies, datos_agente
+
+
+def listar_analisis(cache_dir: str = None) -> list:
+    """Análisis guardados, del más reciente al más antiguo."""
+    base = cache_dir or CACHE_ANALISIS_DIR
+    lista = []
+
+    if not os.path.isdir(base):
+
+        return lista
+
+    for clave in os.listdir(base):
+
+        try:
+            meta = _leer_json(os.path.join(base, clave, 'meta.json'))
+        except (OSError, ValueError):
+            continue
+
+        lista.append(dict(meta, clave = clave))
+
+    return sorted(lista, key = lambda m: m.get('creado', 0), reverse = True)
+
+
+def buscar_analisis(nombre_programa: str = None, descripcion: str = None, clave: str = None,
+                    cache_dir: str = None):
+    """
+    El análisis guardado más reciente con esa `clave`, o del programa (y la descripción, si
+    se da) sin importar las versiones. Retorna su meta.json con la clave, o None.
+    """
+    for meta in listar_analisis(cache_dir):
+
+        if clave is not None:
+
+            if meta['clave'] == clave:
+
+                return meta
+
+        elif (_normalizar(meta.get('programa')) == _normalizar(nombre_programa)
+              and (descripcion is None or _normalizar(meta.get('descripcion')) == _normalizar(descripcion))):
+
+            return meta
+
+    return None
+
+
+def borrar_analisis(clave: str = None, cache_dir: str = None) -> int:
+    """Borra el análisis `clave` (o todos si es None). Retorna cuántos se borraron."""
+    base = cache_dir or CACHE_ANALISIS_DIR
+
+    if not os.path.isdir(base):
+
+        return 0
+
+    claves = [clave] if clave else os.listdir(base)
+    borrados = 0
+
+    for c in claves:
+
+        ruta = os.path.join(base, c)
+
+        if os.path.isdir(ruta):
+
+            shutil.rmtree(ruta, ignore_errors = True)
+            borrados += 1
+
+    return borrados
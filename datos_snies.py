@@ -0,0 +1,585 @@
+# Capa de datos SNIES - Caché local versionado de las tablas parquet
+
+# Las tablas (MAESTRO, OFERTA, PROGRAMAS, IES) se guardan en disco y solo se vuelven a
+# descargar cuando cambian en la fuente. La revalidación usa ETag/Last-Modified o un TTL
+# configurable. La fuente puede ser la URL del profe, un directorio local o un espejo
+# file://, así que todo funciona también sin red.
+#
+# Para varios procesos (lote con --procesos) las tablas cargadas se exportan una vez a un
+# snapshot Arrow IPC sin comprimir y cada proceso lo mapea en memoria (zero-copy): las
+# páginas del archivo se comparten entre procesos en vez de tener una copia por proceso.
+
+
+# Librerias necesarias
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from urllib.parse import urlparse, unquote
+from urllib.request import url2pathname
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import requests
+
+
+# Configuración (se puede cambiar con variables de entorno)
+
+FUENTE_SNIES = os.getenv('SNIES_FUENTE', 'https://robertohincapie.com/data/snies/')
+CACHE_DIR = os.getenv('SNIES_CACHE_DIR', '.cache_snies')
+TTL_SEGUNDOS = float(os.getenv('SNIES_TTL', 24 * 3600))
+TIMEOUT_CONEXION = 10
+TIMEOUT_LECTURA = 120
+
+TABLAS_SNIES = ('MAESTRO', 'OFERTA', 'PROGRAMAS', 'IES')
+
+# Textos muy repetidos: se leen del parquet como diccionario (categorías en pandas)
+COLUMNAS_CATEGORICAS = ['INSTITUCION', 'PROGRAMA_ACADEMICO', 'DEPARTAMENTO_PROGRAMA',
+                        'MUNICIPIO_PROGRAMA', 'PROCESO']
+
+# Vienen como texto (con 'null') en los parquet y se pasan a número al cargarlas
+COLUMNAS_NUMERICAS = ['CANTIDAD', 'PROXY_PER', 'MATRICULA']
+
+
+# Utilidades internas
+
+def _ruta_local(fuente: str):
+    """Retorna la ruta en disco si la fuente es local (directorio o file://), si no None."""
+    partes = urlparse(fuente)
+
+    if partes.scheme == 'file':
+
+        return url2pathname(unquote(partes.path))
+
+    # Sin esquema o con letra de unidad de Windows (C:\...) es una ruta local
+
+    if partes.scheme == '' or len(partes.scheme) == 1:
+
+        return fuente
+
+    return None
+
+
+def _url_tabla(fuente: str, nombre: str) -> str:
+
+    local = _ruta_local(fuente)
+
+    if local is not None:
+
+        return os.path.join(local, f'{nombre}.parquet')
+
+    return fuente.rstrip('/') + f'/{nombre}.parquet'
+
+
+def _rutas_cache(cache_dir: str, nombre: str):
+
+    return (os.path.join(cache_dir, f'{nombre}.parquet'),
+            os.path.join(cache_dir, f'{nombre}.json'))
+
+
+def _leer_meta(ruta_meta: str) -> dict:
+
+    try:
+        with open(ruta_meta, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _escribir_meta(ruta_meta: str, meta: dict):
+    """Escribe los metadatos de forma atómica (archivo temporal + os.replace)."""
+    directorio = os.path.dirname(ruta_meta) or '.'
+    fd, tmp = tempfile.mkstemp(dir=directorio, suffix='.tmp')
+
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, ruta_meta)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _copiar_atomico(bloques, ruta_destino: str) -> str:
+    """
+    Escribe los bloques de bytes en un temporal junto al destino y lo renombra al final.
+    Retorna el sha256 del contenido, que se usa como versión de la tabla.
+    """
+    directorio = os.path.dirname(ruta_destino) or '.'
+    fd, tmp = tempfile.mkstemp(dir=directorio, suffix='.tmp')
+    sha = hashlib.sha256()
+
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for bloque in bloques:
+                if bloque:
+                    sha.update(bloque)
+                    f.write(bloque)
+        os.replace(tmp, ruta_destino)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+    return sha.hexdigest()
+
+
+def _leer_por_bloques(ruta: str, tamano: int = 1 << 20):
+
+    with open(ruta, 'rb') as f:
+        while True:
+            bloque = f.read(tamano)
+            if not bloque:
+                break
+            yield bloque
+
+
+# Sincronización de una tabla
+
+def _sincronizar_local(origen: str, ruta_parquet: str, meta: dict) -> dict:
+    """Copia la tabla desde un espejo local si cambió (por tamaño y fecha de modificación)."""
+    st = os.stat(origen)
+    firma = f'{st.st_mtime_ns}-{st.st_size}'
+
+    if meta.get('firma') == firma and os.path.exists(ruta_parquet):
+
+        return meta
+
+    version = _copiar_atomico(_leer_por_bloques(origen), ruta_parquet)
+
+    return {'firma': firma, 'version': version, 'tamano': st.st_size}
+
+
+def _sincronizar_remota(url: str, ruta_parquet: str, meta: dict) -> dict:
+    """Descarga la tabla solo si el servidor indica que cambió (ETag / Last-Modified)."""
+    headers = {}
+
+    if os.path.exists(ruta_parquet):
+
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    with requests.get(url, headers=headers, stream=True,
+                      timeout=(TIMEOUT_CONEXION, TIMEOUT_LECTURA)) as resp:
+
+        if resp.status_code == 304:
+
+            return meta
+
+        resp.raise_for_status()
+        version = _copiar_atomico(resp.iter_content(chunk_size=1 << 20), ruta_parquet)
+
+        return {
+            'etag': resp.headers.get('ETag'),
+            'last_modified': resp.headers.get('Last-Modified'),
+            'version': version,
+            'tamano': os.path.getsize(ruta_parquet),
+        }
+
+
+def sincronizar_tabla(nombre: str, fuente: str = None, cache_dir: str = None,
+                      ttl: float = None, forzar: bool = False) -> str:
+    """
+    Deja la tabla SNIES `nombre` al día en el caché local y retorna la ruta del parquet.
+
+    Si la copia local se revalidó hace menos de `ttl` segundos se usa sin consultar la
+    fuente. Si la fuente no responde y ya hay una copia, se usa la copia (aunque vieja).
+    """
+    fuente = fuente or FUENTE_SNIES
+    cache_dir = cache_dir or CACHE_DIR
+    ttl = TTL_SEGUNDOS if ttl is None else ttl
+
+    os.makedirs(cache_dir, exist_ok=True)
+    ruta_parquet, ruta_meta = _rutas_cache(cache_dir, nombre)
+    meta = _leer_meta(ruta_meta)
+    existe = os.path.exists(ruta_parquet) and meta.get('fuente') == fuente
+
+    if existe and not forzar and time.time() - meta.get('revalidado', 0) < ttl:
+
+        return ruta_parquet
+
+    origen = _url_tabla(fuente, nombre)
+
+    try:
+
+        if _ruta_local(fuente) is not None:
+
+            nueva = _sincronizar_local(origen, ruta_parquet, meta if existe else {})
+
+        else:
+
+            nueva = _sincronizar_remota(origen, ruta_parquet, meta if existe else {})
+
+    except (OSError, requests.RequestException) as e:
+
+        if not existe:
+
+            raise
+
+        print(f"Advertencia: no se pudo revalidar {nombre} ({e}). Se usa la copia local.")
+
+        return ruta_parquet
+
+    nueva = dict(nueva, fuente=fuente, revalidado=time.time())
+    _escribir_meta(ruta_meta, nueva)
+
+    return ruta_parquet
+
+
+def sincronizar_tablas(fuente: str = None, cache_dir: str = None, ttl: float = None,
+                       forzar: bool = False) -> dict:
+    """Sincroniza las cuatro tablas SNIES y retorna {nombre: ruta_parquet}."""
+    return {nombre: sincronizar_tabla(nombre, fuente, cache_dir, ttl, forzar)
+            for nombre in TABLAS_SNIES}
+
+
+def cargar_tabla(nombre: str, fuente: str = None, cache_dir: str = None,
+                 ttl: float = None) -> pd.DataFrame:
+    """Carga una tabla SNIES desde el caché local (sincronizándola antes si hace falta)."""
+    return leer_tabla(nombre, None, None, fuente, cache_dir, ttl)
+
+
+def _abrir_dataset(ruta: str):
+    """Dataset de pyarrow que lee las columnas categóricas ya codificadas como diccionario."""
+    formato = ds.ParquetFileFormat(
+        read_options=ds.ParquetReadOptions(dictionary_columns=COLUMNAS_CATEGORICAS))
+
+    return ds.dataset(ruta, format=formato)
+
+
+def a_pandas(tabla: pa.Table) -> pd.DataFrame:
+    """
+    Convierte a pandas con tipos compactos: las columnas de diccionario quedan como
+    categóricas y las numéricas que vienen como texto pasan a float ('null' -> NaN).
+    """
+    df = tabla.to_pandas()
+
+    for col in COLUMNAS_NUMERICAS:
+
+        if col in df.columns and not pd.api.types.is_numeric_dtype(df[col]):
+
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    return df
+
+
+def _arreglo(valores, tipo: pa.DataType) -> pa.Array:
+    """Valores (sin nulos) como arreglo Arrow del tipo de la columna."""
+    valores = [v for v in valores if not pd.isna(v)]
+
+    try:
+        return pa.array(valores, type=tipo)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # p. ej. periodos o códigos que vienen como texto de un manifiesto
+        return pa.array([str(v) for v in valores], type=pa.string()).cast(tipo)
+
+
+def _filtro_isin(esquema: pa.Schema, columna: str, valores):
+    """Expresión `columna IN (valores)` con el tipo de la columna en el parquet (None si no aplica)."""
+    if valores is None:
+
+        return None
+
+    return ds.field(columna).isin(_arreglo(valores, esquema.field(columna).type))
+
+
+def _combinar_filtros(*filtros):
+
+    filtros = [f for f in filtros if f is not None]
+
+    if not filtros:
+
+        return None
+
+    combinado = filtros[0]
+
+    for f in filtros[1:]:
+
+        combinado = combinado & f
+
+    return combinado
+
+
+def leer_tabla(nombre: str, columnas=None, codigos_snies=None, fuente: str = None,
+               cache_dir: str = None, ttl: float = None, periodos=None) -> pd.DataFrame:
+    """
+    Lee una tabla SNIES del caché con proyección de columnas y filtro por CODIGO_SNIES.
+
+    - `columnas`: solo se leen las columnas pedidas que existan en la tabla (None = todas).
+    - `codigos_snies`: el filtro `CODIGO_SNIES IN (...)` se empuja al escaneo de pyarrow,
+      que descarta row groups completos usando sus estadísticas (min/max).
+    - `periodos`: igual, con `PERIODO IN (...)` (solo MAESTRO y OFERTA tienen PERIODO).
+
+    Los textos repetidos quedan como categóricas y CANTIDAD/PROXY_PER/MATRICULA como números.
+    """
+    return a_pandas(leer_arrow(nombre, columnas, codigos_snies, fuente, cache_dir, ttl, periodos))
+
+
+def leer_arrow(nombre: str, columnas=None, codigos_snies=None, fuente: str = None,
+               cache_dir: str = None, ttl: float = None, periodos=None) -> pa.Table:
+    """Igual que `leer_tabla` pero retorna la tabla Arrow tal como sale del escaneo."""
+    dataset = _abrir_dataset(sincronizar_tabla(nombre, fuente, cache_dir, ttl))
+    esquema = dataset.schema
+
+    if columnas is not None:
+
+        columnas = [c for c in columnas if c in esquema.names]
+
+    filtro = _combinar_filtros(_filtro_isin(esquema, 'CODIGO_SNIES', codigos_snies),
+                               _filtro_isin(esquema, 'PERIODO', periodos))
+
+    return dataset.to_table(columns=columnas, filter=filtro)
+
+
+def contar_filas(nombre: str, fuente: str = None, cache_dir: str = None,
+                 ttl: float = None) -> int:
+    """Número de filas de una tabla, leído de los metadatos del parquet (sin cargarla)."""
+    return pq.ParquetFile(sincronizar_tabla(nombre, fuente, cache_dir, ttl)).metadata.num_rows
+
+
+class DatosSNIES:
+    """
+    Acceso a las tablas SNIES para uno o varios análisis.
+
+    - `DatosSNIES()` lee cada vez desde el caché en disco (con proyección y filtro empujado
+      al parquet), que es lo más liviano para un solo reporte.
+    - `DatosSNIES.cargar()` carga las tablas una sola vez en memoria (como tablas Arrow) y
+      las comparte entre todos los reportes de un lote.
+    """
+
+    def __init__(self, tablas: dict = None, fuente: str = None, cache_dir: str = None,
+                 ttl: float = None, version: str = None):
+
+        self.tablas = tablas or {}
+        self.fuente = fuente
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.snapshot = None
+
+        if not self.tablas:
+
+            sincronizar_tablas(fuente, cache_dir, ttl)
+
+        self.version = version or version_dataset(cache_dir)
+
+    @classmethod
+    def cargar(cls, columnas=None, fuente: str = None, cache_dir: str = None,
+               ttl: float = None):
+        """Sincroniza y carga en memoria las cuatro tablas (solo con `columnas`, si se dan)."""
+        tablas = {}
+
+        for nombre, ruta in sincronizar_tablas(fuente, cache_dir, ttl).items():
+
+            dataset = _abrir_dataset(ruta)
+            cols = None if columnas is None else [c for c in columnas if c in dataset.schema.names]
+            tablas[nombre] = dataset.to_table(columns=cols)
+
+        return cls(tablas, fuente, cache_dir, ttl)
+
+    # Snapshot Arrow compartido entre procesos
+
+    def exportar_snapshot(self, directorio: str = None, columnas=None) -> str:
+        """
+        Escribe las tablas en memoria como archivos Arrow IPC sin comprimir (uno por tabla)
+        y retorna el directorio. La escritura es atómica: otro proceso nunca ve un snapshot
+        a medias. Si ya existe uno para esta versión y columnas se reutiliza.
+        """
+        if not self.en_memoria:
+
+            raise ValueError("Solo se puede exportar un snapshot de tablas cargadas en memoria")
+
+        directorio = directorio or ruta_snapshot(self.version, columnas, self.cache_dir)
+
+        if _snapshot_completo(directorio):
+
+            return directorio
+
+        padre = os.path.dirname(os.path.abspath(directorio))
+        os.makedirs(padre, exist_ok=True)
+        temporal = tempfile.mkdtemp(dir=padre, prefix='.tmp_')
+
+        try:
+
+            for nombre, tabla in self.tablas.items():
+
+                # El formato de archivo IPC exige un solo diccionario por columna
+
+                tabla = tabla.unify_dictionaries()
+
+                with pa.OSFile(os.path.join(temporal, f'{nombre}.arrow'), 'wb') as f:
+                    with pa.ipc.new_file(f, tabla.schema) as escritor:
+                        escritor.write_table(tabla)
+
+            _escribir_meta(os.path.join(temporal, 'snapshot.json'),
+                           {'version': self.version, 'tablas': sorted(self.tablas), 'columnas': columnas})
+            os.replace(temporal, directorio)
+
+        except OSError:
+
+            # Otro proceso publicó el mismo snapshot primero
+
+            shutil.rmtree(temporal, ignore_errors=True)
+
+            if not _snapshot_completo(directorio):
+
+                raise
+
+        return directorio
+
+    @classmethod
+    def desde_snapshot(cls, directorio: str, fuente: str = None, cache_dir: str = None,
+                       ttl: float = None):
+        """
+        Se adjunta a un snapshot de `exportar_snapshot` sin copiar: las tablas quedan sobre
+        el archivo mapeado en memoria, compartido con los demás procesos que lo usan.
+        """
+        meta = _leer_meta(os.path.join(directorio, 'snapshot.json'))
+
+        if not meta:
+
+            raise ValueError(f"No hay un snapshot SNIES en {directorio}")
+
+        tablas = {}
+
+        for nombre in meta['tablas']:
+
+            archivo = pa.memory_map(os.path.join(directorio, f'{nombre}.arrow'), 'r')
+            tablas[nombre] = pa.ipc.open_file(archivo).read_all()
+
+        datos = cls(tablas, fuente, cache_dir, ttl, meta['version'])
+        datos.snapshot = directorio
+
+        return datos
+
+    @classmethod
+    def cargar_compartida(cls, columnas=None, fuente: str = None, cache_dir: str = None,
+                          ttl: float = None):
+        """
+        Como `cargar`, pero a través del snapshot de la versión actual: si no existe se
+        cargan las tablas, se exportan y se liberan; luego se adjunta al snapshot.
+        """
+        sincronizar_tablas(fuente, cache_dir, ttl)
+        directorio = ruta_snapshot(version_dataset(cache_dir), columnas, cache_dir)
+
+        if not _snapshot_completo(directorio):
+
+            cls.cargar(columnas, fuente, cache_dir, ttl).exportar_snapshot(directorio, columnas)
+            _borrar_snapshots_viejos(directorio)
+
+        return cls.desde_snapshot(directorio, fuente, cache_dir, ttl)
+
+    @property
+    def en_memoria(self) -> bool:
+
+        return bool(self.tablas)
+
+    def leer_tabla(self, nombre: str, columnas=None, codigos_snies=None, periodos=None) -> pd.DataFrame:
+        """Igual que `leer_tabla` del módulo, pero sobre las tablas en memoria si las hay."""
+        return a_pandas(self.leer_arrow(nombre, columnas, codigos_snies, periodos))
+
+    def leer_arrow(self, nombre: str, columnas=None, codigos_snies=None, periodos=None) -> pa.Table:
+        """Igual que `leer_tabla`, sin pasar a pandas."""
+        if not self.en_memoria:
+
+            return leer_arrow(nombre, columnas, codigos_snies, self.fuente, self.cache_dir, self.ttl,
+                              periodos)
+
+        tabla = self.tablas[nombre]
+
+        # Se filtra antes de proyectar: la columna del filtro puede no estar en `columnas`
+
+        for columna, valores in (('CODIGO_SNIES', codigos_snies), ('PERIODO', periodos)):
+
+            if valores is not None:
+
+                conjunto = _arreglo(valores, tabla.schema.field(columna).type)
+                tabla = tabla.filter(pc.is_in(tabla[columna], value_set=conjunto))
+
+        if columnas is not None:
+
+            tabla = tabla.select([c for c in columnas if c in tabla.column_names])
+
+        return tabla
+
+    def contar_filas(self, nombre: str) -> int:
+
+        if not self.en_memoria:
+
+            return contar_filas(nombre, self.fuente, self.cache_dir, self.ttl)
+
+        return self.tablas[nombre].num_rows
+
+
+def ruta_snapshot(version: str, columnas=None, cache_dir: str = None) -> str:
+    """Directorio del snapshot Arrow de una versión del dataset (y un conjunto de columnas)."""
+    sufijo = 'todas' if columnas is None else hashlib.sha256(
+        ','.join(sorted(columnas)).encode('utf-8')).hexdigest()[:8]
+
+    return os.path.join(cache_dir or CACHE_DIR, 'snapshots', f'{version}_{sufijo}')
+
+
+def _snapshot_completo(directorio: str) -> bool:
+
+    meta = _leer_meta(os.path.join(directorio, 'snapshot.json'))
+
+    return bool(meta) and all(os.path.exists(os.path.join(directorio, f'{nombre}.arrow'))
+                              for nombre in meta.get('tablas', []))
+
+
+def _version_snapshot(ruta: str) -> str:
+    """Versión del dataset de un snapshot (de su snapshot.json o de su nombre `<version>_<columnas>`)."""
+    return _leer_meta(os.path.join(ruta, 'snapshot.json')).get('version') or os.path.basename(ruta).rsplit('_', 1)[0]
+
+
+def _borrar_snapshots_viejos(actual: str):
+    """
+    Borra los snapshots de otras versiones del dataset. Los de la misma versión con otro
+    conjunto de columnas se conservan: otro lote o el servicio puede estar usándolos. En
+    Linux/macOS un proceso que todavía tenga mapeado uno borrado lo sigue leyendo hasta
+    que lo suelta.
+    """
+    padre = os.path.dirname(actual)
+    version = _version_snapshot(actual)
+
+    for nombre in os.listdir(padre):
+
+        ruta = os.path.join(padre, nombre)
+
+        if ruta != actual and not nombre.startswith('.tmp_') and _version_snapshot(ruta) != version:
+
+            shutil.rmtree(ruta, ignore_errors=True)
+
+
+def version_tabla(nombre: str, cache_dir: str = None) -> str:
+    """Versión (sha256) de la copia en caché de la tabla `nombre` ('' si no está)."""
+    return _leer_meta(_rutas_cache(cache_dir or CACHE_DIR, nombre)[1]).get('version', '')
+
+
+def version_dataset(cache_dir: str = None) -> str:
+    """
+    Versión del conjunto de tablas en caché: un hash corto de las versiones (sha256) de
+    cada tabla. Cambia si cualquiera de las cuatro tablas cambia.
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    sha = hashlib.sha256()
+
+    for nombre in TABLAS_SNIES:
+
+        sha.update(f"{nombre}:{version_tabla(nombre, cache_dir)};".encode('utf-8'))
+
+    return sha.hexdigest()[:16]
+
+
+def limpiar_cache(cache_dir: str = None):
+    """Borra todas las tablas del caché local."""
+    shutil.rmtree(cache_dir or CACHE_DIR, ignore_errors=True)
@@ -1,10 +1,16 @@
 # Generador de reporte
 
 
+import io
+import os
+from functools import lru_cache
+
+import pptx
 from pptx import Presentation
 from pptx.util import Inches, Pt
 from pptx.enum.text import PP_ALIGN
 from pptx.dml.color import RGBColor
+from trazas import span
 
 # ==== Paleta de colores / tema ====
 COLOR_PRIMARIO = RGBColor(0, 82, 155)      # Azul oscuro
@@ -42,13 +48,55 @@ def estilo_fondo_contenido(slide, color=COLOR_FONDO_CLARO):
     fill.solid()
     fill.fore_color.rgb = color
 
-def crear_presentacion(nombre_programa: str, datos_snies: dict, datos_agente: dict, output_file: str):
+# Plantillas e imágenes en memoria
+
+PLANTILLA_POR_DEFECTO = os.path.join(os.path.dirname(pptx.__file__), 'templates', 'default.pptx')
+
+
+@lru_cache(maxsize = 8)
+def _leer_plantilla(ruta: str) -> bytes:
+
+    with open(ruta, 'rb') as f:
+        return f.read()
+
+
+def cargar_plantilla(plantilla = None) -> bytes:
+    """
+    Bytes de la plantilla .pptx (ruta o bytes; None = la de python-pptx). Las leídas de
+    disco quedan en memoria, así que generar muchas presentaciones en un mismo proceso no
+    vuelve a leer el archivo cada vez.
+    """
+    if isinstance(plantilla, (bytes, bytearray)):
+
+        return bytes(plantilla)
+
+    return _leer_plantilla(os.path.abspath(plantilla or PLANTILLA_POR_DEFECTO))
+
+
+def _imagen(datos_snies: dict, clave: str):
+    """La gráfica `clave` lista para add_picture: bytes en memoria si los hay, si no su ruta."""
+    imagen = datos_snies.get('imagenes', {}).get(clave)
+
+    if imagen:
+
+        return io.BytesIO(imagen)
+
+    return datos_snies.get('graficas', {}).get(clave)
+
+
+def crear_presentacion(nombre_programa: str, datos_snies: dict, datos_agente: dict,
+                       output_file: str = None, plantilla = None):
     """
     Crea una presentación de PowerPoint con los resultados del análisis.
+
+    Las gráficas se toman de `datos_snies['imagenes']` (bytes) o, si no están, de las rutas
+    en `datos_snies['graficas']`. `plantilla` puede ser la ruta o los bytes de un .pptx
+    (p. ej. precargado con `cargar_plantilla`). Si `output_file` es None no se escribe
+    nada en disco y se retornan los bytes de la presentación.
     """
-    print(f"Generando presentación: {output_file}...")
+    print(f"Generando presentación: {output_file or '(en memoria)'}...")
 
-    prs = Presentation()
+    prs = Presentation(io.BytesIO(cargar_plantilla(plantilla)))
 
 
     # Diapositiva Título
@@ -91,7 +139,7 @@ def crear_presentacion(nombre_programa: str, datos_snies: dict, datos_agente: di
     estilo_fondo_contenido(slide)
     slide.shapes.title.text = "Análisis SNIES: Costo vs. Matriculados (Colombia)"
 
-    img_path = datos_snies['graficas'].get('costo_vs_matriculados')
+    img_path = _imagen(datos_snies, 'costo_vs_matriculados')
 
     if img_path:
 
@@ -105,7 +153,7 @@ def crear_presentacion(nombre_programa: str, datos_snies: dict, datos_agente: di
     slide.shapes.title.text = "Análisis SNIES: Programas por Depto. (Top 10)"
     estilo_titulo_slide(slide)
 
-    img_path = datos_snies['graficas'].get('por_dpto')
+    img_path = _imagen(datos_snies, 'por_dpto')
     
     if img_path:
 
@@ -119,7 +167,7 @@ def crear_presentacion(nombre_programa: str, datos_snies: dict, datos_agente: di
     slide.shapes.title.text = "Análisis SNIES: Evolución de Estudiantes (Procesos)"
     estilo_titulo_slide(slide)
 
-    img_path = datos_snies['graficas'].get('estudiantes_tiempo')
+    img_path = _imagen(datos_snies, 'estudiantes_tiempo')
 
     if img_path:
 
@@ -182,5 +230,17 @@ def crear_presentacion(nombre_programa: str, datos_snies: dict, datos_agente: di
 
     # Guardar presentación
 
-    prs.save(output_file)
-    print(f"Presentación generada exitosamente en: {output_file}")
\ No newline at end of file
+    with span('presentacion.guardar', diapositivas = len(prs.slides)):
+
+        if output_file is None:
+
+            buffer = io.BytesIO()
+            prs.save(buffer)
+
+            return buffer.getvalue()
+
+        prs.save(output_file)
+
+    print(f"Presentación generada exitosamente en: {output_file}")
+
+    return output_file
\ No newline at end of file
@@ -0,0 +1,277 @@
+# Gráficas SNIES - Tareas de renderizado puras e independientes
+
+# Cada gráfica es una función que recibe los datos ya preparados y una ruta, y dibuja con
+# la API orientada a objetos de matplotlib (Figure + canvas Agg), sin tocar el estado global
+# de pyplot. Así las tareas pueden correr en paralelo en un pool de procesos.
+# Cada tarea retorna la imagen como bytes (lo que se pasa a la presentación sin tocar
+# disco); la ruta es opcional y solo se usa si además se quiere el archivo.
+
+
+# Librerias necesarias
+
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+from matplotlib import rcParams
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+
+
+FORMATO = 'png'
+
+# Solo formatos raster: las gráficas van a la presentación y python-pptx no inserta SVG ni PDF
+
+FORMATOS = ('png', 'jpg', 'jpeg')
+MAX_PROCESOS = int(os.getenv('GRAFICAS_PROCESOS', min(4, os.cpu_count() or 1)))
+
+# Un reporte son cinco gráficas pequeñas: arrancar el pool y pasarle los datos cuesta más de
+# lo que ahorra, así que por defecto se dibujan en secuencia (GRAFICAS_PARALELO=1 usa el pool)
+
+PARALELO = os.getenv('GRAFICAS_PARALELO', '0').lower() in ('1', 'true', 'si', 'sí')
+
+# Evolución de matrícula: con más series que esto se dibujan bandas de percentiles, la
+# mediana y las TOP_N_EVOLUCION series de mayor valor promedio en vez de una línea por programa
+
+MAX_SERIES_EVOLUCION = int(os.getenv('GRAFICAS_MAX_SERIES', 50))
+TOP_N_EVOLUCION = 5
+
+_pool = None
+
+
+def _guardar(fig: Figure, ruta: str = None, dpi = None, formato: str = FORMATO) -> bytes:
+    """Dibuja la figura en memoria y retorna los bytes; si hay `ruta`, también los escribe."""
+    buffer = io.BytesIO()
+    fig.savefig(buffer, dpi = dpi or 'figure', format = formato)
+    imagen = buffer.getvalue()
+
+    if ruta:
+
+        with open(ruta, 'wb') as f:
+            f.write(imagen)
+
+    return imagen
+
+
+# Tareas de renderizado
+
+def graficar_costo_matriculados(df2, ruta: str = None, dpi = None, formato: str = FORMATO) -> bytes:
+
+    fig = Figure()
+    ax = fig.subplots()
+    ax.scatter(df2['CANTIDAD'], df2['MATRICULA'])
+    ax.set_xlabel('Promedio de estudiantes matriculados (2021-2023)')
+    ax.set_ylabel('Valor último de matrícula pagado')
+    ax.set_title('Costo vs. Promedio de Matriculados')
+
+    return _guardar(fig, ruta, dpi, formato)
+
+
+def _series(evolucion):
+    """
+    Pasa la tabla larga (Nombre_ies, PERIODO, MATRICULA) a arreglos: periodos y nombres
+    únicos, y por fila el número de serie, la posición del periodo (x) y el valor (y),
+    ordenados por serie y periodo. `cortes` marca dónde empieza cada serie.
+    """
+    periodos, x = np.unique(evolucion['PERIODO'].to_numpy(dtype = str), return_inverse = True)
+    nombres, serie = np.unique(evolucion['Nombre_ies'].to_numpy(dtype = str), return_inverse = True)
+    y = evolucion['MATRICULA'].to_numpy(dtype = float)
+    orden = np.lexsort((x, serie))
+    serie, x, y = serie[orden], x[orden], y[orden]
+    cortes = np.flatnonzero(np.diff(serie)) + 1
+
+    return periodos, nombres, serie, x, y, cortes
+
+
+def _percentiles_por_periodo(x, y, n_periodos: int, q = (10, 25, 50, 75, 90)):
+    """Percentiles `q` de los valores de cada periodo (NaN si el periodo no tiene valores)."""
+    orden = np.argsort(x, kind = 'stable')
+    xs, ys = x[orden], y[orden]
+    resultado = np.full((len(q), n_periodos), np.nan)
+
+    for valores, periodo in zip(np.split(ys, np.flatnonzero(np.diff(xs)) + 1), np.unique(xs)):
+
+        resultado[:, periodo] = np.percentile(valores, q)
+
+    return resultado
+
+
+def graficar_evolucion_matricula(evolucion, ruta: str = None, dpi = None, formato: str = FORMATO,
+                                 max_series: int = None, top_n: int = TOP_N_EVOLUCION) -> bytes:
+    """
+    Valor de matrícula por periodo a partir de la tabla larga (una fila por programa y
+    periodo con dato; los periodos sin dato no se dibujan como 0).
+
+    Hasta `max_series` programas se dibujan todas las líneas en una sola LineCollection.
+    Con más, el costo no crece con el número de programas: bandas P10-P90 y P25-P75, la
+    mediana y las `top_n` series de mayor valor promedio.
+    """
+    max_series = MAX_SERIES_EVOLUCION if max_series is None else max_series
+    fig = Figure()
+    ax = fig.subplots()
+    ax.set_title('Evolución Valor de Matrícula')
+
+    if len(evolucion) == 0:
+
+        ax.text(0.5, 0.5, 'Sin datos de matrícula', ha = 'center', va = 'center', transform = ax.transAxes)
+
+        return _guardar(fig, ruta, dpi, formato)
+
+    periodos, nombres, serie, x, y, cortes = _series(evolucion)
+    colores = rcParams['axes.prop_cycle'].by_key()['color']
+
+    if len(nombres) <= max_series:
+
+        segmentos = np.split(np.column_stack([x, y]), cortes)
+        ax.add_collection(LineCollection(segmentos, colors = [colores[i % len(colores)] for i in range(len(segmentos))]))
+        ax.scatter(x, y, s = 4, c = [colores[i % len(colores)] for i in serie])
+
+    else:
+
+        p10, p25, p50, p75, p90 = _percentiles_por_periodo(x, y, len(periodos))
+        posiciones = np.arange(len(periodos))
+        ax.fill_between(posiciones, p10, p90, alpha = 0.15, color = colores[0], linewidth = 0, label = 'P10-P90')
+        ax.fill_between(posiciones, p25, p75, alpha = 0.3, color = colores[0], linewidth = 0, label = 'P25-P75')
+        ax.plot(posiciones, p50, color = colores[0], linewidth = 2, label = 'Mediana')
+
+        promedios = np.bincount(serie, weights = y) / np.bincount(serie)
+        segmentos = np.split(np.column_stack([x, y]), cortes)
+
+        for i, indice in enumerate(np.argsort(-promedios, kind = 'stable')[:top_n]):
+
+            nombre = nombres[indice] if len(nombres[indice]) <= 40 else nombres[indice][:37] + '...'
+            ax.plot(segmentos[indice][:, 0], segmentos[indice][:, 1], color = colores[(i + 1) % len(colores)],
+                    linewidth = 1, label = nombre)
+
+        ax.legend(fontsize = 'x-small', loc = 'upper left')
+        ax.set_title(f'Evolución Valor de Matrícula ({len(nombres)} programas)')
+
+    ax.set_xticks(np.arange(len(periodos)))
+    ax.set_xticklabels(periodos, rotation = 90)
+    ax.set_xlim(-0.5, len(periodos) - 0.5)
+    ax.autoscale(axis = 'y')
+    fig.tight_layout()
+
+    return _guardar(fig, ruta, dpi, formato)
+
+
+def graficar_por_dpto(porDpto, ruta: str = None, dpi = None, formato: str = FORMATO) -> bytes:
+
+    fig = Figure()
+    ax = fig.subplots()
+    top = porDpto.head(10)
+    posiciones = np.arange(len(top))
+
+    # Lo mismo que dibujaba DataFrame.plot.bar (una columna: programas por departamento)
+
+    ax.bar(posiciones, top.iloc[:, 0].to_numpy(), width = 0.5, label = top.columns[0])
+    ax.set_xticks(posiciones)
+    ax.set_xticklabels(top.index.astype(str), rotation = 90)
+    ax.set_xlim(-0.5, len(top) - 0.5)
+    ax.set_xlabel(top.index.name or '')
+    ax.legend()
+    ax.set_title('Programas por Departamento (Top 10)')
+
+    return _guardar(fig, ruta, dpi, formato)
+
+
+def graficar_estudiantes_tiempo(num, ruta: str = None, dpi = None, formato: str = FORMATO) -> bytes:
+
+    fig = Figure(figsize = (12, 14))
+    axes = fig.subplots(5, 1, sharex = True)
+
+    for i,col in enumerate(num.columns):
+
+        axes[i].plot(num[col])
+        axes[i].set_title(col)
+
+        if(i < len(num.columns) -1):
+
+            axes[i].label_outer()
+
+        else:
+
+            axes[-1].tick_params(axis = 'x', labelrotation = 90)
+
+        axes[i].grid()
+
+    fig.tight_layout()
+
+    return _guardar(fig, ruta, dpi, formato)
+
+
+# Ejecución de las tareas
+
+def contexto_procesos():
+    """
+    Contexto multiprocessing para los pools: forkserver (spawn donde no existe). Los pools
+    se crean desde hilos mientras corren el loop del agente y los hilos del SDK, y hacer
+    fork de un proceso con hilos puede dejar a los hijos bloqueados.
+    """
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+
+        return multiprocessing.get_context('spawn')
+
+    # El servidor importa matplotlib una vez y cada proceso del pool nace con él ya cargado
+
+    contexto = multiprocessing.get_context('forkserver')
+    contexto.set_forkserver_preload(['graficas_snies'])
+
+    return contexto
+
+
+def _obtener_pool() -> ProcessPoolExecutor:
+
+    global _pool
+
+    if _pool is None:
+
+        _pool = ProcessPoolExecutor(max_workers = MAX_PROCESOS, mp_context = contexto_procesos())
+
+    return _pool
+
+
+def cerrar_pool():
+    """Cierra el pool de procesos de renderizado (se vuelve a crear si se necesita)."""
+    global _pool
+
+    if _pool is not None:
+
+        _pool.shutdown()
+        _pool = None
+
+
+def renderizar(tareas: dict, paralelo: bool = None, dpi = None, formato: str = FORMATO) -> dict:
+    """
+    Ejecuta las tareas {clave: (funcion, datos, ruta)} y retorna {clave: bytes de la imagen}.
+    Con `ruta=None` la gráfica queda solo en memoria.
+
+    Con `paralelo=True` (por defecto PARALELO) cada gráfica se dibuja en un proceso del pool; si el pool no está
+    disponible (p. ej. un proceso murió) se dibujan en este mismo proceso.
+    """
+    if formato not in FORMATOS:
+
+        raise ValueError(f"Formato de gráfica no soportado: {formato} (use uno de {', '.join(FORMATOS)})")
+
+    paralelo = PARALELO if paralelo is None else paralelo
+
+    if paralelo and len(tareas) > 1 and MAX_PROCESOS > 1:
+
+        try:
+
+            pool = _obtener_pool()
+            futuros = {clave: pool.submit(funcion, datos, ruta, dpi, formato)
+                       for clave, (funcion, datos, ruta) in tareas.items()}
+
+            return {clave: futuro.result() for clave, futuro in futuros.items()}
+
+        except BrokenProcessPool:
+
+            print("Advertencia: falló el pool de gráficas, se dibujan en secuencia.")
+            cerrar_pool()
+
+    return {clave: funcion(datos, ruta, dpi, formato)
+            for clave, (funcion, datos, ruta) in tareas.items()}
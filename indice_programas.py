@@ -0,0 +1,236 @@
+# Índice invertido de tokens para la búsqueda de programas equivalentes (Jaccard)
+
+# En vez de recorrer en Python todos los PROGRAMA_ACADEMICO por cada consulta, se construye
+# una sola vez un índice token -> ids de programa y el número de tokens de cada programa.
+# Una consulta solo toca los programas que contienen TODAS sus palabras y, como en ese caso
+# la intersección es la consulta completa, el Jaccard es |consulta| / |tokens del programa|,
+# que se calcula vectorizado con numpy.
+
+
+# Librerias necesarias
+
+import json
+import os
+import unicodedata
+from functools import reduce
+
+import numpy as np
+
+from datos_snies import CACHE_DIR, version_dataset
+
+
+UMBRAL_JACCARD = 0.5
+
+# Con SNIES_PLEGAR_ACENTOS=1 (o --sin-tildes) los tokens se comparan sin tildes
+# ('administración' encuentra 'ADMINISTRACION'); cada modo guarda su propio índice
+
+PLEGAR_ACENTOS = os.getenv('SNIES_PLEGAR_ACENTOS', '0').lower() in ('1', 'true', 'si', 'sí')
+
+
+def normalizar_tokens(texto, plegar_acentos: bool = False) -> set:
+    """Tokens de un nombre de programa: en minúsculas y, opcionalmente, sin tildes."""
+    texto = str(texto).lower()
+
+    if plegar_acentos:
+
+        texto = ''.join(c for c in unicodedata.normalize('NFKD', texto)
+                        if not unicodedata.combining(c))
+
+    return set(texto.split())
+
+
+class IndiceProgramas:
+    """
+    Índice invertido de los nombres de programa SNIES.
+
+    `plegar_acentos=False` reproduce exactamente la comparación original (lower + split);
+    con True, "matematicas" y "matemáticas" se consideran la misma palabra.
+    """
+
+    def __init__(self, programas, plegar_acentos: bool = False, version: str = None):
+
+        self.programas = list(programas)
+        self.plegar_acentos = plegar_acentos
+        self.version = version
+        self.n_tokens = np.zeros(len(self.programas), dtype=np.int32)
+
+        postings = {}
+
+        for i, prg in enumerate(self.programas):
+
+            tokens = normalizar_tokens(prg, plegar_acentos)
+            self.n_tokens[i] = len(tokens)
+
+            for token in tokens:
+
+                postings.setdefault(token, []).append(i)
+
+        self.postings = {t: np.asarray(ids, dtype=np.int32) for t, ids in postings.items()}
+
+    @classmethod
+    def desde_serie(cls, serie, plegar_acentos: bool = False, version: str = None):
+        """Construye el índice con los valores únicos (no nulos) de una columna de pandas."""
+        return cls(serie.dropna().unique(), plegar_acentos, version)
+
+    def buscar(self, nombre_programa: str, umbral: float = UMBRAL_JACCARD) -> list:
+        """
+        Programas que contienen todas las palabras de `nombre_programa` y cuyo índice de
+        Jaccard es >= `umbral`. Se retornan en el mismo orden en que aparecen en SNIES.
+        """
+        consulta = normalizar_tokens(nombre_programa, self.plegar_acentos)
+
+        if not consulta:
+
+            return []
+
+        listas = [self.postings.get(token) for token in consulta]
+
+        if any(ids is None for ids in listas):
+
+            return []
+
+        listas.sort(key=len)
+        candidatos = reduce(np.intersect1d, listas)
+        candidatos = candidatos[self.n_tokens[candidatos] > 0]
+
+        jaccard = len(consulta) / self.n_tokens[candidatos]
+
+        return [self.programas[i] for i in candidatos[jaccard >= umbral]]
+
+    def agregar(self, programas) -> int:
+        """
+        Agrega al índice los nombres de `programas` que aún no tiene (actualización
+        incremental). Retorna cuántos se agregaron. Los nombres que dejaron de existir no se
+        quitan: no coinciden con ningún CODIGO_SNIES, así que no afectan el análisis.
+        """
+        existentes = set(self.programas)
+        nuevos = [p for p in dict.fromkeys(programas) if p not in existentes]
+
+        if not nuevos:
+
+            return 0
+
+        inicio = len(self.programas)
+        self.programas.extend(nuevos)
+        n_tokens = np.zeros(len(nuevos), dtype=np.int32)
+        postings = {}
+
+        for i, prg in enumerate(nuevos):
+
+            tokens = normalizar_tokens(prg, self.plegar_acentos)
+            n_tokens[i] = len(tokens)
+
+            for token in tokens:
+
+                postings.setdefault(token, []).append(inicio + i)
+
+        self.n_tokens = np.concatenate([self.n_tokens, n_tokens])
+
+        for token, ids in postings.items():
+
+            ids = np.asarray(ids, dtype=np.int32)
+            self.postings[token] = np.concatenate([self.postings[token], ids]) if token in self.postings else ids
+
+        return len(nuevos)
+
+    # Persistencia
+
+    def guardar(self, ruta: str):
+        """Guarda el índice en JSON (escritura atómica)."""
+        datos = {
+            'version': self.version,
+            'plegar_acentos': self.plegar_acentos,
+            'programas': [str(p) for p in self.programas],
+            'n_tokens': self.n_tokens.tolist(),
+            'postings': {t: ids.tolist() for t, ids in self.postings.items()},
+        }
+
+        tmp = ruta + '.tmp'
+
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(datos, f, ensure_ascii=False)
+
+        os.replace(tmp, ruta)
+
+    @classmethod
+    def cargar(cls, ruta: str):
+
+        with open(ruta, 'r', encoding='utf-8') as f:
+            datos = json.load(f)
+
+        indice = cls.__new__(cls)
+        indice.programas = datos['programas']
+        indice.plegar_acentos = datos['plegar_acentos']
+        indice.version = datos['version']
+        indice.n_tokens = np.asarray(datos['n_tokens'], dtype=np.int32)
+        indice.postings = {t: np.asarray(ids, dtype=np.int32) for t, ids in datos['postings'].items()}
+
+        return indice
+
+
+def _ruta_indice(cache_dir: str, plegar_acentos: bool) -> str:
+
+    sufijo = '_sin_tildes' if plegar_acentos else ''
+
+    return os.path.join(cache_dir, f'indice_programas{sufijo}.json')
+
+
+def obtener_indice(serie_programas, plegar_acentos: bool = None, cache_dir: str = None,
+                   version: str = None) -> IndiceProgramas:
+    """
+    Retorna el índice de la versión actual del dataset. Si ya está guardado en el caché
+    se carga de disco; si no, se construye a partir de `serie_programas` y se guarda.
+    `plegar_acentos=None` usa SNIES_PLEGAR_ACENTOS.
+    """
+    plegar_acentos = PLEGAR_ACENTOS if plegar_acentos is None else plegar_acentos
+    cache_dir = cache_dir or CACHE_DIR
+    version = version or version_dataset(cache_dir)
+    ruta = _ruta_indice(cache_dir, plegar_acentos)
+
+    if os.path.exists(ruta):
+
+        try:
+            indice = IndiceProgramas.cargar(ruta)
+            if indice.version == version:
+                return indice
+        except (OSError, ValueError, KeyError):
+            pass
+
+    indice = IndiceProgramas.desde_serie(serie_programas, plegar_acentos, version)
+    os.makedirs(cache_dir, exist_ok=True)
+    indice.guardar(ruta)
+
+    return indice
+
+
+def actualizar_indice(serie_programas, plegar_acentos: bool = None, cache_dir: str = None,
+                      version: str = None) -> tuple:
+    """
+    Lleva el índice guardado (de cualquier versión anterior) a la versión `version`
+    agregando solo los programas nuevos de `serie_programas`. Si no hay índice guardado
+    se construye completo. Retorna (índice, número de programas agregados).
+    """
+    plegar_acentos = PLEGAR_ACENTOS if plegar_acentos is None else plegar_acentos
+    cache_dir = cache_dir or CACHE_DIR
+    version = version or version_dataset(cache_dir)
+    ruta = _ruta_indice(cache_dir, plegar_acentos)
+
+    try:
+        indice = IndiceProgramas.cargar(ruta)
+    except (OSError, ValueError, KeyError):
+        indice = None
+
+    if indice is None or indice.plegar_acentos != plegar_acentos:
+
+        indice = IndiceProgramas.desde_serie(serie_programas, plegar_acentos, version)
+        agregados = len(indice.programas)
+
+    else:
+
+        agregados = indice.agregar(serie_programas.dropna().unique())
+        indice.version = version
+
+    os.makedirs(cache_dir, exist_ok=True)
+    indice.guardar(ruta)
+
+    return indice, agregados
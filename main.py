@@ -1,50 +1,565 @@
 # Orquestador - Main
 
 
+import argparse
 import asyncio
+import cProfile
+import csv
+import json
 import os
-from procesador_snies import analizar_snies
-from agente_analista import analizar_tendencias
-from generador_reporte import crear_presentacion
+import time
+from agente_analista import analizar_tendencias, VERSION_PROMPTS
+from cache_analisis import (clave_analisis, guardar_analisis, cargar_analisis, listar_analisis,
+                            borrar_analisis, buscar_analisis)
+from trazas import traza, span, medir, en_span, con_perfil
 
+# pandas/pyarrow (SNIES), matplotlib (gráficas) y python-pptx (presentación) se importan
+# dentro de las funciones que los usan: así `python main.py agent-only ...` o
+# `report-from-cache` no pagan la importación de lo que no necesitan.
 
-async def main():
-    print("--- INICIO DEL ANÁLISIS DE OPORTUNIDAD DE PROGRAMAS ---")
-    
-    # 1. Obtener entrada del usuario
 
-    nombre_programa = input("Ingrese el nombre del programa a analizar: ")
-    descripcion = input("Ingrese una breve descripción del programa: ")
-    
-    output_dir = f"Reporte_{nombre_programa.replace(' ', '_')}"
+def carpeta_reporte(nombre_programa: str) -> str:
+
+    return f"Reporte_{nombre_programa.replace(' ', '_')}"
+
+
+def version_analisis(datos, plegar_acentos: bool = None) -> str:
+    """
+    Versión SNIES para la llave del caché de análisis: la del dataset y, si se buscan los
+    equivalentes sin tildes, una marca (cambian los programas equivalentes).
+    """
+    from indice_programas import PLEGAR_ACENTOS
+
+    plegar_acentos = PLEGAR_ACENTOS if plegar_acentos is None else plegar_acentos
+
+    return datos.version + ('+sin_tildes' if plegar_acentos else '')
+
+
+async def generar_reporte(nombre_programa: str, descripcion: str, datos = None,
+                          indice = None, agregados = None, refrescar: bool = False,
+                          perfilar: bool = False, guardar_imagenes: bool = True,
+                          plantilla = None, motor: str = None, plegar_acentos: bool = None,
+                          output_dir: str = None) -> str:
+    """
+    Corre los tres módulos para un programa y retorna la ruta de la presentación.
+    `datos`, `indice` y `agregados` permiten reutilizar lo ya cargado de SNIES (modo lote).
+
+    Si el mismo análisis (programa, descripción, versión de prompts y del dataset) ya está
+    en el caché, solo se vuelve a armar la presentación; `refrescar=True` lo recalcula.
+
+    Cada corrida deja una traza por etapa (tiempos, CPU, memoria, filas y tokens) en
+    `traza.json` dentro de la carpeta del reporte. Con `perfilar=True` además se guarda
+    un perfil cProfile de la etapa SNIES en `perfil_snies.prof`.
+
+    Las gráficas pasan en memoria hasta la presentación; con `guardar_imagenes=False` no
+    se escriben además como .png en la carpeta. `plantilla` es la ruta o los bytes de un
+    .pptx base (en modo lote se precarga una sola vez). `motor` elige el motor del cruce
+    SNIES ('pandas' o 'arrow') y `plegar_acentos` si los equivalentes se buscan sin tildes
+    (por defecto SNIES_PLEGAR_ACENTOS). `output_dir` reemplaza la carpeta por programa
+    (el servicio usa una por trabajo para que dos trabajos no se pisen).
+    """
+    output_dir = output_dir or carpeta_reporte(nombre_programa)
 
     if not os.path.exists(output_dir):
 
         os.makedirs(output_dir)
 
+    with traza('reporte', os.path.join(output_dir, 'traza.json'), programa = nombre_programa):
+
+        return await _generar_reporte(nombre_programa, descripcion, output_dir, datos, indice,
+                                      agregados, refrescar, perfilar, guardar_imagenes, plantilla, motor,
+                                      plegar_acentos)
+
+
+async def _generar_reporte(nombre_programa: str, descripcion: str, output_dir: str, datos, indice,
+                           agregados, refrescar: bool, perfilar: bool, guardar_imagenes: bool,
+                           plantilla, motor: str, plegar_acentos: bool) -> str:
+
+    from datos_snies import DatosSNIES
+    from procesador_snies import preparar_snies, completar_snies
+    from generador_reporte import crear_presentacion
+
+    output_file = os.path.join(output_dir, f"Reporte_{nombre_programa.replace(' ', '_')}.pptx")
+    dir_imagenes = output_dir if guardar_imagenes else None
+
+    if datos is None:
+
+        with span('snies.sincronizar'):
+
+            datos = DatosSNIES()
+
+    with span('cache_analisis.cargar', refrescar = refrescar) as s:
+
+        clave = clave_analisis(nombre_programa, descripcion, VERSION_PROMPTS,
+                               version_analisis(datos, plegar_acentos))
+        guardado = None if refrescar else cargar_analisis(clave, dir_imagenes)
+        s.anotar(clave = clave, acierto = guardado is not None)
+
+    if guardado is not None:
+
+        print(f"Usando el análisis guardado ({clave}). Use --refresh para recalcularlo.")
+        datos_snies, datos_agente = guardado
+
+        with span('presentacion'):
+
+            crear_presentacion(nombre_programa, datos_snies, datos_agente, output_file, plantilla)
+
+        return output_file
+
+    perfil = cProfile.Profile() if perfilar else None
+
+    # 2. Etapa SNIES 1: equivalentes, cruce y texto de programas (Módulo 1)
+
+    # Los spans de las etapas en hilo se abren dentro del hilo: así su CPU es el del hilo
+
+    preparado = await asyncio.to_thread(en_span, 'snies.preparar', con_perfil, perfil, preparar_snies,
+                                        nombre_programa, datos = datos, indice = indice, agregados = agregados,
+                                        motor = motor, plegar_acentos = plegar_acentos)
+
+    programas_snies_texto = preparado.get('texto_programas', 'No hay datos de SNIES.')
+
+    # 3. El agente (Módulo 2) arranca ya con el texto; mientras tanto las tablas y las
+    #    gráficas SNIES se terminan en un hilo aparte. La presentación espera a ambos.
+
+    tarea_snies = asyncio.create_task(asyncio.to_thread(
+        en_span, 'snies.completar', con_perfil, perfil, completar_snies, preparado, dir_imagenes))
+    tarea_agente = asyncio.create_task(medir('agente', analizar_tendencias(
+        nombre_programa, descripcion, programas_snies_texto)))
+
     try:
-        # 2. Ejecutar el análisis SNIES (Módulo 1)
 
-        datos_snies = analizar_snies(nombre_programa, output_dir)
-        
-        programas_snies_texto = datos_snies.get('texto_programas', 'No hay datos de SNIES.')
-        
-        # 3. Ejecutar el análisis de agentes (Módulo 2)
+        datos_snies, datos_agente = await asyncio.gather(tarea_snies, tarea_agente)
+
+    except Exception:
+
+        # Sin una de las dos partes no hay reporte: no dejar al agente corriendo en segundo plano
+
+        tarea_agente.cancel()
+        await asyncio.gather(tarea_agente, return_exceptions = True)
+        raise
+
+    if perfil is not None:
+
+        perfil.dump_stats(os.path.join(output_dir, 'perfil_snies.prof'))
+
+    # Guardar el análisis para próximas corridas (si el agente no falló ni quedó parcial)
+
+    if 'error' not in datos_agente and not datos_agente.get('parcial'):
+
+        with span('cache_analisis.guardar'):
+
+            guardar_analisis(clave, nombre_programa, descripcion, datos_snies, datos_agente,
+                             {'prompts': VERSION_PROMPTS, 'snies': datos.version})
+
+    # 4. Generar el reporte (Módulo 3)
+
+    with span('presentacion'):
+
+        crear_presentacion(nombre_programa, datos_snies, datos_agente, output_file, plantilla)
+
+    return output_file
 
-        datos_agente = await analizar_tendencias(nombre_programa, descripcion, programas_snies_texto)
-        
-        # 4. Generar el reporte (Módulo 3)
-        
-        output_file = os.path.join(output_dir, f"Reporte_{nombre_programa.replace(' ', '_')}.pptx")
-        crear_presentacion(nombre_programa, datos_snies, datos_agente, output_file)
+
+async def main(**opciones):
+    """Modo interactivo. `opciones` se pasan tal cual a generar_reporte (refrescar, perfilar, ...)."""
+    print("--- INICIO DEL ANÁLISIS DE OPORTUNIDAD DE PROGRAMAS ---")
+
+    # 1. Obtener entrada del usuario
+
+    nombre_programa = input("Ingrese el nombre del programa a analizar: ")
+    descripcion = input("Ingrese una breve descripción del programa: ")
+
+    try:
+
+        output_file = await generar_reporte(nombre_programa, descripcion, **opciones)
 
         print(f"--- ANÁLISIS COMPLETADO ---")
-        print(f"El reporte se ha guardado en la carpeta: {output_dir}")
+        print(f"El reporte se ha guardado en la carpeta: {os.path.dirname(output_file)}")
 
     except Exception as e:
 
         print(f"Ha ocurrido un error durante la ejecución: {str(e)}")
 
+
+# Modo lote: muchos programas con una sola carga de SNIES
+
+def leer_lote(ruta: str) -> list:
+    """
+    Lee los pares (programa, descripción) de un CSV con encabezado `programa,descripcion`
+    o de un JSONL con un objeto {"programa": ..., "descripcion": ...} por línea.
+    """
+    pares = []
+
+    with open(ruta, 'r', encoding='utf-8-sig', newline='') as f:
+
+        if ruta.lower().endswith('.jsonl'):
+
+            filas = (json.loads(linea) for linea in f if linea.strip())
+
+        else:
+
+            filas = csv.DictReader(f)
+
+        for fila in filas:
+
+            programa = (fila.get('programa') or '').strip()
+
+            if programa:
+
+                pares.append((programa, (fila.get('descripcion') or '').strip()))
+
+    return pares
+
+
+def cargar_snies(motor: str = None, snapshot: str = None, plegar_acentos: bool = None) -> tuple:
+    """
+    Carga en memoria lo que comparten muchos reportes: las tablas SNIES (solo las columnas
+    usadas), el índice de programas y los agregados precalculados de la versión actual.
+    Con `snapshot` (directorio de un snapshot Arrow) las tablas y los agregados no se
+    copian: se mapean desde el archivo, compartido con los demás procesos del lote.
+    """
+    from agregados_snies import AlmacenAgregados
+    from datos_snies import DatosSNIES
+    from indice_programas import obtener_indice
+    from procesador_snies import precalcular_agregados, COLUMNAS_USADAS
+
+    if snapshot:
+
+        datos = DatosSNIES.desde_snapshot(snapshot)
+
+    else:
+
+        datos = DatosSNIES.cargar(columnas = COLUMNAS_USADAS)
+    indice = obtener_indice(datos.leer_tabla('PROGRAMAS', ['PROGRAMA_ACADEMICO'])['PROGRAMA_ACADEMICO'],
+                            plegar_acentos, cache_dir = datos.cache_dir, version = datos.version)
+    agregados = AlmacenAgregados.desde_snapshot(snapshot, datos.version) if snapshot else None
+
+    if agregados is None:
+
+        agregados = precalcular_agregados(datos, motor)
+
+    return datos, indice, agregados
+
+
+async def _reporte_lote(nombre_programa: str, descripcion: str, datos, indice, agregados,
+                       **opciones) -> dict:
+    """Un reporte del lote; los errores quedan en el resumen en vez de detener el lote."""
+    t0 = time.perf_counter()
+
+    try:
+
+        output_file = await generar_reporte(nombre_programa, descripcion, datos, indice, agregados,
+                                            **opciones)
+
+        return {'programa': nombre_programa, 'estado': 'ok', 'salida': output_file,
+                'segundos': time.perf_counter() - t0}
+
+    except Exception as e:
+
+        print(f"Ha ocurrido un error con {nombre_programa}: {str(e)}")
+
+        return {'programa': nombre_programa, 'estado': 'error', 'error': str(e),
+                'segundos': time.perf_counter() - t0}
+
+
+async def main_lote(ruta: str, procesos: int = 1, **opciones) -> list:
+    """
+    Genera un reporte por cada programa del archivo. Las tablas SNIES y el índice de
+    programas se cargan una sola vez y los agregados se precalculan (o se leen de disco)
+    una vez por versión del dataset; un error en un programa no detiene a los demás.
+    La plantilla de la presentación también se lee una sola vez.
+
+    Con `procesos > 1` los reportes se reparten entre varios procesos que se adjuntan al
+    mismo snapshot Arrow de SNIES (memoria de un solo dataset, no una copia por proceso).
+    """
+    from generador_reporte import cargar_plantilla
+
+    print("--- INICIO DEL ANÁLISIS EN LOTE ---")
+
+    pares = leer_lote(ruta)
+    print(f"Programas a analizar: {len(pares)}")
+
+    inicio = time.perf_counter()
+    opciones['plantilla'] = cargar_plantilla(opciones.get('plantilla'))
+
+    if procesos > 1 and len(pares) > 1:
+
+        resumen = await _main_lote_procesos(pares, min(procesos, len(pares)), opciones, inicio)
+
+    else:
+
+        datos, indice, agregados = cargar_snies(opciones.get('motor'), None, opciones.get('plegar_acentos'))
+        print(f"Datos SNIES cargados en {time.perf_counter() - inicio:.1f} s")
+
+        resumen = []
+
+        for i, (nombre_programa, descripcion) in enumerate(pares, start = 1):
+
+            print(f"--- [{i}/{len(pares)}] {nombre_programa} ---")
+            resumen.append(await _reporte_lote(nombre_programa, descripcion, datos, indice, agregados,
+                                               **opciones))
+
+    imprimir_resumen(resumen, time.perf_counter() - inicio)
+
+    return resumen
+
+
+# Modo lote en varios procesos: cada proceso se adjunta al snapshot Arrow de SNIES
+
+_trabajador = {}
+
+
+def _iniciar_trabajador(snapshot: str, opciones: dict):
+
+    import graficas_snies
+
+    # Los procesos del lote ya reparten el trabajo: las gráficas se dibujan en el mismo proceso
+
+    graficas_snies.MAX_PROCESOS = 1
+    _trabajador['snies'] = cargar_snies(opciones.get('motor'), snapshot, opciones.get('plegar_acentos'))
+    _trabajador['opciones'] = opciones
+
+
+def _reporte_en_proceso(nombre_programa: str, descripcion: str) -> dict:
+
+    print(f"--- [proceso {os.getpid()}] {nombre_programa} ---")
+
+    return asyncio.run(_reporte_lote(nombre_programa, descripcion, *_trabajador['snies'],
+                                     **_trabajador['opciones']))
+
+
+async def _main_lote_procesos(pares: list, procesos: int, opciones: dict, inicio: float) -> list:
+
+    import graficas_snies
+    from concurrent.futures import ProcessPoolExecutor
+    from datos_snies import DatosSNIES
+    from procesador_snies import COLUMNAS_USADAS
+
+    # El proceso principal deja listos el snapshot, el índice y los agregados en disco;
+    # los trabajadores solo los leen
+
+    snapshot = DatosSNIES.cargar_compartida(columnas = COLUMNAS_USADAS).snapshot
+    datos, _, agregados = cargar_snies(opciones.get('motor'), snapshot, opciones.get('plegar_acentos'))
+    agregados.exportar_snapshot(snapshot, datos.cache_dir)
+    print(f"Snapshot SNIES listo en {time.perf_counter() - inicio:.1f} s: {snapshot} ({procesos} procesos)")
+
+    loop = asyncio.get_running_loop()
+
+    # Sin fork: los trabajadores no heredan la copia privada de agregados del proceso principal
+
+    with ProcessPoolExecutor(max_workers = procesos, mp_context = graficas_snies.contexto_procesos(),
+                             initializer = _iniciar_trabajador, initargs = (snapshot, opciones)) as pool:
+
+        return list(await asyncio.gather(*(loop.run_in_executor(pool, _reporte_en_proceso, programa, descripcion)
+                                           for programa, descripcion in pares)))
+
+
+def imprimir_resumen(resumen: list, total: float):
+
+    ok = [r for r in resumen if r['estado'] == 'ok']
+    errores = [r for r in resumen if r['estado'] == 'error']
+
+    print("--- RESUMEN DEL LOTE ---")
+
+    for r in resumen:
+
+        detalle = r['salida'] if r['estado'] == 'ok' else r['error']
+        print(f"{r['estado'].upper():6} {r['segundos']:8.1f} s  {r['programa']}: {detalle}")
+
+    print(f"Exitosos: {len(ok)}  Fallidos: {len(errores)}  Tiempo total: {total:.1f} s")
+
+
+def imprimir_analisis_guardados():
+
+    analisis = listar_analisis()
+
+    if not analisis:
+
+        print("No hay análisis guardados.")
+
+    for a in analisis:
+
+        fecha = time.strftime('%Y-%m-%d %H:%M', time.localtime(a.get('creado', 0)))
+        print(f"{a['clave']}  {fecha}  {a.get('programa', '')}  (SNIES {a.get('versiones', {}).get('snies', '?')})")
+
+
+# Subcomandos: una sola parte del flujo, importando solo lo que esa parte usa
+
+def solo_snies(nombre_programa: str, guardar_imagenes: bool = True, motor: str = None,
+               plegar_acentos: bool = None) -> dict:
+    """
+    Solo el Módulo 1 (sin agente ni presentación). Deja `snies.json` con las tablas y el
+    texto de programas (y las gráficas .png, salvo `guardar_imagenes=False`) en la carpeta
+    del reporte.
+    """
+    from procesador_snies import analizar_snies
+
+    output_dir = carpeta_reporte(nombre_programa)
+    os.makedirs(output_dir, exist_ok = True)
+
+    with traza('snies', os.path.join(output_dir, 'traza.json'), programa = nombre_programa):
+
+        resultados = analizar_snies(nombre_programa, output_dir if guardar_imagenes else None, motor = motor,
+                                    plegar_acentos = plegar_acentos)
+
+    ruta = os.path.join(output_dir, 'snies.json')
+
+    with open(ruta, 'w', encoding = 'utf-8') as f:
+        json.dump({k: v for k, v in resultados.items() if k != 'imagenes'}, f, ensure_ascii = False,
+                  indent = 2, default = lambda v: v.item() if hasattr(v, 'item') else str(v))
+
+    print(resultados.get('texto_programas', ''))
+    print(f"Resultados SNIES guardados en: {ruta}")
+
+    return resultados
+
+
+async def solo_agente(nombre_programa: str, descripcion: str, programas_snies: str) -> dict:
+    """Solo el Módulo 2 (sin cargar SNIES ni generar la presentación); imprime el JSON."""
+    with traza('agente', programa = nombre_programa):
+
+        datos_agente = await analizar_tendencias(nombre_programa, descripcion, programas_snies)
+
+    print(json.dumps(datos_agente, ensure_ascii = False, indent = 2))
+
+    return datos_agente
+
+
+def reporte_desde_cache(nombre_programa: str = None, descripcion: str = None, clave: str = None,
+                        guardar_imagenes: bool = True, plantilla = None) -> str:
+    """
+    Solo el Módulo 3: arma la presentación a partir de un análisis guardado (el más reciente
+    del programa, o el de `clave`), sin cargar SNIES ni llamar al agente. No revisa que el
+    análisis sea de la versión actual del dataset o de los prompts.
+    """
+    from generador_reporte import crear_presentacion
+
+    meta = buscar_analisis(nombre_programa, descripcion, clave)
+
+    if meta is None:
+
+        raise ValueError("No hay un análisis guardado para esa búsqueda (vea --listar-analisis).")
+
+    nombre_programa = meta.get('programa') or nombre_programa
+    output_dir = carpeta_reporte(nombre_programa)
+    os.makedirs(output_dir, exist_ok = True)
+    guardado = cargar_analisis(meta['clave'], output_dir if guardar_imagenes else None)
+
+    if guardado is None:
+
+        raise ValueError(f"El análisis {meta['clave']} está incompleto en el caché.")
+
+    print(f"Usando el análisis guardado {meta['clave']} (SNIES {meta.get('versiones', {}).get('snies', '?')}, "
+          f"prompts {meta.get('versiones', {}).get('prompts', '?')})")
+    output_file = os.path.join(output_dir, f"Reporte_{nombre_programa.replace(' ', '_')}.pptx")
+
+    return crear_presentacion(nombre_programa, guardado[0], guardado[1], output_file, plantilla)
+
+
 if __name__ == "__main__":
 
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description = "Análisis de oportunidad de programas académicos")
+    parser.add_argument('--lote', metavar = 'ARCHIVO',
+                        help = "CSV o JSONL con columnas programa y descripcion (modo no interactivo)")
+    parser.add_argument('--procesos', type = int, default = 1, metavar = 'N',
+                        help = "Modo lote: reparte los reportes entre N procesos que comparten un snapshot Arrow de SNIES")
+    parser.add_argument('--precalcular', action = 'store_true',
+                        help = "Solo precalcula los agregados SNIES de la versión actual del dataset")
+    parser.add_argument('--actualizar', action = 'store_true',
+                        help = "Actualiza SNIES de forma incremental (solo periodos nuevos o cambiados)")
+    parser.add_argument('--refresh', action = 'store_true',
+                        help = "Recalcula el análisis aunque ya esté guardado en el caché")
+    parser.add_argument('--listar-analisis', action = 'store_true',
+                        help = "Lista los análisis guardados en el caché")
+    parser.add_argument('--borrar-analisis', metavar = 'CLAVE', nargs = '?', const = 'todos',
+                        help = "Borra un análisis guardado (o todos si no se indica la clave)")
+    parser.add_argument('--perfil', action = 'store_true',
+                        help = "Guarda un perfil cProfile de la etapa SNIES (perfil_snies.prof)")
+    parser.add_argument('--sin-imagenes', action = 'store_true',
+                        help = "No escribe las gráficas como .png (solo van dentro de la presentación)")
+    parser.add_argument('--plantilla', metavar = 'PPTX', help = "Plantilla .pptx base para la presentación")
+    parser.add_argument('--motor', metavar = 'MOTOR',
+                        help = "Motor del cruce y los agregados SNIES: pandas o arrow (por defecto SNIES_MOTOR o pandas)")
+    parser.add_argument('--sin-tildes', action = 'store_true', default = None,
+                        help = "Busca los programas equivalentes sin tildes (por defecto SNIES_PLEGAR_ACENTOS)")
+
+    subcomandos = parser.add_subparsers(dest = 'comando', metavar = 'COMANDO')
+    sub = subcomandos.add_parser('snies-only', help = "Solo la parte SNIES: tablas, gráficas y texto de programas")
+    sub.add_argument('programa')
+    sub = subcomandos.add_parser('agent-only', help = "Solo el agente (sin SNIES ni presentación); imprime el JSON")
+    sub.add_argument('programa')
+    sub.add_argument('--descripcion', default = '')
+    sub.add_argument('--programas-snies', default = 'No hay datos de SNIES.',
+                     help = "Texto de programas locales que se pasa al Planner como contexto")
+    sub = subcomandos.add_parser('report-from-cache', help = "Presentación a partir de un análisis guardado")
+    sub.add_argument('programa', nargs = '?')
+    sub.add_argument('--descripcion', help = "Si se da, el análisis guardado debe tener esta descripción")
+    sub.add_argument('--clave', help = "Clave del análisis (ver --listar-analisis)")
+
+    args = parser.parse_args()
+
+    if args.motor:
+
+        from motor_arrow import MOTORES
+
+        if args.motor not in MOTORES:
+
+            parser.error(f"motor desconocido: {args.motor} (use uno de {', '.join(MOTORES)})")
+
+    opciones = {'refrescar': args.refresh, 'perfilar': args.perfil,
+                'guardar_imagenes': not args.sin_imagenes, 'plantilla': args.plantilla,
+                'motor': args.motor, 'plegar_acentos': args.sin_tildes}
+
+    if args.comando == 'snies-only':
+
+        solo_snies(args.programa, not args.sin_imagenes, args.motor, args.sin_tildes)
+
+    elif args.comando == 'agent-only':
+
+        asyncio.run(solo_agente(args.programa, args.descripcion, args.programas_snies))
+
+    elif args.comando == 'report-from-cache':
+
+        if not (args.programa or args.clave):
+
+            parser.error("report-from-cache necesita el programa o --clave")
+
+        try:
+
+            print(f"Reporte: {reporte_desde_cache(args.programa, args.descripcion, args.clave, not args.sin_imagenes, args.plantilla)}")
+
+        except ValueError as e:
+
+            print(f"Ha ocurrido un error: {str(e)}")
+
+    elif args.listar_analisis:
+
+        imprimir_analisis_guardados()
+
+    elif args.borrar_analisis:
+
+        clave = None if args.borrar_analisis == 'todos' else args.borrar_analisis
+        print(f"Análisis borrados: {borrar_analisis(clave)}")
+
+    elif args.actualizar:
+
+        from actualizacion_snies import actualizar_snies
+        from procesador_snies import COLUMNAS_USADAS
+
+        resumen = actualizar_snies(columnas = COLUMNAS_USADAS)
+        print(f"Versión SNIES: {resumen['version']}  Agregados: {resumen.get('agregados', 'sin cambios')}  "
+              f"Programas nuevos en el índice: {resumen.get('indice_programas_nuevos', 0)}")
+
+    elif args.precalcular:
+
+        from procesador_snies import precalcular_agregados
+
+        precalcular_agregados(motor = args.motor)
+
+    elif args.lote:
+
+        asyncio.run(main_lote(args.lote, args.procesos, **opciones))
+
+    else:
+
+        asyncio.run(main(**opciones))
@@ -0,0 +1,26 @@
+# Modelos de datos de la salida del agente (pydantic)
+
+# Están aparte de agente_analista.py para que importar el agente no cargue pydantic hasta
+# que se construye el Planner o se valida un FinalReport.
+
+
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+
+class ProgramItem(BaseModel):
+    program_name: Optional[str] = Field(None, description="Nombre del programa")
+    university: Optional[str] = Field(None, description="Universidad")
+    country: Optional[str] = Field(None, description="País")
+    url: Optional[str] = Field(None, description="URL oficial o principal")
+    courses_examples: List[str] = Field(default_factory=list, description="Curso(s) representativos si están disponibles")
+    tuition: Optional[str] = Field(None, description="Costo (monto+moneda+periodicidad) si está disponible")
+    intake_per_year: Optional[str] = Field(None, description="Ingreso/aforo anual si está disponible")
+    sources: List[str] = Field(default_factory=list)
+
+class FinalReport(BaseModel):
+    input_program: str
+    input_description: str
+    coverage: dict
+    items: List[ProgramItem]
+    insights: List[str]
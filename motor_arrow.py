@@ -0,0 +1,214 @@
+# Motor Arrow para el cruce y los agregados SNIES
+
+# El cruce MAESTRO x PROGRAMAS x OFERTA y sus groupby corren en pandas, en un solo núcleo y
+# materializando el cruce completo como DataFrame. Este motor hace los mismos pasos sobre
+# tablas Arrow tal como salen del escaneo del parquet (que ya empuja proyección y filtros):
+# los joins y group_by de pyarrow.compute corren en varios hilos y solo las tablas
+# agregadas, que son pequeñas, pasan a pandas.
+# Es un motor ansioso, no perezoso: cada paso (joins, orden, group_by) se ejecuta al
+# llamarlo y el cruce se materializa como tabla Arrow. Apunta a máquinas con varios
+# núcleos; en uno solo los joins de Arrow son más lentos que el merge de pandas
+# (benchmark.py, 10x: precálculo 1.1 s frente a 0.45 s), por eso pandas sigue siendo el
+# motor por defecto.
+# El resultado debe ser idéntico al de `agregados_snies.calcular_agregados` (mismas filas,
+# mismo orden y mismos tipos); `python benchmark.py --solo-motores` lo verifica.
+
+
+# Librerias necesarias
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from datos_snies import COLUMNAS_CATEGORICAS, COLUMNAS_NUMERICAS
+from agregados_snies import RANGO_PROXY_PER
+
+
+MOTORES = ('pandas', 'arrow')
+
+_ENTERO = r'^[-+]?\d+$'
+_NUMERO = r'^[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?$'
+
+
+# Tipos: lo mismo que hace datos_snies.a_pandas, pero sin salir de Arrow
+
+def _a_numero(columna: pa.ChunkedArray) -> pa.ChunkedArray:
+    """
+    Texto a número como `pd.to_numeric(errors='coerce')`: int64 si todos los valores son
+    enteros (y no hay nulos), si no float64 con nulo donde el texto no es un número.
+    """
+    if not (pa.types.is_string(columna.type) or pa.types.is_large_string(columna.type)):
+
+        return columna
+
+    texto = pc.utf8_trim_whitespace(columna)
+
+    if columna.null_count == 0 and pc.all(pc.match_substring_regex(texto, _ENTERO)).as_py() is not False:
+
+        return pc.cast(texto, pa.int64())
+
+    numeros = pc.if_else(pc.match_substring_regex(texto, _NUMERO), texto, pa.scalar(None, texto.type))
+
+    return pc.cast(numeros, pa.float64())
+
+
+def preparar_tabla(tabla: pa.Table) -> pa.Table:
+    """
+    Columnas de diccionario a texto plano (para joins y group_by) y numéricas a número. El
+    texto queda siempre como `string` (pandas 3 entrega `large_string` en from_pandas).
+    """
+    for i, campo in enumerate(tabla.schema):
+
+        columna = tabla.column(i)
+
+        if pa.types.is_dictionary(columna.type):
+
+            columna = pc.cast(columna, columna.type.value_type)
+
+        if pa.types.is_large_string(columna.type):
+
+            columna = pc.cast(columna, pa.string())
+
+        if campo.name in COLUMNAS_NUMERICAS:
+
+            columna = _a_numero(columna)
+
+        if columna is not tabla.column(i):
+
+            tabla = tabla.set_column(i, campo.name, columna)
+
+    return tabla
+
+
+def _con_fila(tabla: pa.Table, nombre: str) -> pa.Table:
+
+    return tabla.append_column(nombre, pa.array(np.arange(len(tabla), dtype = np.int64)))
+
+
+def _a_pandas(tabla: pa.Table) -> pd.DataFrame:
+    """
+    Tabla agregada a pandas con los mismos tipos que deja el motor pandas: las columnas que
+    allá eran categóricas (y Nombre_ies) quedan como object con NaN para los faltantes.
+    """
+    df = tabla.to_pandas()
+
+    for col in COLUMNAS_CATEGORICAS + ['Nombre_ies']:
+
+        if col in df.columns:
+
+            serie = df[col].astype(object)
+            df[col] = serie.where(serie.notna(), np.nan)
+
+    return df
+
+
+# Cruce
+
+def unir_tablas_arrow(maestro: pa.Table, programas: pa.Table, oferta: pa.Table) -> pa.Table:
+    """
+    Mismo cruce que `agregados_snies.unir_tablas` (left joins, CODIGO_INSTITUCION de la
+    primera tabla que lo tenga) y con el mismo orden de filas que pandas: el de MAESTRO y,
+    para cada fila, las coincidencias en el orden de PROGRAMAS y luego de OFERTA.
+    """
+    tablas = [preparar_tabla(t) for t in (maestro, programas, oferta)]
+    visto = False
+
+    for i, tabla in enumerate(tablas):
+
+        if 'CODIGO_INSTITUCION' in tabla.column_names:
+
+            if visto:
+
+                tablas[i] = tabla.drop_columns('CODIGO_INSTITUCION')
+
+            visto = True
+
+    maestro, programas, oferta = (_con_fila(t, f'__orden{i}') for i, t in enumerate(tablas))
+
+    # Las llaves deben tener el mismo tipo a ambos lados del join
+
+    for llave in ('CODIGO_SNIES', 'PERIODO'):
+
+        tipo = maestro.schema.field(llave).type
+
+        if llave == 'PERIODO':
+
+            oferta = oferta.set_column(oferta.column_names.index(llave), llave, pc.cast(oferta[llave], tipo))
+
+        else:
+
+            programas = programas.set_column(programas.column_names.index(llave), llave,
+                                             pc.cast(programas[llave], tipo))
+            oferta = oferta.set_column(oferta.column_names.index(llave), llave, pc.cast(oferta[llave], tipo))
+
+    cruce = maestro.join(programas, 'CODIGO_SNIES', join_type = 'left outer', use_threads = True)
+    cruce = cruce.join(oferta, ['CODIGO_SNIES', 'PERIODO'], join_type = 'left outer', use_threads = True)
+    orden = ['__orden0', '__orden1', '__orden2']
+    cruce = cruce.sort_by([(col, 'ascending') for col in orden])
+
+    return cruce.drop_columns(orden)
+
+
+# Agregados
+
+def _primeras(tabla: pa.Table, columnas: list) -> pa.Table:
+    """drop_duplicates de pandas: una fila por combinación, en orden de primera aparición."""
+    grupos = tabla.select(columnas + ['__fila']).group_by(columnas, use_threads = True)
+
+    return grupos.aggregate([('__fila', 'min')]).sort_by('__fila_min').select(columnas)
+
+
+def calcular_agregados_arrow(cruce: pa.Table) -> dict:
+    """Las mismas tablas que `agregados_snies.calcular_agregados`, calculadas sobre Arrow."""
+    cruce = _con_fila(preparar_tabla(cruce), '__fila')
+
+    periodos = _primeras(cruce, ['CODIGO_SNIES', 'PERIODO', 'CODIGO_INSTITUCION'])
+
+    # groupby de pandas descarta las llaves nulas y suma los grupos sin valores como 0
+
+    llaves = ['CODIGO_SNIES', 'PERIODO', 'PROCESO']
+    con_llaves = cruce.filter(pc.and_(pc.and_(pc.is_valid(cruce['CODIGO_SNIES']),
+                                              pc.is_valid(cruce['PERIODO'])),
+                                      pc.is_valid(cruce['PROCESO'])))
+    procesos = (con_llaves.select(llaves + ['CANTIDAD', '__fila'])
+                .group_by(llaves, use_threads = True)
+                .aggregate([('CANTIDAD', 'sum', pc.ScalarAggregateOptions(min_count = 0)),
+                            ('__fila', 'min')])
+                .sort_by('__fila_min'))
+    procesos = procesos.select(llaves + ['CANTIDAD_sum']).rename_columns(llaves + ['CANTIDAD'])
+
+    # Matriculados entre 2021-1 y 2024-2 con valor de matrícula conocido
+
+    proxy_per = cruce['PROXY_PER']
+    df = cruce.filter(pc.and_(pc.greater_equal(proxy_per, RANGO_PROXY_PER[0]),
+                              pc.less_equal(proxy_per, RANGO_PROXY_PER[1])))
+    df = df.filter(pc.equal(df['PROCESO'], 'MATRICULADOS'))
+    df = pa.table({
+        'CODIGO_SNIES': df['CODIGO_SNIES'],
+        'MATRICULA': df['MATRICULA'],
+        'CANTIDAD': df['CANTIDAD'],
+        'Nombre_ies': pc.binary_join_element_wise(df['INSTITUCION'], df['PROGRAMA_ACADEMICO'], ' - '),
+        'PERIODO': df['PERIODO'],
+        'DEPARTAMENTO_PROGRAMA': df['DEPARTAMENTO_PROGRAMA'],
+        'MUNICIPIO_PROGRAMA': df['MUNICIPIO_PROGRAMA'],
+    }).drop_null()
+
+    for col in ('MATRICULA', 'CANTIDAD'):
+
+        if pa.types.is_floating(df.schema.field(col).type):
+
+            df = df.filter(pc.invert(pc.is_nan(df[col])))
+
+    df = df.set_column(2, 'CANTIDAD', pc.cast(df['CANTIDAD'], pa.int64(), safe = False))
+    df = df.set_column(1, 'MATRICULA', pc.cast(df['MATRICULA'], pa.float64()))
+
+    ubicaciones = _primeras(cruce, ['CODIGO_SNIES', 'INSTITUCION', 'PROGRAMA_ACADEMICO',
+                                    'MUNICIPIO_PROGRAMA', 'DEPARTAMENTO_PROGRAMA'])
+
+    return {
+        'periodos': _a_pandas(periodos),
+        'procesos': _a_pandas(procesos),
+        'matricula': _a_pandas(df),
+        'ubicaciones': _a_pandas(ubicaciones),
+    }
@@ -1,64 +1,172 @@
 # Lector y procesador de datos SNIES para análisis de programas académicos
 
 # La idea es que analice los datos de SNIES para un programa académico dado y guardar los
-# resultados. Y retorne un diccionario con las rutas a las gráficas y datos clave.
+# resultados. Y retorne un diccionario con las gráficas (en memoria y, si se pide, sus
+# rutas en disco) y datos clave.
 
 
 # Librerias necesarias
 
 import pandas as pd
-import matplotlib.pyplot as plt
+import pyarrow as pa
 import os
+from functools import partial
+from datos_snies import DatosSNIES
+from indice_programas import IndiceProgramas, obtener_indice, UMBRAL_JACCARD
+from agregados_snies import AlmacenAgregados, calcular_agregados, unir_tablas
+from motor_arrow import MOTORES, unir_tablas_arrow, calcular_agregados_arrow
+import graficas_snies
+from trazas import span
+
+
+# Columnas que usa el análisis. Cada tabla se lee solo con las que tenga de esta lista.
+
+COLUMNAS_USADAS = [
+    'CODIGO_SNIES', 'CODIGO_INSTITUCION', 'INSTITUCION', 'PROGRAMA_ACADEMICO',
+    'DEPARTAMENTO_PROGRAMA', 'MUNICIPIO_PROGRAMA', 'PERIODO', 'PROXY_PER', 'PROCESO',
+    'CANTIDAD', 'MATRICULA',
+]
+
+
+# Tamaño máximo del listado de programas locales que se pasa al Planner (~4 caracteres
+# por token). None = sin límite.
+
+PRESUPUESTO_TOKENS = 1500
+CARACTERES_POR_TOKEN = 4
+
+
+# Motor del cruce y los agregados: 'pandas' o 'arrow' (mismo resultado, ver motor_arrow.py)
+
+MOTOR = os.getenv('SNIES_MOTOR', 'pandas')
+
+
+def construir_texto_programas(ubicaciones: pd.DataFrame, procesos: pd.DataFrame,
+                              presupuesto_tokens: int = PRESUPUESTO_TOKENS) -> str:
+    """
+    Listado de programas locales para el prompt, en tiempo lineal.
+
+    Las entradas (institución, programa, municipio) se deduplican y se ordenan por número
+    de matriculados; se incluyen mientras quepan en el presupuesto y el resto se resume
+    como "Y N programas más en M departamentos.".
+    """
+    matriculados = (procesos[procesos['PROCESO'] == 'MATRICULADOS']
+                    .groupby('CODIGO_SNIES')['CANTIDAD'].sum())
+
+    entradas = (ubicaciones.assign(CANTIDAD = ubicaciones['CODIGO_SNIES'].map(matriculados).fillna(0))
+                .groupby(['INSTITUCION', 'PROGRAMA_ACADEMICO', 'MUNICIPIO_PROGRAMA'], sort = False, dropna = False)
+                .agg(CANTIDAD = ('CANTIDAD', 'sum'), DEPARTAMENTO = ('DEPARTAMENTO_PROGRAMA', 'first'))
+                .sort_values(by = 'CANTIDAD', ascending = False, kind = 'stable'))
+
+    limite = None if presupuesto_tokens is None else presupuesto_tokens * CARACTERES_POR_TOKEN
+    reserva = 80   # espacio para la línea de resumen de la cola
+
+    partes = []
+    usados = 0
+
+    for i, (ies, prg, mpio) in enumerate(entradas.index, start = 1):
+
+        texto = f'Programa {i}: Universidad: {ies}, Programa: {prg}, Ubicación o ciudad: {mpio}. '
+
+        if limite is not None:
+
+            # La última entrada no necesita dejar espacio para el resumen
+
+            disponible = limite if i == len(entradas) else limite - reserva
+
+            if usados + len(texto) > disponible:
+
+                break
+
+        partes.append(texto)
+        usados += len(texto)
+
+    cola = entradas.iloc[len(partes):]
+
+    if len(cola):
+
+        partes.append(f"Y {len(cola)} programas más en {cola['DEPARTAMENTO'].nunique()} departamentos.")
+
+    return ''.join(partes)
 
 
 # Flujo principal 
 
-def analizar_snies(nombre_programa_usuario: str, output_dir: str = 'reporte_snies') -> dict:
+# El análisis tiene dos etapas para que main.py pueda solaparlas con el agente:
+#   1. preparar_snies: búsqueda de equivalentes, cruce/agregados y texto del prompt.
+#   2. completar_snies: tablas de indicadores y renderizado de las gráficas.
 
-    print("Iniciando análisis SNIES para: ", nombre_programa_usuario, "...")
+def analizar_snies(nombre_programa_usuario: str, output_dir: str = 'reporte_snies',
+                   datos: DatosSNIES = None, indice: IndiceProgramas = None,
+                   umbral_jaccard: float = UMBRAL_JACCARD,
+                   agregados: AlmacenAgregados = None, paralelo: bool = None,
+                   dpi: int = None, formato: str = 'png',
+                   presupuesto_tokens: int = PRESUPUESTO_TOKENS, motor: str = None,
+                   max_series: int = None, plegar_acentos: bool = None) -> dict:
 
+    preparado = preparar_snies(nombre_programa_usuario, datos, indice, umbral_jaccard,
+                               agregados, presupuesto_tokens, motor, plegar_acentos)
 
-    # Directorio de salida
+    return completar_snies(preparado, output_dir, paralelo, dpi, formato, max_series)
 
-    if not os.path.exists(output_dir):
 
-        os.makedirs(output_dir)
+def preparar_snies(nombre_programa_usuario: str, datos: DatosSNIES = None,
+                   indice: IndiceProgramas = None, umbral_jaccard: float = UMBRAL_JACCARD,
+                   agregados: AlmacenAgregados = None,
+                   presupuesto_tokens: int = PRESUPUESTO_TOKENS, motor: str = None,
+                   plegar_acentos: bool = None) -> dict:
+    """
+    Primera etapa: retorna {'programa', 'tablas', 'texto_programas'}. Es lo único que
+    necesita el agente, así que puede arrancar apenas termina esta etapa.
+
+    `motor` ('pandas' o 'arrow', por defecto SNIES_MOTOR) elige cómo se hace el cruce
+    cuando no hay agregados precalculados; el resultado es el mismo. `plegar_acentos`
+    (por defecto SNIES_PLEGAR_ACENTOS) busca los equivalentes sin tildes; solo aplica
+    cuando no se pasa un `indice` ya construido.
+    """
+    motor = motor or MOTOR
+
+    if motor not in MOTORES:
+
+        raise ValueError(f"Motor desconocido: {motor} (use uno de {', '.join(MOTORES)})")
+
+    print("Iniciando análisis SNIES para: ", nombre_programa_usuario, "...")
 
 
-    # La entrada del usuuario se recibe como argumento de la función
+    # Carga de los datos SNIES del repo del profe (a través del caché local versionado).
+    # De PROGRAMAS se leen solo las columnas usadas; de MAESTRO y OFERTA además solo las
+    # filas de los programas equivalentes (el filtro se empuja al escaneo del parquet).
+    # En modo lote `datos` ya trae las tablas en memoria y se comparte entre reportes.
 
-    programa_limpio = nombre_programa_usuario.lower()
-    programa_set = set(programa_limpio.split())
-    requerido = programa_set 
-    n = len(programa_set)
+    with span('snies.datos') as s:
 
-    # Carga de los datos SNIES del repo del profe
+        if datos is None:
 
-    maestro = pd.read_parquet('https://robertohincapie.com/data/snies/MAESTRO.parquet')
-    oferta = pd.read_parquet('https://robertohincapie.com/data/snies/OFERTA.parquet')
-    programas = pd.read_parquet('https://robertohincapie.com/data/snies/PROGRAMAS.parquet')
-    ies = pd.read_parquet('https://robertohincapie.com/data/snies/IES.parquet')
+            datos = DatosSNIES()
+
+        programas = datos.leer_tabla('PROGRAMAS', COLUMNAS_USADAS)
+        s.anotar(version = datos.version, en_memoria = datos.en_memoria, filas_programas = len(programas))
 
     # Prueba de que hay datos
 
-    print("Maestro: ", len(maestro), "oferta: ", len(oferta), 
-          "Programas: ", len(programas), "Instituciones: ", len(ies))
+    print("Maestro: ", datos.contar_filas('MAESTRO'), "oferta: ", datos.contar_filas('OFERTA'), 
+          "Programas: ", len(programas), "Instituciones: ", datos.contar_filas('IES'))
 
 
     # Filtrado de programas equivalentes
 
-    equivalentes = []
-
-    for prg in programas['PROGRAMA_ACADEMICO'].unique():
+    # Se usa el índice invertido (se construye una vez por versión del dataset y se
+    # puede reutilizar entre consultas). Umbral de Jaccard configurable (0.5 por defecto)
+    # y el programa debe contener todas las palabras clave.
 
-        prg2 = str(prg).lower().split()
-        indice_jaccard = len(programa_set.intersection(prg2)) / len(programa_set.union(prg2))
+    with span('snies.equivalentes', umbral = umbral_jaccard) as s:
 
-        # Umbral de Jaccard en 0.5 y que contenga todas las palabras clave
+        if indice is None:
 
-        if(indice_jaccard >= 0.5 and len(requerido.intersection(prg2)) == len(requerido)):
+            indice = obtener_indice(programas['PROGRAMA_ACADEMICO'], plegar_acentos,
+                                    cache_dir = datos.cache_dir, version = datos.version)
 
-            equivalentes.append(prg)
+        equivalentes = indice.buscar(nombre_programa_usuario, umbral_jaccard)
+        s.anotar(equivalentes = len(equivalentes))
 
     if not equivalentes:
 
@@ -67,133 +175,164 @@ def analizar_snies(nombre_programa_usuario: str, output_dir: str = 'reporte_snie
 
     programas2 = programas[programas['PROGRAMA_ACADEMICO'].isin(equivalentes)]
     snies2 = list(programas2['CODIGO_SNIES'].unique())
-    maestro2 = maestro[maestro['CODIGO_SNIES'].isin(snies2)]
 
-    institucion = {ies:name for ies,name in programas[['IES_PADRE','INSTITUCION']].values if str(ies) not in ['null','Nan']}
-    maestro3 = maestro2.merge(programas, left_on = 'CODIGO_SNIES', right_on = 'CODIGO_SNIES', how = 'left')
-    maestro4 = maestro3.merge(oferta, on = ['CODIGO_SNIES', 'PERIODO'], how = 'left')
+    # Si los agregados de esta versión del dataset ya están precalculados basta con tomar
+    # la rebanada de los programas equivalentes; si no, se cruzan las tablas de la consulta.
 
-    # Diccionario de resultados
+    with span('snies.agregados', programas_snies = len(snies2)) as s:
 
-    resultados = {
-        'graficas': {},
-        'tablas': {},
-        'texto_programas': ''
-    }
+        if agregados is None:
 
-    # Guardar gráficas pues pueden servir para el reporte
+            agregados = AlmacenAgregados.cargar(datos.version, datos.cache_dir)
 
-    # Gráfica 1: Número de programas e instituciones
+        if agregados is not None:
 
-    NprogNies = maestro4.groupby(by = 'PERIODO').agg({'CODIGO_INSTITUCION_x':'nunique', 'CODIGO_SNIES':'nunique'})
-    resultados['tablas']['n_prog_ies_tiempo'] = NprogNies.to_dict()
+            tablas = agregados.rebanar(snies2)
+            s.anotar(origen = 'precalculados')
 
-    # Gráfica 2: Costo vs Matriculados
+        elif motor == 'arrow':
 
-    maestro4['PROXY_PER'] = maestro4['PROXY_PER'].astype(int)
-    df = maestro4[(maestro4['PROXY_PER'] >= 20211) & (maestro4['PROXY_PER'] <= 20242)].copy()
-    df.loc[:,'Nombre_ies'] = df['INSTITUCION']+ ' - ' + df['PROGRAMA_ACADEMICO']
-    df = df[df['PROCESO'] == 'MATRICULADOS'].copy()
-    df['CANTIDAD'] = df['CANTIDAD'].astype(int)
-    df = df[['CODIGO_SNIES', 'MATRICULA', 'CANTIDAD', 'Nombre_ies', 'PERIODO',
-         'DEPARTAMENTO_PROGRAMA', 'MUNICIPIO_PROGRAMA']]
+            # El cruce se queda en Arrow y solo las tablas agregadas pasan a pandas
 
-    df = df.dropna()
-    df = df[df['MATRICULA'] != 'null'].copy()
+            with span('snies.cruce', motor = motor) as c:
 
-    df['MATRICULA'] = df['MATRICULA'].astype(float)
+                maestro2 = datos.leer_arrow('MAESTRO', COLUMNAS_USADAS, codigos_snies = snies2)
+                oferta = datos.leer_arrow('OFERTA', COLUMNAS_USADAS, codigos_snies = snies2)
+                maestro4 = unir_tablas_arrow(maestro2, pa.Table.from_pandas(programas2, preserve_index = False),
+                                             oferta)
+                mb = round(maestro4.nbytes / 2**20, 1)
+                c.anotar(filas_maestro = len(maestro2), filas_oferta = len(oferta), filas = len(maestro4), mb = mb)
 
-    ####print("Columnas en df:", df.columns)
+            print("Cruce SNIES (Arrow): ", len(maestro4), "filas, ", mb, "MB en memoria")
+            tablas = calcular_agregados_arrow(maestro4)
+            s.anotar(origen = 'cruce', motor = motor)
 
-    df2 = df.groupby(by = 'Nombre_ies').agg({'MATRICULA':'last', 'CANTIDAD':'mean'})
+        else:
 
-    # Grafica 2: Costo vs Matriculados
+            with span('snies.cruce', motor = motor) as c:
 
-    plt.figure() 
-    plt.scatter(df2['CANTIDAD'], df2['MATRICULA'])
-    plt.xlabel('Promedio de estudiantes matriculados (2021-2023)')
-    plt.ylabel('Valor último de matrícula pagado')
-    plt.title('Costo vs. Promedio de Matriculados')
+                maestro2 = datos.leer_tabla('MAESTRO', COLUMNAS_USADAS, codigos_snies = snies2)
+                oferta = datos.leer_tabla('OFERTA', COLUMNAS_USADAS, codigos_snies = snies2)
+                maestro4 = unir_tablas(maestro2, programas2, oferta)
+                mb = round(maestro4.memory_usage(deep = True).sum() / 2**20, 1)
+                c.anotar(filas_maestro = len(maestro2), filas_oferta = len(oferta), filas = len(maestro4), mb = mb)
 
-    path_g2 = os.path.join(output_dir, 'grafica_costo_matriculados.png')
+            print("Cruce SNIES: ", len(maestro4), "filas, ", mb, "MB en memoria")
+            tablas = calcular_agregados(maestro4)
+            s.anotar(origen = 'cruce', motor = motor)
 
-    plt.savefig(path_g2)
-    plt.close()
+        s.anotar(**{f'filas_{nombre}': len(tabla) for nombre, tabla in tablas.items()})
 
-    resultados['graficas']['costo_vs_matriculados'] = path_g2
-    resultados['tablas']['costo_vs_matriculados'] = df2.to_dict()
+    # Creación del prompt (con presupuesto de tamaño para el Planner)
 
-    # Grafica 3: Valor matrículas en el tiempo
+    with span('snies.texto_programas', presupuesto_tokens = presupuesto_tokens) as s:
 
-    valor = pd.pivot_table(df, index = 'Nombre_ies',columns = 'PERIODO', values = 'MATRICULA', aggfunc = 'mean', fill_value = 0)
-    
-    plt.figure()
-    valor.T.plot(legend = False) 
-    plt.title('Evolución Valor de Matrícula')
-    path_g3 = os.path.join(output_dir, 'grafica_evolucion_matricula.png')
-    plt.savefig(path_g3)
-    plt.close()
-    resultados['graficas']['evolucion_matricula'] = path_g3
+        texto_programas = construir_texto_programas(tablas['ubicaciones'], tablas['procesos'], presupuesto_tokens)
+        s.anotar(caracteres = len(texto_programas))
 
-    # Grafica 4: Programas por Dpto y Mpio
+    return {'programa': nombre_programa_usuario, 'tablas': tablas, 'texto_programas': texto_programas}
 
-    porDpto = df.groupby('DEPARTAMENTO_PROGRAMA').agg({'CODIGO_SNIES':'nunique'}).sort_values(by = 'CODIGO_SNIES', ascending = False)
-    porMpio = df.groupby('MUNICIPIO_PROGRAMA').agg({'CODIGO_SNIES':'nunique'}).sort_values(by = 'CODIGO_SNIES', ascending = False)
-    
-    plt.figure()
-    porDpto.head(10).plot.bar() 
-    plt.title('Programas por Departamento (Top 10)')
-    path_g4_dpto = os.path.join(output_dir, 'grafica_por_dpto.png')
-    plt.savefig(path_g4_dpto)
-    plt.close()
-    resultados['graficas']['por_dpto'] = path_g4_dpto
-    resultados['tablas']['por_dpto'] = porDpto.to_dict()
 
-    # Grafica 5: Estudiantes en el tiempo
+def completar_snies(preparado: dict, output_dir: str = 'reporte_snies', paralelo: bool = None,
+                    dpi: int = None, formato: str = 'png', max_series: int = None) -> dict:
+    """
+    Segunda etapa: tablas de indicadores y gráficas. Retorna el diccionario de resultados
+    con las imágenes en memoria ('imagenes': {clave: bytes}), las tablas y el texto de
+    programas. Si hay `output_dir` las gráficas también se escriben ahí y sus rutas quedan
+    en 'graficas'; con `output_dir=None` nada toca el disco.
 
-    num = pd.pivot_table(maestro4, index = 'PERIODO', columns = 'PROCESO', values = 'CANTIDAD', fill_value = 0, aggfunc = 'sum')
-    
-    fig, axes = plt.subplots(5, 1, sharex = True, figsize = (12, 14)) 
+    `max_series` (por defecto GRAFICAS_MAX_SERIES) es el número de programas desde el que
+    la evolución de matrícula pasa a bandas de percentiles con los principales resaltados.
+    `paralelo` (por defecto GRAFICAS_PARALELO) dibuja las gráficas en el pool de procesos.
+    """
+    tablas = preparado['tablas']
 
-    for i,col in enumerate(num.columns): 
+    # Directorio de salida (opcional)
 
-        axes[i].plot(num[col])
-        axes[i].set_title(col)
+    if output_dir and not os.path.exists(output_dir):
 
-        if(i < len(num.columns) -1):
+        os.makedirs(output_dir)
 
-            axes[i].label_outer()
+    # Diccionario de resultados
 
-        else:
+    resultados = {
+        'graficas': {},
+        'imagenes': {},
+        'tablas': {},
+        'texto_programas': preparado['texto_programas']
+    }
+
+    # Tablas para las gráficas (que pueden servir para el reporte)
+
+    with span('snies.tablas') as s:
 
-            plt.xticks(rotation = 90)
+        # Gráfica 1: Número de programas e instituciones
 
-        axes[i].grid()
+        NprogNies = tablas['periodos'].groupby(by = 'PERIODO').agg({'CODIGO_INSTITUCION':'nunique', 'CODIGO_SNIES':'nunique'})
+        resultados['tablas']['n_prog_ies_tiempo'] = NprogNies.to_dict()
 
-    plt.tight_layout()
-    path_g5 = os.path.join(output_dir, 'grafica_estudiantes_tiempo.png')
-    plt.savefig(path_g5)
-    plt.close()
-    resultados['graficas']['estudiantes_tiempo'] = path_g5
+        # Gráfica 2: Costo vs Matriculados (matriculados 2021-1 a 2024-2 con valor de matrícula)
 
+        df = tablas['matricula']
+        df2 = df.groupby(by = 'Nombre_ies').agg({'MATRICULA':'last', 'CANTIDAD':'mean'})
+        resultados['tablas']['costo_vs_matriculados'] = df2.to_dict()
 
-    # Creación del prompt
+        # Grafica 3: Valor matrículas en el tiempo (tabla larga: solo los periodos con dato)
 
-    cad = ''
-    i = 1
+        evolucion = df.groupby(['Nombre_ies', 'PERIODO'])['MATRICULA'].mean().reset_index()
 
-    for ies, prg, mpio in maestro4[['INSTITUCION', 'PROGRAMA_ACADEMICO', 'MUNICIPIO_PROGRAMA']].drop_duplicates().values:
-        
-        cad = cad + 'Programa ' + str(i) + ': Universidad: ' + ies+', Programa: ' + prg+', Ubicación o ciudad: ' + mpio+'. '
-        i+=1
+        # Grafica 4: Programas por Dpto y Mpio
+
+        porDpto = df.groupby('DEPARTAMENTO_PROGRAMA').agg({'CODIGO_SNIES':'nunique'}).sort_values(by = 'CODIGO_SNIES', ascending = False)
+        porMpio = df.groupby('MUNICIPIO_PROGRAMA').agg({'CODIGO_SNIES':'nunique'}).sort_values(by = 'CODIGO_SNIES', ascending = False)
+        resultados['tablas']['por_dpto'] = porDpto.to_dict()
+
+        # Grafica 5: Estudiantes en el tiempo
+
+        num = pd.pivot_table(tablas['procesos'], index = 'PERIODO', columns = 'PROCESO', values = 'CANTIDAD', fill_value = 0, aggfunc = 'sum')
+        s.anotar(filas_matricula = len(df), series_evolucion = evolucion['Nombre_ies'].nunique(), periodos = len(num))
+
+    # Renderizado de las gráficas: tareas independientes (backend Agg) en un pool de procesos
+
+    def ruta(nombre):
+
+        return os.path.join(output_dir, f'{nombre}.{formato}') if output_dir else None
+
+    tareas = {
+        'costo_vs_matriculados': (graficas_snies.graficar_costo_matriculados, df2, ruta('grafica_costo_matriculados')),
+        'evolucion_matricula': (partial(graficas_snies.graficar_evolucion_matricula, max_series = max_series),
+                                evolucion, ruta('grafica_evolucion_matricula')),
+        'por_dpto': (graficas_snies.graficar_por_dpto, porDpto, ruta('grafica_por_dpto')),
+        'estudiantes_tiempo': (graficas_snies.graficar_estudiantes_tiempo, num, ruta('grafica_estudiantes_tiempo')),
+    }
+
+    paralelo = graficas_snies.PARALELO if paralelo is None else paralelo
+
+    with span('snies.graficas', paralelo = paralelo, graficas = len(tareas), archivos = bool(output_dir)) as s:
+
+        resultados['imagenes'] = graficas_snies.renderizar(tareas, paralelo = paralelo, dpi = dpi, formato = formato)
+        s.anotar(bytes = sum(len(imagen) for imagen in resultados['imagenes'].values()))
+
+    resultados['graficas'] = {clave: archivo for clave, (_, _, archivo) in tareas.items() if archivo}
 
-    resultados['texto_programas'] = cad
 
     print("Análisis SNIES completado")
 
     return resultados
 
 
+def precalcular_agregados(datos: DatosSNIES = None, motor: str = None) -> AlmacenAgregados:
+    """
+    Precalcula (si hace falta) y guarda los agregados de la versión actual del dataset.
+    Después de esto cada `analizar_snies` solo agrega la rebanada de sus programas.
+    """
+    if datos is None:
+
+        datos = DatosSNIES()
+
+    return AlmacenAgregados.obtener(datos, COLUMNAS_USADAS, motor or MOTOR)
+
+
 #if __name__ == "__main__":
 
 #    analizar_snies('Doctorado Matematicas')   # Si funciona Mari. Si no hay carreras equivalentes saca error
\ No newline at end of file
@@ -0,0 +1,359 @@
+# Modo servicio: API HTTP local con los datos SNIES en memoria y una cola de reportes
+
+# Cada reporte por la línea de comandos es un proceso nuevo que vuelve a importar pandas,
+# matplotlib, el SDK de agentes y python-pptx y a cargar SNIES. Aquí un solo proceso:
+#   - carga una vez las tablas SNIES, el índice de programas, los agregados, la plantilla
+#     y los agentes Planner/Executor (POST /recargar los vuelve a cargar si SNIES publicó una versión nueva)
+#   - recibe reportes en una cola asyncio atendida por N trabajadores concurrentes
+#   - si llega un reporte que ya está en cola o corriendo (mismo programa y descripción,
+#     misma llave del caché de análisis) se entrega el mismo trabajo en vez de repetirlo
+#   - cada trabajo escribe en su propia carpeta (Reporte_<programa>/<id>): dos trabajos del
+#     mismo programa con distinta descripción no se pisan la presentación ni la traza
+#
+# Uso:
+#   python servidor.py --puerto 8080 --trabajadores 2
+#   python servidor.py --socket /tmp/reportes.sock
+#
+#   POST /trabajos                    {"programa": ..., "descripcion": ..., "refrescar": false}
+#   GET  /trabajos                    lista de trabajos
+#   GET  /trabajos/{id}               estado de un trabajo
+#   GET  /trabajos/{id}/resultado     la presentación .pptx (cuando el estado es 'listo')
+#   GET  /salud                       versión SNIES, trabajos en cola y trabajadores
+#   POST /recargar                    vuelve a cargar SNIES, índice, agregados y plantilla
+
+
+# Librerias necesarias
+
+import argparse
+import asyncio
+import itertools
+import os
+import time
+
+from aiohttp import web
+
+from main import generar_reporte, cargar_snies, version_analisis, carpeta_reporte
+from generador_reporte import cargar_plantilla
+from agente_analista import VERSION_PROMPTS, obtener_planner, obtener_executor, cerrar_sesion_http
+from cache_analisis import clave_analisis
+from motor_arrow import MOTORES
+
+
+TRABAJADORES = int(os.getenv('SERVIDOR_TRABAJADORES', '2'))
+MAX_TRABAJOS_TERMINADOS = 500   # los más antiguos se olvidan (los reportes quedan en disco)
+
+
+class Trabajo:
+    """Un reporte pedido al servicio."""
+
+    def __init__(self, id: str, programa: str, descripcion: str, clave: str, refrescar: bool = False):
+
+        self.id = id
+        self.programa = programa
+        self.descripcion = descripcion
+        self.clave = clave
+        self.refrescar = refrescar
+        self.estado = 'en_cola'
+        self.solicitudes = 1
+        self.creado = time.time()
+        self.inicio = None
+        self.fin = None
+        self.salida = None
+        self.error = None
+
+    @property
+    def activo(self) -> bool:
+
+        return self.estado in ('en_cola', 'corriendo')
+
+    def a_dict(self) -> dict:
+
+        return {
+            'id': self.id,
+            'programa': self.programa,
+            'descripcion': self.descripcion,
+            'estado': self.estado,
+            'solicitudes': self.solicitudes,
+            'creado': self.creado,
+            'inicio': self.inicio,
+            'fin': self.fin,
+            'segundos': round(self.fin - self.inicio, 2) if self.fin and self.inicio else None,
+            'salida': self.salida,
+            'error': self.error,
+        }
+
+
+class Servicio:
+    """Estado caliente (SNIES, índice, agregados, plantilla), cola y trabajadores."""
+
+    def __init__(self, trabajadores: int = TRABAJADORES, **opciones):
+
+        self.trabajadores = max(1, trabajadores)
+        self.opciones = opciones
+        self.datos = None
+        self.indice = None
+        self.agregados = None
+        self.plantilla = None
+        self.trabajos = {}
+        self.activos = {}
+        self.cola = asyncio.Queue()
+        self._tareas = []
+        self._ids = itertools.count(1)
+
+        # Los ids llevan la hora de arranque: al reiniciar el servicio no se reutilizan
+        # (ni las carpetas de los reportes que quedaron en disco)
+
+        self._prefijo_ids = time.strftime('%Y%m%d%H%M%S')
+
+    # Datos en memoria
+
+    def _cargar(self) -> tuple:
+
+        inicio = time.perf_counter()
+        datos, indice, agregados = cargar_snies(self.opciones.get('motor'), None,
+                                                self.opciones.get('plegar_acentos'))
+        plantilla = cargar_plantilla(self.opciones.get('plantilla'))
+        obtener_planner()
+        obtener_executor()
+        print(f"Datos SNIES {datos.version} cargados en {time.perf_counter() - inicio:.1f} s")
+
+        return datos, indice, agregados, plantilla
+
+    async def recargar(self):
+        """Carga (o vuelve a cargar) el estado caliente. Los trabajos en curso siguen con el anterior."""
+        self.datos, self.indice, self.agregados, self.plantilla = await asyncio.to_thread(self._cargar)
+
+    async def iniciar(self):
+
+        await self.recargar()
+        self._tareas = [asyncio.create_task(self._trabajador(i)) for i in range(self.trabajadores)]
+
+    async def detener(self):
+
+        for tarea in self._tareas:
+
+            tarea.cancel()
+
+        await asyncio.gather(*self._tareas, return_exceptions = True)
+        await cerrar_sesion_http()
+
+    # Cola
+
+    def encolar(self, programa: str, descripcion: str, refrescar: bool = False) -> tuple:
+        """
+        Agrega un reporte a la cola y retorna (trabajo, coalescido). Si el mismo análisis ya
+        está en cola o corriendo se retorna ese trabajo y no se encola otro. Un pedido con
+        `refrescar` se une a uno en cola (que pasa a refrescar), pero no a uno que ya corre
+        sin refrescar: ese pudo tomar el análisis guardado, así que se encola uno nuevo.
+        """
+        clave = clave_analisis(programa, descripcion, VERSION_PROMPTS,
+                               version_analisis(self.datos, self.opciones.get('plegar_acentos')))
+        trabajo = self.activos.get(clave)
+
+        if trabajo is not None and trabajo.activo and (not refrescar or trabajo.refrescar
+                                                       or trabajo.estado == 'en_cola'):
+
+            trabajo.solicitudes += 1
+            trabajo.refrescar = trabajo.refrescar or refrescar
+
+            return trabajo, True
+
+        trabajo = Trabajo(f'{self._prefijo_ids}-{next(self._ids)}', programa, descripcion, clave, refrescar)
+        self.trabajos[trabajo.id] = trabajo
+        self.activos[clave] = trabajo
+        self.cola.put_nowait(trabajo)
+        self._olvidar_terminados()
+
+        return trabajo, False
+
+    def _olvidar_terminados(self):
+
+        terminados = [t for t in self.trabajos.values() if not t.activo]
+
+        for trabajo in terminados[:max(0, len(terminados) - MAX_TRABAJOS_TERMINADOS)]:
+
+            del self.trabajos[trabajo.id]
+
+    async def _trabajador(self, numero: int):
+
+        while True:
+
+            trabajo = await self.cola.get()
+            trabajo.estado = 'corriendo'
+            trabajo.inicio = time.time()
+            print(f"--- [trabajador {numero}] {trabajo.programa} (trabajo {trabajo.id}) ---")
+
+            try:
+
+                trabajo.salida = await generar_reporte(
+                    trabajo.programa, trabajo.descripcion, self.datos, self.indice, self.agregados,
+                    refrescar = trabajo.refrescar, plantilla = self.plantilla,
+                    guardar_imagenes = self.opciones.get('guardar_imagenes', True),
+                    motor = self.opciones.get('motor'), plegar_acentos = self.opciones.get('plegar_acentos'),
+                    output_dir = os.path.join(carpeta_reporte(trabajo.programa), trabajo.id))
+                trabajo.estado = 'listo'
+
+            except asyncio.CancelledError:
+
+                trabajo.estado = 'cancelado'
+                raise
+
+            except Exception as e:
+
+                print(f"Ha ocurrido un error con {trabajo.programa}: {str(e)}")
+                trabajo.estado = 'error'
+                trabajo.error = str(e)
+
+            finally:
+
+                trabajo.fin = time.time()
+
+                if self.activos.get(trabajo.clave) is trabajo:
+
+                    del self.activos[trabajo.clave]
+
+                self.cola.task_done()
+
+    def salud(self) -> dict:
+
+        return {
+            'version_snies': self.datos.version if self.datos else None,
+            'trabajadores': self.trabajadores,
+            'en_cola': self.cola.qsize(),
+            'corriendo': sum(t.estado == 'corriendo' for t in self.trabajos.values()),
+            'trabajos': len(self.trabajos),
+        }
+
+
+# API HTTP
+
+SERVICIO = web.AppKey('servicio', Servicio)
+
+
+def _servicio(request) -> Servicio:
+
+    return request.app[SERVICIO]
+
+
+def _trabajo(request) -> Trabajo:
+
+    trabajo = _servicio(request).trabajos.get(request.match_info['id'])
+
+    if trabajo is None:
+
+        raise web.HTTPNotFound(text = 'Trabajo no encontrado')
+
+    return trabajo
+
+
+async def crear_trabajo(request):
+
+    try:
+        cuerpo = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text = 'El cuerpo debe ser JSON')
+
+    programa = str(cuerpo.get('programa') or '').strip()
+
+    if not programa:
+
+        raise web.HTTPBadRequest(text = "Falta 'programa'")
+
+    trabajo, coalescido = _servicio(request).encolar(programa, str(cuerpo.get('descripcion') or '').strip(),
+                                                     bool(cuerpo.get('refrescar', False)))
+
+    return web.json_response(dict(trabajo.a_dict(), coalescido = coalescido), status = 202)
+
+
+async def listar_trabajos(request):
+
+    return web.json_response([t.a_dict() for t in _servicio(request).trabajos.values()])
+
+
+async def ver_trabajo(request):
+
+    return web.json_response(_trabajo(request).a_dict())
+
+
+async def resultado_trabajo(request):
+
+    trabajo = _trabajo(request)
+
+    if trabajo.estado == 'error':
+
+        raise web.HTTPInternalServerError(text = trabajo.error or 'Error')
+
+    if trabajo.estado != 'listo' or not trabajo.salida or not os.path.exists(trabajo.salida):
+
+        raise web.HTTPConflict(text = f'El trabajo está {trabajo.estado}')
+
+    return web.FileResponse(trabajo.salida, headers = {
+        'Content-Disposition': f'attachment; filename="{os.path.basename(trabajo.salida)}"'})
+
+
+async def salud(request):
+
+    return web.json_response(_servicio(request).salud())
+
+
+async def recargar(request):
+
+    servicio = _servicio(request)
+    await servicio.recargar()
+
+    return web.json_response(servicio.salud())
+
+
+def crear_app(servicio: Servicio) -> web.Application:
+
+    app = web.Application()
+    app[SERVICIO] = servicio
+    app.add_routes([
+        web.post('/trabajos', crear_trabajo),
+        web.get('/trabajos', listar_trabajos),
+        web.get('/trabajos/{id}', ver_trabajo),
+        web.get('/trabajos/{id}/resultado', resultado_trabajo),
+        web.get('/salud', salud),
+        web.post('/recargar', recargar),
+    ])
+
+    async def al_iniciar(app):
+
+        await servicio.iniciar()
+
+    async def al_cerrar(app):
+
+        await servicio.detener()
+
+    app.on_startup.append(al_iniciar)
+    app.on_cleanup.append(al_cerrar)
+
+    return app
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = "Servicio local de reportes de oportunidad de programas")
+    parser.add_argument('--host', default = '127.0.0.1')
+    parser.add_argument('--puerto', type = int, default = 8080)
+    parser.add_argument('--socket', metavar = 'RUTA', help = "Escucha en un socket Unix en vez de TCP")
+    parser.add_argument('--trabajadores', type = int, default = TRABAJADORES,
+                        help = "Reportes que se generan a la vez")
+    parser.add_argument('--sin-imagenes', action = 'store_true',
+                        help = "No escribe las gráficas como .png (solo van dentro de la presentación)")
+    parser.add_argument('--plantilla', metavar = 'PPTX', help = "Plantilla .pptx base para la presentación")
+    parser.add_argument('--motor', choices = MOTORES, help = "Motor del cruce y los agregados SNIES")
+    parser.add_argument('--sin-tildes', action = 'store_true', default = None,
+                        help = "Busca los programas equivalentes sin tildes (por defecto SNIES_PLEGAR_ACENTOS)")
+    args = parser.parse_args()
+
+    servicio = Servicio(args.trabajadores, guardar_imagenes = not args.sin_imagenes,
+                        plantilla = args.plantilla, motor = args.motor, plegar_acentos = args.sin_tildes)
+
+    if args.socket:
+
+        web.run_app(crear_app(servicio), path = args.socket)
+
+    else:
+
+        web.run_app(crear_app(servicio), host = args.host, port = args.puerto)
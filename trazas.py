@@ -0,0 +1,298 @@
+# Trazas por etapa de cada reporte
+
+# Hasta ahora solo había prints, así que no se sabía si un reporte lento venía de la
+# descarga SNIES, los cruces, matplotlib, el Planner, un fetch_url lento o el pptx.
+# Aquí cada etapa abre un "span" (con `with span('nombre'):`) que mide:
+#   - tiempo de pared y tiempo de CPU del hilo donde corre la etapa (las etapas que corren a
+#     la vez en otros hilos no se suman; en el hilo del loop asyncio sí cuentan las demás
+#     tareas del loop)
+#   - memoria: cuánto subió el pico de RSS del proceso durante la etapa y el pico del
+#     proceso al cerrarla (es del proceso, no de la etapa: las etapas simultáneas lo comparten)
+#   - atributos que anote la etapa: filas, tokens, URL, aciertos de caché, ...
+# Los spans se anidan solos a través de contextvars, así que funcionan igual dentro de
+# asyncio.to_thread, de tareas asyncio y de las herramientas del agente. La traza completa
+# se escribe como JSON junto al reporte. Si no hay una traza activa, `span` no mide nada.
+
+
+# Librerias necesarias
+
+import cProfile
+import json
+import os
+import sys
+import time
+import traceback
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+try:
+    import resource
+except ImportError:   # Windows
+    resource = None
+
+
+_traza_actual = ContextVar('traza_actual', default = None)
+_span_actual = ContextVar('span_actual', default = None)
+
+
+def rss_maximo_mb():
+    """Pico de memoria residente del proceso en MB (None si no se puede medir)."""
+    if resource is not None:
+
+        maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        # Linux lo da en KB y macOS en bytes
+
+        return round(maximo / (2**20 if sys.platform == 'darwin' else 2**10), 1)
+
+    try:
+        import psutil
+    except ImportError:
+        return None
+
+    info = psutil.Process().memory_info()
+
+    return round(getattr(info, 'peak_wset', info.rss) / 2**20, 1)
+
+
+class Span:
+    """Una etapa medida: tiempos, memoria, atributos y sub-etapas."""
+
+    def __init__(self, nombre: str, atributos: dict = None):
+
+        self.nombre = nombre
+        self.atributos = dict(atributos or {})
+        self.hijos = []
+        self.error = None
+        self.inicio = time.time()
+        self.pared_s = None
+        self.cpu_s = None
+        self.rss_pico_subida_mb = None
+        self.rss_pico_proceso_mb = None
+        self._t0 = time.perf_counter()
+        self._cpu0 = time.thread_time()
+        self._rss0 = rss_maximo_mb()
+
+    def anotar(self, **atributos):
+        """Agrega atributos al span (p. ej. filas=len(df) o tokens_total=...)."""
+        self.atributos.update(atributos)
+
+    def cerrar(self, error: BaseException = None):
+
+        self.pared_s = round(time.perf_counter() - self._t0, 4)
+        self.cpu_s = round(time.thread_time() - self._cpu0, 4)
+        self.rss_pico_proceso_mb = rss_maximo_mb()
+
+        if self._rss0 is not None and self.rss_pico_proceso_mb is not None:
+
+            self.rss_pico_subida_mb = round(self.rss_pico_proceso_mb - self._rss0, 1)
+
+        if error is not None:
+
+            self.error = f'{type(error).__name__}: {error}'
+
+    def a_dict(self) -> dict:
+
+        return {
+            'nombre': self.nombre,
+            'inicio': self.inicio,
+            'pared_s': self.pared_s,
+            'cpu_s': self.cpu_s,
+            'rss_pico_subida_mb': self.rss_pico_subida_mb,
+            'rss_pico_proceso_mb': self.rss_pico_proceso_mb,
+            'atributos': self.atributos,
+            'error': self.error,
+            'hijos': [h.a_dict() for h in self.hijos],
+        }
+
+
+class _SpanNulo:
+    """Lo que entrega `span` cuando no hay traza activa: no mide ni guarda nada."""
+
+    def anotar(self, **atributos):
+
+        pass
+
+
+_SPAN_NULO = _SpanNulo()
+
+
+class Traza:
+    """Árbol de spans de una corrida (un reporte)."""
+
+    def __init__(self, nombre: str, atributos: dict = None):
+
+        self.raiz = Span(nombre, atributos)
+
+    def _recorrer(self, span: Span = None):
+
+        span = span or self.raiz
+        yield span
+
+        for hijo in span.hijos:
+
+            yield from self._recorrer(hijo)
+
+    def resumen(self) -> dict:
+        """Totales de la corrida: tokens del agente y número de spans por nombre."""
+        tokens = {'solicitudes': 0, 'tokens_entrada': 0, 'tokens_salida': 0, 'tokens_total': 0}
+        conteo = {}
+
+        for s in self._recorrer():
+
+            conteo[s.nombre] = conteo.get(s.nombre, 0) + 1
+
+            for llave in tokens:
+
+                tokens[llave] += s.atributos.get(llave) or 0
+
+        return {'tokens': tokens, 'spans': conteo}
+
+    def a_dict(self) -> dict:
+
+        return {'traza': self.raiz.a_dict(), 'resumen': self.resumen()}
+
+    def guardar(self, ruta: str):
+        """Escribe la traza como JSON (de forma atómica)."""
+        os.makedirs(os.path.dirname(ruta) or '.', exist_ok = True)
+        tmp = f'{ruta}.tmp-{os.getpid()}'
+
+        with open(tmp, 'w', encoding = 'utf-8') as f:
+            json.dump(self.a_dict(), f, ensure_ascii = False, indent = 2, default = str)
+
+        os.replace(tmp, ruta)
+
+    def imprimir(self):
+        """
+        Una línea por etapa de primer nivel, para ver de un vistazo dónde se fue el tiempo.
+        Las etapas que siguen abiertas (p. ej. una tarea cancelada que no terminó) se marcan
+        como tal en vez de mostrar tiempos.
+        """
+        print(f"--- TRAZA {self.raiz.nombre}: {_segundos(self.raiz.pared_s)}, "
+              f"pico RSS del proceso {self.raiz.rss_pico_proceso_mb} MB ---")
+
+        for hijo in self.raiz.hijos:
+
+            subida = '' if hijo.rss_pico_subida_mb is None else f"  pico RSS +{hijo.rss_pico_subida_mb} MB"
+            print(f"  {hijo.nombre:28} {_segundos(hijo.pared_s):>10}  CPU {_segundos(hijo.cpu_s):>9}{subida}"
+                  + (f"  ERROR {hijo.error}" if hijo.error else ""))
+
+
+def _segundos(valor) -> str:
+
+    return 'abierto' if valor is None else f'{valor:.2f} s'
+
+
+@contextmanager
+def traza(nombre: str, ruta: str = None, imprimir: bool = True, **atributos):
+    """
+    Abre una traza para la corrida y la deja activa en el contexto. Al salir (también si
+    hubo error) la escribe en `ruta` como JSON.
+    """
+    t = Traza(nombre, atributos)
+    token_traza = _traza_actual.set(t)
+    token_span = _span_actual.set(t.raiz)
+    error = None
+
+    try:
+
+        yield t
+
+    except BaseException as e:
+
+        error = e
+        t.raiz.anotar(traceback = traceback.format_exc(limit = 5))
+        raise
+
+    finally:
+
+        _span_actual.reset(token_span)
+        _traza_actual.reset(token_traza)
+        t.raiz.cerrar(error)
+
+        if ruta:
+
+            try:
+                t.guardar(ruta)
+            except (OSError, TypeError, ValueError) as e:
+                print(f"Advertencia: no se pudo guardar la traza en {ruta}: {e}")
+
+        # La salida de la traza nunca debe tapar el error real del reporte
+
+        if imprimir:
+
+            try:
+                t.imprimir()
+            except Exception as e:
+                print(f"Advertencia: no se pudo imprimir la traza: {e}")
+
+
+@contextmanager
+def span(nombre: str, **atributos):
+    """Mide una etapa dentro de la traza activa (si no hay traza, no hace nada)."""
+    padre = _span_actual.get()
+
+    if padre is None:
+
+        yield _SPAN_NULO
+        return
+
+    s = Span(nombre, atributos)
+    padre.hijos.append(s)
+    token = _span_actual.set(s)
+    error = None
+
+    try:
+
+        yield s
+
+    except BaseException as e:
+
+        error = e
+        raise
+
+    finally:
+
+        _span_actual.reset(token)
+        s.cerrar(error)
+
+
+async def medir(nombre: str, pendiente, **atributos):
+    """
+    Espera `pendiente` (una corrutina) dentro de un span; útil con create_task/gather. El
+    span queda en el hilo del loop: para trabajo en otro hilo use `en_span` dentro de él.
+    """
+    with span(nombre, **atributos):
+
+        return await pendiente
+
+
+def en_span(nombre: str, funcion, *args, **kwargs):
+    """
+    Corre `funcion` dentro de un span abierto en el hilo actual. Se usa como destino de
+    asyncio.to_thread para que el CPU medido sea el del hilo que hace el trabajo y no el
+    del loop (que mientras tanto atiende otras tareas).
+    """
+    with span(nombre):
+
+        return funcion(*args, **kwargs)
+
+
+# Perfil opcional (cProfile)
+
+def con_perfil(perfil: cProfile.Profile, funcion, *args, **kwargs):
+    """
+    Corre `funcion` con `perfil` activo. cProfile solo mide el hilo donde se activa, así que
+    esto se llama dentro del hilo de la etapa (p. ej. como destino de asyncio.to_thread).
+    Con `perfil=None` simplemente llama a la función.
+    """
+    if perfil is None:
+
+        return funcion(*args, **kwargs)
+
+    perfil.enable()
+
+    try:
+        return funcion(*args, **kwargs)
+    finally:
+        perfil.disable()